@@ -44,13 +44,13 @@ import re
 import gtk
 
 import setlyze
-from setlyze.analysis.common import (calculatestar, ProcessGateway,
-    PrepareAnalysis, AnalysisWorker)
+from setlyze.analysis.common import (calculatestar, init_worker,
+    ProcessGateway, PrepareAnalysis, AnalysisWorker, NoDaemonPool)
 import setlyze.config
 import setlyze.gui
 import setlyze.locale
 import setlyze.std
-from setlyze.stats import chisq_test, wilcox_test
+from setlyze.stats import chisq_test, wilcox_test_groups
 import setlyze.report
 
 # The number of progress steps for this analysis.
@@ -240,21 +240,28 @@ class Begin(PrepareAnalysis):
         # Create a progress dialog and a handler.
         self.pdialog, self.pdialog_handler = self.get_progress_dialog()
 
-        # Set the total number of times we decide to update the progress dialog.
-        self.pdialog_handler.set_total_steps(
-            PROGRESS_STEPS + self.n_repeats
-        )
-
         # Create a progress task executor.
         gw = ProcessGateway()
         gw.set_pdialog_handler(self.pdialog_handler)
         gw.start()
 
-        # Create a process pool with a single worker.
-        self.pool = multiprocessing.Pool(1)
+        # Create a list with the job. The job is not added if its report is
+        # cached.
+        jobs = self.check_cache([(Analysis, (locations, species, gw.queue))])
+
+        # Don't start a process pool if all reports are cached. A pool does
+        # not call the callback for an empty list of jobs.
+        if not jobs:
+            self.on_pool_finished([])
+            return
 
-        # Create a list with the job.
-        jobs = [(Analysis, (locations, species, gw.queue))]
+        # Set the total number of times we decide to update the progress dialog.
+        self.pdialog_handler.set_total_steps((PROGRESS_STEPS + self.n_repeats) *
+            len(jobs))
+
+        # Create a process pool with a single worker. The worker must be
+        # able to create child processes for the repeats of the analysis.
+        self.pool = NoDaemonPool(1)
 
         # Add the job to the pool.
         self.pool.map_async(calculatestar, jobs, callback=self.on_pool_finished)
@@ -305,23 +312,35 @@ class BeginBatch(Begin):
         # Create a progress dialog and a handler.
         self.pdialog, self.pdialog_handler = self.get_progress_dialog()
 
-        # Set the total number of times we decide to update the progress dialog.
-        self.pdialog_handler.set_total_steps(
-            (PROGRESS_STEPS + self.n_repeats) * len(species_combos)
-        )
-
         # Create a progress task executor.
         gw = ProcessGateway()
         gw.set_pdialog_handler(self.pdialog_handler)
         gw.start()
 
-        # Create a process pool with workers.
-        cp = setlyze.config.cfg.get('concurrent-processes')
-        self.pool = multiprocessing.Pool(cp, maxtasksperchild=50)
+        # Create a list of jobs. Jobs for which a report is cached are not
+        # added to the pool.
+        jobs = self.check_cache(((Analysis, (locations, sp_comb, gw.queue))
+            for sp_comb in species_combos))
+        logging.info("Adding %d jobs to the queue" % len(jobs))
+
+        # Don't start a process pool if all reports are cached. A pool does
+        # not call the callback for an empty list of jobs.
+        if not jobs:
+            self.on_pool_finished([])
+            return
+
+        # Set the total number of times we decide to update the progress dialog.
+        self.pdialog_handler.set_total_steps((PROGRESS_STEPS + self.n_repeats) *
+            len(jobs))
 
-        # Create a list of jobs.
-        logging.info("Adding %d jobs to the queue" % len(species_combos))
-        jobs = ((Analysis, (locations, sp_comb, gw.queue)) for sp_comb in species_combos)
+        # Create a process pool with workers. Each worker makes a single
+        # database connection which is reused for all jobs of the worker.
+        # Workers are replaced after 50 jobs to free the memory they hold;
+        # a new worker makes its own connection.
+        cp = setlyze.config.cfg.get('concurrent-processes')
+        scratch = setlyze.config.cfg.get('scratch-database')
+        self.pool = multiprocessing.Pool(cp, init_worker, (scratch,),
+            maxtasksperchild=50)
 
         # Add the jobs to the pool.
         self.pool.map_async(calculatestar, jobs, callback=self.on_pool_finished)
@@ -451,6 +470,8 @@ class BeginBatch(Begin):
         # Set analysis options.
         report.set_option('Alpha level', self.alpha_level)
         report.set_option('Repeats', self.n_repeats)
+        report.set_option('Expected distances', self.expected_distances)
+        report.set_option('Random seed', self.get_seed_option())
         report.set_option('Statistical tests', "Chi-squared test, Wilcoxon rank sum test")
         if self.elapsed_time:
             report.set_option('Running time', setlyze.std.seconds_to_hms(self.elapsed_time))
@@ -496,8 +517,10 @@ class Analysis(AnalysisWorker):
            species spots tables and save the distances to table
            "spot_distances_observed" in the local database.
         6. Calculate expected inter specific spot distances by generating
-           random spots and save the distances to table
-           "spot_distances_expected" in the local database.
+           random spots, or from the exact expected distance frequencies if
+           the ``expected-distances`` configuration is set to "exact", and
+           save the distances to table "spot_distances_expected" in the
+           local database.
         7. Calculate the significance in difference between the observed and
            expected spot distances. Two tests of significance are performed:
            the Wilcoxon rank-sum test and the Chi-squared test.
@@ -506,11 +529,17 @@ class Analysis(AnalysisWorker):
     Design Part: 1.5.2
     """
 
+    # The temporary tables needed for the repeats of the Wilcoxon test.
+    repeat_tables = ('plate_spot_totals', 'plate_ratio_groups',
+        'spot_distances_observed', 'spot_distances_expected')
+    repeat_statistics = 'wilcoxon_ratios_repeats'
+
     def __init__(self, locations, species, execute_queue=None):
         super(Analysis, self).__init__(execute_queue)
         logging.info("Performing %s" % setlyze.locale.text('analysis-attraction-inter'))
         self.locations_selections = locations
         self.species_selections = species
+        self.set_job_key(locations, species)
         self.statistics = {
             'wilcoxon_ratios': {'attr': None, 'results':{}},
             'chi_squared_ratios': {'attr': None, 'results':{}},
@@ -524,16 +553,10 @@ class Analysis(AnalysisWorker):
         and do some data checks:
 
         * For the first species selection:
-            * :meth:`~setlyze.database.AccessLocalDB.get_record_ids` or
-              :meth:`~setlyze.database.AccessRemoteDB.get_record_ids`
-            * :meth:`~setlyze.database.AccessLocalDB.set_species_spots` or
-              :meth:`~setlyze.database.AccessRemoteDB.set_species_spots`
+            * :meth:`~setlyze.database.AccessLocalDB.set_species_spots_from_selection`
             * :meth:`~setlyze.database.AccessDBGeneric.make_plates_unique`
         * For the second species selection:
-            * :meth:`~setlyze.database.AccessLocalDB.get_record_ids` or
-              :meth:`~setlyze.database.AccessRemoteDB.get_record_ids`
-            * :meth:`~setlyze.database.AccessLocalDB.set_species_spots` or
-              :meth:`~setlyze.database.AccessRemoteDB.set_species_spots`
+            * :meth:`~setlyze.database.AccessLocalDB.set_species_spots_from_selection`
             * :meth:`~setlyze.database.AccessDBGeneric.make_plates_unique`
         * :meth:`~setlyze.database.AccessDBGeneric.fill_plate_spot_totals_table`
         * :meth:`calculate_distances_inter`
@@ -545,12 +568,13 @@ class Analysis(AnalysisWorker):
         """
         if not self.stopped():
             # Make an object that facilitates access to the database.
-            self.db = setlyze.database.get_database_accessor()
+            self.db = self.get_database_accessor()
 
             # Create temporary tables.
             self.db.create_table_species_spots_1()
             self.db.create_table_species_spots_2()
             self.db.create_table_plate_spot_totals()
+            self.db.create_table_plate_ratio_groups()
             self.db.create_table_spot_distances_observed()
             self.db.create_table_spot_distances_expected()
             self.db.conn.commit()
@@ -558,14 +582,14 @@ class Analysis(AnalysisWorker):
         if not self.stopped():
             # SELECTION 1
 
-            # Get the record IDs that match the selections.
+            # Make a spots table with the records that match the first
+            # selections.
             self.exec_task('progress.increase', "Creating first table with species spots...")
-            rec_ids1 = self.db.get_record_ids(self.locations_selections[0], self.species_selections[0])
-            logging.info("\tTotal records that match the first species+locations selection: %d" % len(rec_ids1))
-
-            # Make a spots table for both species selections.
             logging.info("\t\tCreating first table with species spots...")
-            self.db.set_species_spots(rec_ids1, slot=0)
+            n_records = self.db.set_species_spots_from_selection(
+                self.locations_selections[0], self.species_selections[0],
+                slot=0)
+            logging.info("\tTotal records that match the first species+locations selection: %d" % n_records)
 
             # Combine records with the same plate ID.
             self.exec_task('progress.increase', "Combining records with the same plate ID...")
@@ -576,14 +600,14 @@ class Analysis(AnalysisWorker):
         if not self.stopped():
             # SELECTION 2
 
-            # Get the record IDs that match the selections.
+            # Make a spots table with the records that match the second
+            # selections.
             self.exec_task('progress.increase', "Creating second table with species spots...")
-            rec_ids2 = self.db.get_record_ids(self.locations_selections[1], self.species_selections[1])
-            logging.info("\tTotal records that match the second species+locations selection: %d" % len(rec_ids2))
-
-            # Make a spots table for both species selections.
             logging.info("\t\tCreating second table with species spots...")
-            self.db.set_species_spots(rec_ids2, slot=1)
+            n_records = self.db.set_species_spots_from_selection(
+                self.locations_selections[1], self.species_selections[1],
+                slot=1)
+            logging.info("\tTotal records that match the second species+locations selection: %d" % n_records)
 
             # Combine records with the same plate ID.
             self.exec_task('progress.increase', "Combining records with the same plate ID...")
@@ -597,6 +621,11 @@ class Analysis(AnalysisWorker):
             self.exec_task('progress.increase', "Saving the positive spot totals for each plate...")
             self.affected, skipped = self.db.fill_plate_spot_totals_table('species_spots_1','species_spots_2')
 
+            # Save the spot ratios group for each plate, so the distances
+            # can be obtained per ratios group.
+            self.db.fill_plate_ratio_groups_table(
+                self.generate_spot_ratio_groups())
+
             # Calculate the observed spot distances.
             self.exec_task('progress.increase', "Calculating the inter-specific distances for the selected species...")
             logging.info("\tCalculating the inter-specific distances for the selected species...")
@@ -671,6 +700,42 @@ class Analysis(AnalysisWorker):
         all_ratios = list(itertools.combinations_with_replacement(xrange(1,25), 2))
         yield all_ratios
 
+    def get_distance_groups(self, distances):
+        """Return the observed and expected spot distance frequencies for
+        each ratios group from :meth:`generate_spot_ratio_groups`.
+
+        The distances of all groups are obtained with a single query for
+        each distance table (see
+        :meth:`~setlyze.database.AccessDBGeneric.get_distance_frequencies`),
+        using the ratios group of each plate in table "plate_ratio_groups".
+
+        Returns a list of ``(n_group, n_plates, observed, expected)`` tuples,
+        where `observed` and `expected` are lists with the frequency of each
+        spot distance in `distances`. Group number -5 is used for all ratios
+        groups taken together.
+        """
+        observed_all = self.db.get_distance_frequencies(
+            'spot_distances_observed', distances, by_ratio_group=True)
+        expected_all = self.db.get_distance_frequencies(
+            'spot_distances_expected', distances, by_ratio_group=True)
+        plates_all = self.db.get_plate_totals(by_ratio_group=True)
+
+        groups = []
+        for n_group in (1,2,3,4,5,-5):
+            # Ratios group -5 means all groups up to 5.
+            if n_group < 0:
+                keys = range(1, abs(n_group)+1)
+            else:
+                keys = [n_group]
+
+            n_plates = sum([plates_all.get(k, 0) for k in keys])
+            observed = setlyze.std.sum_frequencies(observed_all, keys,
+                len(distances))
+            expected = setlyze.std.sum_frequencies(expected_all, keys,
+                len(distances))
+            groups.append( (n_group, n_plates, observed, expected) )
+        return groups
+
     def calculate_distances_inter(self):
         """Calculate the inter specific spot distances.
 
@@ -691,62 +756,52 @@ class Analysis(AnalysisWorker):
         # Get all records from both spots tables where the plate IDs
         # match.
         # Each returned record has this format:
-        # id|rec_pla_id|rec_sur1|rec_sur2|rec_sur3|rec_sur4|rec_sur5|
-        # rec_sur6|rec_sur7|rec_sur8|rec_sur9|rec_sur10|rec_sur11|
-        # rec_sur12|rec_sur13|rec_sur14|rec_sur15|rec_sur16|rec_sur17|
-        # rec_sur18|rec_sur19|rec_sur20|rec_sur21|rec_sur22|rec_sur23|
-        # rec_sur24|rec_sur25|id|rec_pla_id|rec_sur1|rec_sur2|rec_sur3|
-        # rec_sur4|rec_sur5|rec_sur6|rec_sur7|rec_sur8|rec_sur9|
-        # rec_sur10|rec_sur11|rec_sur12|rec_sur13|rec_sur14|rec_sur15|
-        # rec_sur16|rec_sur17|rec_sur18|rec_sur19|rec_sur20|rec_sur21|
-        # rec_sur22|rec_sur23|rec_sur24|rec_sur25
-        cursor.execute( "SELECT s1.*, s2.* FROM species_spots_1 as s1 "
+        # rec_pla_id|s1.rec_sur1|..|s1.rec_sur25|s2.rec_sur1|..|s2.rec_sur25
+        spots1 = ",".join(["s1.rec_sur%d" % i for i in range(1,26)])
+        spots2 = ",".join(["s2.rec_sur%d" % i for i in range(1,26)])
+        cursor.execute( "SELECT s1.rec_pla_id,%s,%s "
+                        "FROM species_spots_1 as s1 "
                         "INNER JOIN species_spots_2 as s2 "
-                        "ON s1.rec_pla_id=s2.rec_pla_id"
+                        "ON s1.rec_pla_id=s2.rec_pla_id" %
+                        (spots1, spots2)
                         )
 
-        for record in cursor:
-            record1 = record[2:27]
-            record2 = record[29:54]
-            plate_id = record[1]
-
-            # Get all possible positive spot combinations between the
-            # two records.
-            # If both records don't contain at least one positive spot,
-            # the combos list will be empty, and nothing will be
-            # calculated.
-            combos = setlyze.std.get_spot_combinations_from_record(record1,record2)
-
-            # Get all spot combination pairs.
-            for spot1,spot2 in combos:
-                # Use each spot combination to calculate the difference
-                # per spot combination.
-                # h = horizontal difference.
-                # v = vertical difference.
-                h,v = setlyze.std.get_spot_position_difference(spot1,spot2)
-
-                # Use the h/v differences to calculate the corresponding spot
-                # distance.
-                distance = setlyze.std.distance(h,v)
-
-                # Save the observed spot distances to the database.
-                cursor2.execute( "INSERT INTO spot_distances_observed "
-                                 "VALUES (null,?,?)",
-                                 (plate_id, distance)
-                                )
+        records = cursor.fetchall()
+        plate_ids = [record[0] for record in records]
+        spots1 = setlyze.std.spots_to_matrix([record[1:26] for record in records])
+        spots2 = setlyze.std.spots_to_matrix([record[26:51] for record in records])
+
+        # Count the spot distances between both records of each plate for
+        # all plates at once. If one of the records doesn't contain at
+        # least one positive spot, the histogram for that plate will be
+        # empty, and no distances are saved for it.
+        histograms = setlyze.std.get_distance_histograms_inter(spots1, spots2)
+
+        # Save the observed spot distances to the database.
+        distances = setlyze.std.get_distance_rows(plate_ids, histograms,
+            setlyze.std.DISTANCE_CLASSES)
+        cursor2.executemany( "INSERT INTO spot_distances_observed "
+                             "VALUES (null,?,?)",
+                             distances
+                            )
 
         # Commit the transaction.
         connection.commit()
         cursor.close()
         cursor2.close()
 
-    def calculate_distances_inter_expected(self):
+    def calculate_distances_inter_expected(self, random_state=None):
         """Calculate the expected spot distances.
 
         This is based on the observed inter specific distances and the
         distances are saved to the "spot_distances_expected" table in the local
         database.
 
+        Argument `random_state` is an optional random generator for the
+        random positive spots (see
+        :meth:`~setlyze.analysis.common.AnalysisWorker.get_repeat_random_state`).
+        If it is not set, the random generator of the analysis is used.
+
         Design Part: 1.69
         """
         connection = self.db.conn
@@ -759,36 +814,83 @@ class Analysis(AnalysisWorker):
 
         # Get the number of positive spots for each plate. This will serve
         # as a template for the random spots.
-        cursor.execute( "SELECT pla_id, n_spots_a, n_spots_b "
-                        "FROM plate_spot_totals"
+        totals = self.db.get_plate_spot_totals()
+        plate_ids = [row[0] for row in totals]
+
+        # Use that number of spots to generate the same number of random
+        # positive spots for both records of each plate.
+        if random_state is None:
+            random_state = self.random_state
+        random_spots1 = setlyze.std.get_random_plates(
+            [row[1] for row in totals], 1, random_state)[0]
+        random_spots2 = setlyze.std.get_random_plates(
+            [row[2] for row in totals], 1, random_state)[0]
+
+        # Count the spot distances between both sets of random spots on each
+        # plate for all plates at once.
+        histograms = setlyze.std.get_distance_histograms_inter(random_spots1,
+            random_spots2)
+
+        # Save the expected spot distances to the database.
+        distances = setlyze.std.get_distance_rows(plate_ids, histograms,
+            setlyze.std.DISTANCE_CLASSES)
+        cursor2.executemany( "INSERT INTO spot_distances_expected "
+                             "VALUES (null,?,?)",
+                             distances
+                            )
+
+        # Commit the transaction.
+        connection.commit()
+        cursor.close()
+        cursor2.close()
+
+    def calculate_distances_inter_expected_exact(self):
+        """Calculate the exact expected spot distances.
+
+        Instead of generating random spots for both species on each plate,
+        the expected spot distances are obtained from the exact expected
+        distance frequencies in the "expected_distances_inter" table (see
+        :meth:`~setlyze.database.AccessDBGeneric.get_expected_distances_inter`).
+        This is done for each group of plates with the same numbers of
+        positive spots for both species (see
+        :meth:`setlyze.std.get_exact_distance_rows`). The distances are saved
+        to the "spot_distances_expected" table in the local database.
+
+        The exact expected distances are the same each time this method is
+        called, so it only needs to be called once for an analysis.
+        """
+        connection = self.db.conn
+        cursor = connection.cursor()
+        cursor2 = connection.cursor()
+
+        # Empty the spot_distances_expected table before we use it again.
+        cursor.execute("DELETE FROM spot_distances_expected")
+        connection.commit()
+
+        # Get the number of positive spots for each plate, grouped by the
+        # numbers of positive spots for both species.
+        cursor.execute( "SELECT n_spots_a, n_spots_b, pla_id "
+                        "FROM plate_spot_totals "
+                        "ORDER BY n_spots_a, n_spots_b"
                         )
 
-        for plate_id, n_spots_a, n_spots_b in cursor:
-            # Use that number of spots to generate the same number of random
-            # positive spots for both records.
-            random_spots1 = setlyze.std.get_random_for_plate(n_spots_a)
-            random_spots2 = setlyze.std.get_random_for_plate(n_spots_b)
-
-            # Get all possible combinations between the two sets of random
-            # spots.
-            combos = itertools.product(random_spots1,random_spots2)
-
-            # Get all spot combination pairs.
-            for spot1,spot2 in combos:
-                # Use each spot combination to calculate the difference
-                # per spot combination.
-                # h = horizontal difference.
-                # v = vertical difference.
-                h,v = setlyze.std.get_spot_position_difference(spot1,spot2)
-
-                # Use the h/v differences to calculate the corresponding spot
-                # distance.
-                distance = setlyze.std.distance(h,v)
-
-                # Save the observed spot distances to the database.
-                cursor2.execute( "INSERT INTO spot_distances_expected "
+        for n_spots, rows in itertools.groupby(cursor, lambda row: row[:2]):
+            n_spots_a, n_spots_b = n_spots
+            plate_ids = [row[2] for row in rows]
+
+            # Get the exact expected frequency of each spot distance for
+            # plates with these numbers of positive spots.
+            expected = self.db.get_expected_distances_inter(n_spots_a, n_spots_b)
+            if not expected:
+                continue
+            distances, frequencies = zip(*expected)
+
+            # Save the expected spot distances to the database.
+            distances = setlyze.std.get_exact_distance_rows(plate_ids,
+                n_spots_a * n_spots_b, frequencies, distances)
+            cursor2.executemany( "INSERT INTO spot_distances_expected "
                                  "VALUES (null,?,?)",
-                                 (plate_id, distance)
+                                 distances
                                 )
 
         # Commit the transaction.
@@ -864,33 +966,19 @@ class Analysis(AnalysisWorker):
         Design Part: 1.24
         """
 
-        # Create an iterator returning the ratio groups.
-        ratio_groups = self.generate_spot_ratio_groups()
-
-        for n_group, ratio_group in enumerate(ratio_groups, start=1):
-            # Ratios group 6 is actually all 5 groups taken together.
-            # So change the group number to -5, meaning all groups up
-            # to 5.
-            if n_group == 6:
-                n_group = -5
+        # The spot distances in the frequency tables.
+        distances = setlyze.std.DISTANCE_CLASSES
 
-            # Get both sets of distances from plates per total spot numbers.
-            observed = self.db.get_distances_matching_ratios(
-                'spot_distances_observed', ratio_group)
-            expected = self.db.get_distances_matching_ratios(
-                'spot_distances_expected', ratio_group)
+        # Get the frequency of each spot distance for both sets of distances
+        # from plates per ratios group. The Wilcoxon test only depends on
+        # these frequencies, because the spot distances have just a few
+        # distinct values.
+        groups = self.get_distance_groups(distances)
 
-            # Iterators cannot be used directly by RPy, so convert them to
-            # lists first.
-            observed = list(observed)
-            expected = list(expected)
-
-            # Get the number of matching plates.
-            n_plates = self.db.matching_plates_total
-
-            # Get the lengths.
-            count_observed = len(observed)
-            count_expected = len(expected)
+        for n_group, n_plates, observed, expected in groups:
+            # Get the number of distances.
+            count_observed = sum(observed)
+            count_expected = sum(expected)
 
             # The number of observed and expected spot distances must always
             # be the same.
@@ -903,20 +991,24 @@ class Analysis(AnalysisWorker):
                 continue
 
             # Calculate the means.
-            mean_observed = setlyze.std.mean(observed)
-            mean_expected = setlyze.std.mean(expected)
-
-            # Perform two sample Wilcoxon tests.
-            test_result = wilcox_test(observed, expected,
+            mean_observed = setlyze.std.weighted_mean(distances, observed)
+            mean_expected = setlyze.std.weighted_mean(distances, expected)
+
+            # Perform the two sample Wilcoxon test on the frequency tables.
+            # The test is performed by the backend set by the
+            # ``stats-backend`` configuration.
+            test_result = wilcox_test_groups([(observed, expected)],
+                values = distances,
                 alternative = "two.sided", paired = False,
                 conf_level = 1 - self.alpha_level,
                 conf_int = False)
+            method = test_result['method'][0]
 
             # Save the significance result.
             if not self.statistics['wilcoxon_ratios_repeats']['attr']:
                 self.statistics['wilcoxon_ratios_repeats']['attr'] = {
-                    'method': test_result['method'],
-                    'alternative': test_result['alternative'],
+                    'method': method,
+                    'alternative': "two.sided",
                     'conf_level': 1 - self.alpha_level,
                     'paired': False,
                     'repeats': self.n_repeats,
@@ -925,8 +1017,8 @@ class Analysis(AnalysisWorker):
 
             if not self.statistics['wilcoxon_ratios']['attr']:
                 self.statistics['wilcoxon_ratios']['attr'] = {
-                    'method': test_result['method'],
-                    'alternative': test_result['alternative'],
+                    'method': method,
+                    'alternative': "two.sided",
                     'conf_level': 1 - self.alpha_level,
                     'paired': False,
                     'groups': 'ratios',
@@ -935,7 +1027,7 @@ class Analysis(AnalysisWorker):
             self.statistics['wilcoxon_ratios']['results'][n_group] = {
                 'n_plates': n_plates,
                 'n_values': count_observed,
-                'p_value': test_result['p.value'],
+                'p_value': float(test_result['p.value'][0]),
                 'mean_observed': mean_observed,
                 'mean_expected': mean_expected,
             }
@@ -944,13 +1036,9 @@ class Analysis(AnalysisWorker):
             # the Chi-squared test.
             spot_dist_to_prob = setlyze.config.cfg.get('spot-dist-to-prob-inter')
 
-            # Get the frequencies for the observed distances. These
-            # are required for the Chi-squared test.
-            observed_freq = setlyze.std.distance_frequency(observed, 'inter')
-
             # Also perform Chi-squared test.
-            test_result = chisq_test(observed_freq.values(),
-                p = spot_dist_to_prob.values())
+            test_result = chisq_test(observed,
+                p = [spot_dist_to_prob[d] for d in distances])
 
             # If we find an expected frequency that is less than 5, do not save
             # the result.
@@ -983,11 +1071,39 @@ class Analysis(AnalysisWorker):
 
         Each time before :meth:`wilcoxon_test_for_repeats` is called,
         :meth:`calculate_distances_inter_expected` is called to re-calculate
-        the expected values (which are random).
+        the expected values (which are random). Each repeat uses its own
+        random generator (see
+        :meth:`~setlyze.analysis.common.AnalysisWorker.get_repeat_random_state`).
+
+        If the ``expected-distances`` configuration is set to "exact", the
+        expected values are calculated just once with
+        :meth:`calculate_distances_inter_expected_exact`. Each repeat would
+        give the same result, so the test is performed once and the result
+        is counted `n` times.
+
+        The repeats are spread over multiple processes if possible (see
+        :meth:`~setlyze.analysis.common.AnalysisWorker.repeat_in_processes`).
 
         Design Part: 1.105
         """
-        for i in range(n):
+        if self.expected_distances == "exact":
+            self.calculate_distances_inter_expected_exact()
+            self.wilcoxon_test_for_repeats(weight=n)
+
+            # Update the progess bar for all repeats.
+            for i in range(n):
+                self.exec_task('progress.increase')
+            return
+
+        # Spread the repeats over multiple processes if possible. The
+        # expected values of the last repeat are used for the non-repeated
+        # test, so these are calculated again in this process.
+        if self.repeat_in_processes(n):
+            self.calculate_distances_inter_expected(
+                self.get_repeat_random_state(n - 1))
+            return
+
+        for repeat in xrange(self.first_repeat, self.first_repeat + n):
             if self.stopped():
                 return
 
@@ -996,12 +1112,13 @@ class Analysis(AnalysisWorker):
 
             # The expected spot distances are random. So the expected values
             # differ a little on each repeat.
-            self.calculate_distances_inter_expected()
+            self.calculate_distances_inter_expected(
+                self.get_repeat_random_state(repeat))
 
             # And then we calculate the siginificance for each repeat.
             self.wilcoxon_test_for_repeats()
 
-    def wilcoxon_test_for_repeats(self):
+    def wilcoxon_test_for_repeats(self, weight=1):
         """Perform the Wilcoxon rank sum test for repeats.
 
         This method does the same Wilcoxon test from :meth:`calculate_significance`,
@@ -1016,34 +1133,26 @@ class Analysis(AnalysisWorker):
         you want to draw a solid conclusion from the test.
 
         This method will be put in a loop by :meth:`repeat_wilcoxon_test`.
+        The result of the test is counted `weight` times.
 
         Design Part: 1.104
         """
 
-        # Create an iterator returning the ratio groups.
-        ratio_groups = self.generate_spot_ratio_groups()
-
-        for n_group, ratio_group in enumerate(ratio_groups, start=1):
-            # Ratios group 6 is actually all 5 groups taken together.
-            # So change the group number to -5, meaning all groups up
-            # to 5.
-            if n_group == 6:
-                n_group = -5
+        # The frequency tables and means of all groups.
+        groups = []
+        group_means = []
 
-            # Get both sets of distances from plates per total spot numbers.
-            observed = self.db.get_distances_matching_ratios(
-                'spot_distances_observed', ratio_group)
-            expected = self.db.get_distances_matching_ratios(
-                'spot_distances_expected', ratio_group)
+        # The spot distances in the frequency tables.
+        distances = setlyze.std.DISTANCE_CLASSES
 
-            # Iterators cannot be used directly by RPy, so convert them to
-            # lists first.
-            observed = list(observed)
-            expected = list(expected)
+        # Get the frequency of each spot distance for both sets of distances
+        # from plates per ratios group.
+        distance_groups = self.get_distance_groups(distances)
 
-            # Get the list lengths.
-            count_observed = len(observed)
-            count_expected = len(expected)
+        for n_group, n_plates, observed, expected in distance_groups:
+            # Get the number of distances.
+            count_observed = sum(observed)
+            count_expected = sum(expected)
 
             # The number of observed and expected spot distances must always
             # be the same.
@@ -1059,7 +1168,7 @@ class Analysis(AnalysisWorker):
             # If not, create it.
             if n_group not in self.statistics['wilcoxon_ratios_repeats']['results']:
                 self.statistics['wilcoxon_ratios_repeats']['results'][n_group] = {
-                    'n_plates': self.db.matching_plates_total,
+                    'n_plates': n_plates,
                     'n_values': count_observed,
                     'n_significant': 0,
                     'n_attraction': 0,
@@ -1067,35 +1176,42 @@ class Analysis(AnalysisWorker):
                 }
 
             # Calculate the means.
-            mean_observed = setlyze.std.mean(observed)
-            mean_expected = setlyze.std.mean(expected)
-
-            # Perform two sample Wilcoxon tests.
-            test_result = wilcox_test(observed, expected,
-                alternative = "two.sided", paired = False,
-                conf_level = 1 - self.alpha_level,
-                conf_int = False)
-
+            mean_observed = setlyze.std.weighted_mean(distances, observed)
+            mean_expected = setlyze.std.weighted_mean(distances, expected)
+
+            # Save the frequencies and means for this group, so the tests
+            # for all groups can be performed at once.
+            groups.append((observed, expected))
+            group_means.append((n_group, mean_observed, mean_expected))
+
+        # Perform two sample Wilcoxon tests for all groups.
+        test_results = wilcox_test_groups(groups, values = distances,
+            alternative = "two.sided", paired = False,
+            conf_level = 1 - self.alpha_level,
+            conf_int = False)
+
+        for ((n_group, mean_observed, mean_expected), p_value) in \
+                zip(group_means, test_results['p.value']):
             # Check if the result was significant. When all values are
             # 0 the p-value will be NaN. Function `is_significant` will
             # raise ValueError if the p-value is NaN.
             try:
-                significant = setlyze.std.is_significant(test_result['p.value'], self.alpha_level)
+                significant = setlyze.std.is_significant(p_value, self.alpha_level)
             except ValueError:
                 significant = False
 
             if significant:
-                # If so, increase significant counter with one.
-                self.statistics['wilcoxon_ratios_repeats']['results'][n_group]['n_significant'] += 1
+                # If so, increase significant counter.
+                self.statistics['wilcoxon_ratios_repeats']['results'][n_group]['n_significant'] += weight
 
                 # If significant, also check if there is preference or
                 # rejection for this plate area.
                 if mean_observed < mean_expected:
-                    # Increase attracion counter with one.
-                    self.statistics['wilcoxon_ratios_repeats']['results'][n_group]['n_attraction'] += 1
+                    # Increase attracion counter.
+                    self.statistics['wilcoxon_ratios_repeats']['results'][n_group]['n_attraction'] += weight
                 else:
-                    # Increase repulsion counter with one.
-                    self.statistics['wilcoxon_ratios_repeats']['results'][n_group]['n_repulsion'] += 1
+                    # Increase repulsion counter.
+                    self.statistics['wilcoxon_ratios_repeats']['results'][n_group]['n_repulsion'] += weight
 
     def generate_report(self):
         """Generate the analysis report.
@@ -1105,6 +1221,8 @@ class Analysis(AnalysisWorker):
         self.result.set_analysis("Attraction between Species")
         self.result.set_option('Alpha level', self.alpha_level)
         self.result.set_option('Repeats', self.n_repeats)
+        self.result.set_option('Expected distances', self.expected_distances)
+        self.result.set_option('Random seed', self.seed)
         self.result.set_option('Total plates', self.affected)
         self.result.set_location_selections(self.locations_selections)
         self.result.set_species_selections(self.species_selections)
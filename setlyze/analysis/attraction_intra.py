@@ -45,13 +45,13 @@ import time
 import gtk
 
 import setlyze
-from setlyze.analysis.common import (calculatestar, ProcessGateway,
-    PrepareAnalysis, AnalysisWorker)
+from setlyze.analysis.common import (calculatestar, init_worker,
+    ProcessGateway, PrepareAnalysis, AnalysisWorker, NoDaemonPool)
 import setlyze.config
 import setlyze.gui
 import setlyze.locale
 import setlyze.std
-from setlyze.stats import chisq_test, wilcox_test
+from setlyze.stats import chisq_test, wilcox_test_groups
 import setlyze.report
 
 # The number of progress steps for this analysis.
@@ -173,19 +173,28 @@ class Begin(PrepareAnalysis):
         # Create a progress dialog and a handler.
         self.pdialog, self.pdialog_handler = self.get_progress_dialog()
 
-        # Set the total number of times we decide to update the progress dialog.
-        self.pdialog_handler.set_total_steps(PROGRESS_STEPS + self.n_repeats)
-
         # Create a progress task executor.
         gw = ProcessGateway()
         gw.set_pdialog_handler(self.pdialog_handler)
         gw.start()
 
-        # Create a process pool with a single worker.
-        self.pool = multiprocessing.Pool(1)
+        # Create a list with the job. The job is not added if its report is
+        # cached.
+        jobs = self.check_cache([(Analysis, (locations, species, gw.queue))])
+
+        # Don't start a process pool if all reports are cached. A pool does
+        # not call the callback for an empty list of jobs.
+        if not jobs:
+            self.on_pool_finished([])
+            return
+
+        # Set the total number of times we decide to update the progress dialog.
+        self.pdialog_handler.set_total_steps((PROGRESS_STEPS + self.n_repeats) *
+            len(jobs))
 
-        # Create a list with the job.
-        jobs = [(Analysis, (locations, species, gw.queue))]
+        # Create a process pool with a single worker. The worker must be
+        # able to create child processes for the repeats of the analysis.
+        self.pool = NoDaemonPool(1)
 
         # Add the job to the pool.
         self.pool.map_async(calculatestar, jobs, callback=self.on_pool_finished)
@@ -229,22 +238,35 @@ class BeginBatch(Begin):
         # Create a progress dialog and a handler.
         self.pdialog, self.pdialog_handler = self.get_progress_dialog()
 
-        # Set the total number of times we decide to update the progress dialog.
-        self.pdialog_handler.set_total_steps((PROGRESS_STEPS + self.n_repeats) *
-            len(species))
-
         # Create a progress task executor.
         gw = ProcessGateway()
         gw.set_pdialog_handler(self.pdialog_handler)
         gw.start()
 
-        # Create a process pool with workers.
-        cp = setlyze.config.cfg.get('concurrent-processes')
-        self.pool = multiprocessing.Pool(cp)
+        # Create a list of jobs. Jobs for which a report is cached are not
+        # added to the pool.
+        jobs = self.check_cache(((Analysis, (locations, sp, gw.queue))
+            for sp in species))
+        logging.info("Adding %d jobs to the queue" % len(jobs))
 
-        # Create a list of jobs.
-        logging.info("Adding %d jobs to the queue" % len(species))
-        jobs = ((Analysis, (locations, sp, gw.queue)) for sp in species)
+        # Don't start a process pool if all reports are cached. A pool does
+        # not call the callback for an empty list of jobs.
+        if not jobs:
+            self.on_pool_finished([])
+            return
+
+        # Set the total number of times we decide to update the progress dialog.
+        self.pdialog_handler.set_total_steps((PROGRESS_STEPS + self.n_repeats) *
+            len(jobs))
+
+        # Create a process pool with workers. Each worker makes a single
+        # database connection which is reused for all jobs of the worker.
+        # Workers are replaced after 50 jobs to free the memory they hold;
+        # a new worker makes its own connection.
+        cp = setlyze.config.cfg.get('concurrent-processes')
+        scratch = setlyze.config.cfg.get('scratch-database')
+        self.pool = multiprocessing.Pool(cp, init_worker, (scratch,),
+            maxtasksperchild=50)
 
         # Add the jobs to the pool.
         self.pool.map_async(calculatestar, jobs, callback=self.on_pool_finished)
@@ -370,6 +392,8 @@ class BeginBatch(Begin):
         # Set analysis options.
         report.set_option('Alpha level', self.alpha_level)
         report.set_option('Repeats', self.n_repeats)
+        report.set_option('Expected distances', self.expected_distances)
+        report.set_option('Random seed', self.get_seed_option())
         report.set_option('Statistical tests', "Chi-squared test, Wilcoxon rank sum test")
         if self.elapsed_time:
             report.set_option('Running time', setlyze.std.seconds_to_hms(self.elapsed_time))
@@ -408,7 +432,8 @@ class Analysis(AnalysisWorker):
         3. Calculate the intra specific spot distances from the records in the
            species spots table.
         4. Calculate expected intra-specific spot distances by generating
-           random spots.
+           random spots, or from the exact expected distance frequencies if
+           the ``expected-distances`` configuration is set to "exact".
         5. Perform the Wilcoxon rank sum tests with repeats to calculate the
            significance in difference between the observed and expected spot
            distances.
@@ -420,11 +445,17 @@ class Analysis(AnalysisWorker):
     Design Part: 1.4.2
     """
 
+    # The temporary tables needed for the repeats of the Wilcoxon test.
+    repeat_tables = ('plate_spot_totals', 'spot_distances_observed',
+        'spot_distances_expected')
+    repeat_statistics = 'wilcoxon_spots_repeats'
+
     def __init__(self, locations, species, execute_queue=None):
         super(Analysis, self).__init__(execute_queue)
         logging.info("Performing %s" % setlyze.locale.text('analysis-attraction-intra'))
         self.locations_selection = locations
         self.species_selection = species
+        self.set_job_key(locations, species)
         self.statistics = {
             'wilcoxon_spots': {'attr': None, 'results':{}},
             'chi_squared_spots': {'attr': None, 'results':{}},
@@ -437,10 +468,7 @@ class Analysis(AnalysisWorker):
         Calls the necessary methods for the analysis in the right order
         and do some data checks:
 
-        * :meth:`~setlyze.database.AccessLocalDB.get_record_ids` or
-          :meth:`~setlyze.database.AccessRemoteDB.get_record_ids`
-        * :meth:`~setlyze.database.AccessLocalDB.set_species_spots` or
-          :meth:`~setlyze.database.AccessRemoteDB.set_species_spots`
+        * :meth:`~setlyze.database.AccessLocalDB.set_species_spots_from_selection`
         * :meth:`~setlyze.database.AccessDBGeneric.make_plates_unique`
         * :meth:`~setlyze.database.AccessDBGeneric.fill_plate_spot_totals_table`
         * :meth:`calculate_distances_intra`
@@ -452,7 +480,7 @@ class Analysis(AnalysisWorker):
         """
         if not self.stopped():
             # Make an object that facilitates access to the database.
-            self.db = setlyze.database.get_database_accessor()
+            self.db = self.get_database_accessor()
 
             # Create temporary tables.
             self.db.create_table_species_spots_1()
@@ -461,14 +489,13 @@ class Analysis(AnalysisWorker):
             self.db.create_table_spot_distances_expected()
             self.db.conn.commit()
 
-            # Get the record IDs that match the locations + species selection.
-            rec_ids = self.db.get_record_ids(self.locations_selection, self.species_selection)
-            logging.info("\tTotal records that match the species+locations selection: %d" % len(rec_ids))
-
-            # Make a spots table for the selected species.
+            # Make a spots table with the records that match the
+            # locations + species selection.
             logging.info("\tCreating table with species spots...")
             self.exec_task('progress.increase', "Creating table with species spots...")
-            self.db.set_species_spots(rec_ids, slot=0)
+            n_records = self.db.set_species_spots_from_selection(
+                self.locations_selection, self.species_selection, slot=0)
+            logging.info("\tTotal records that match the species+locations selection: %d" % n_records)
 
         if not self.stopped():
             # Combine records with the same plate ID.
@@ -555,41 +582,39 @@ class Analysis(AnalysisWorker):
                         "rec_sur21,rec_sur22,rec_sur23,rec_sur24,rec_sur25 "
                         "FROM species_spots_1")
 
-        for record in cursor:
-            # Get all possible positive spot combinations for each plate.
-            # If the record contains less than 2 positive spots, the
-            # combos list will be empty, and nothing will be calculated.
-            combos = setlyze.std.get_spot_combinations_from_record(record[1:])
-
-            # Get all spot combination pairs.
-            for spot1,spot2 in combos:
-                # Use each spot combination to calculate the difference
-                # per spot combination.
-                # h = horizontal difference.
-                # v = vertical difference.
-                h,v = setlyze.std.get_spot_position_difference(spot1,spot2)
-
-                # Use the h/v differences to calculate the corresponding spot
-                # distance.
-                distance = setlyze.std.distance(h,v)
-
-                # Save the observed spot distances to the database.
-                cursor2.execute( "INSERT INTO spot_distances_observed "
-                                 "VALUES (null,?,?)",
-                                 (record[0], distance)
-                                )
+        records = cursor.fetchall()
+        plate_ids = [record[0] for record in records]
+        spots = setlyze.std.spots_to_matrix([record[1:] for record in records])
+
+        # Count the spot distances on each plate for all plates at once.
+        # Records with less than 2 positive spots get an empty histogram,
+        # so no distances are saved for those.
+        histograms = setlyze.std.get_distance_histograms_intra(spots)
+
+        # Save the observed spot distances to the database.
+        distances = setlyze.std.get_distance_rows(plate_ids, histograms,
+            setlyze.std.DISTANCE_CLASSES[1:])
+        cursor2.executemany( "INSERT INTO spot_distances_observed "
+                             "VALUES (null,?,?)",
+                             distances
+                            )
 
         # Commit the transaction.
         connection.commit()
         cursor.close()
         cursor2.close()
 
-    def calculate_distances_intra_expected(self):
+    def calculate_distances_intra_expected(self, random_state=None):
         """Calculate the expected spot distances.
 
         This is based on the observed spot distances and they are saved to the
         spot_distances_expected table in the local database.
 
+        Argument `random_state` is an optional random generator for the
+        random positive spots (see
+        :meth:`~setlyze.analysis.common.AnalysisWorker.get_repeat_random_state`).
+        If it is not set, the random generator of the analysis is used.
+
         Design Part: 1.23
         """
         connection = self.db.conn
@@ -602,34 +627,70 @@ class Analysis(AnalysisWorker):
 
         # Get the number of positive spots for each plate. This will serve
         # as a template for the random spots.
-        cursor.execute( "SELECT pla_id, n_spots_a "
-                        "FROM plate_spot_totals"
-                        )
+        totals = self.db.get_plate_spot_totals()
+        plate_ids = [row[0] for row in totals]
+
+        # Use that number of spots to generate the same number of random
+        # spots for each plate.
+        if random_state is None:
+            random_state = self.random_state
+        random_spots = setlyze.std.get_random_plates(
+            [row[1] for row in totals], 1, random_state)[0]
+
+        # Count the spot distances on each plate for all plates at once.
+        histograms = setlyze.std.get_distance_histograms_intra(random_spots)
+
+        # Save the expected spot distances to the database.
+        distances = setlyze.std.get_distance_rows(plate_ids, histograms,
+            setlyze.std.DISTANCE_CLASSES[1:])
+        cursor2.executemany( "INSERT INTO spot_distances_expected "
+                             "VALUES (null,?,?)",
+                             distances
+                            )
+
+        # Commit the transaction.
+        connection.commit()
+        cursor.close()
+        cursor2.close()
+
+    def calculate_distances_intra_expected_exact(self):
+        """Calculate the exact expected spot distances.
+
+        Instead of generating random spots for each plate, the expected spot
+        distances are obtained from the exact expected distance frequencies
+        in :data:`setlyze.std.EXPECTED_DISTANCE_FREQUENCIES_INTRA`. This is
+        done for each group of plates with the same number of positive spots
+        (see :meth:`setlyze.std.get_exact_distance_rows_intra`). The
+        distances are saved to the spot_distances_expected table in the
+        local database.
 
-        for plate_id, n_spots in cursor:
-            # Use that number of spots to generate the same number of
-            # random spots.
-            random_spots = setlyze.std.get_random_for_plate(n_spots)
+        The exact expected distances are the same each time this method is
+        called, so it only needs to be called once for an analysis.
+        """
+        connection = self.db.conn
+        cursor = connection.cursor()
+        cursor2 = connection.cursor()
 
-            # Get all possible combinations for the spots.
-            combos = itertools.combinations(random_spots, 2)
+        # Empty the spot_distances_expected table before we use it again.
+        cursor.execute("DELETE FROM spot_distances_expected")
+        connection.commit()
 
-            # Get all spot combination pairs.
-            for spot1,spot2 in combos:
-                # Use each spot combination to calculate the difference
-                # per spot combination.
-                # h = horizontal difference.
-                # v = vertical difference.
-                h,v = setlyze.std.get_spot_position_difference(spot1,spot2)
+        # Get the number of positive spots for each plate, grouped by the
+        # number of positive spots.
+        cursor.execute( "SELECT n_spots_a, pla_id "
+                        "FROM plate_spot_totals "
+                        "ORDER BY n_spots_a"
+                        )
 
-                # Use the h/v differences to calculate the corresponding spot
-                # distance.
-                distance = setlyze.std.distance(h,v)
+        for n_spots, rows in itertools.groupby(cursor, lambda row: row[0]):
+            plate_ids = [row[1] for row in rows]
 
-                # Save the observed spot distances to the database.
-                cursor2.execute( "INSERT INTO spot_distances_expected "
+            # Save the expected spot distances to the database.
+            distances = setlyze.std.get_exact_distance_rows_intra(plate_ids,
+                n_spots)
+            cursor2.executemany( "INSERT INTO spot_distances_expected "
                                  "VALUES (null,?,?)",
-                                 (plate_id, distance)
+                                 distances
                                 )
 
         # Commit the transaction.
@@ -637,6 +698,41 @@ class Analysis(AnalysisWorker):
         cursor.close()
         cursor2.close()
 
+    def get_distance_groups(self, spot_totals, distances):
+        """Return the observed and expected spot distance frequencies for
+        each group of plates in `spot_totals`.
+
+        Each item in `spot_totals` is a number of positive spots. Negative
+        numbers mean all plates with positive spots up to that number.
+        The distances of all groups are obtained with a single query for
+        each distance table (see
+        :meth:`~setlyze.database.AccessDBGeneric.get_distance_frequencies`).
+
+        Returns a list of ``(n_spots, n_plates, observed, expected)`` tuples,
+        where `observed` and `expected` are lists with the frequency of each
+        spot distance in `distances`.
+        """
+        observed_all = self.db.get_distance_frequencies(
+            'spot_distances_observed', distances)
+        expected_all = self.db.get_distance_frequencies(
+            'spot_distances_expected', distances)
+        plates_all = self.db.get_plate_totals()
+
+        groups = []
+        for n_spots in spot_totals:
+            if n_spots < 0:
+                keys = [k for k in plates_all if k[0] <= abs(n_spots)]
+            else:
+                keys = [k for k in plates_all if k[0] == n_spots]
+
+            n_plates = sum([plates_all[k] for k in keys])
+            observed = setlyze.std.sum_frequencies(observed_all, keys,
+                len(distances))
+            expected = setlyze.std.sum_frequencies(expected_all, keys,
+                len(distances))
+            groups.append( (n_spots, n_plates, observed, expected) )
+        return groups
+
     def calculate_significance(self):
         """Perform statistical tests to check for significant differences.
 
@@ -709,25 +805,19 @@ class Analysis(AnalysisWorker):
         spot_totals = [2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,
             23,24,-24]
 
-        for n_spots in spot_totals:
-            # Get both sets of distances from plates per total spot numbers.
-            observed = self.db.get_distances_matching_spots_total(
-                'spot_distances_observed', n_spots)
-            expected = self.db.get_distances_matching_spots_total(
-                'spot_distances_expected', n_spots)
-
-            # Iterators cannot be used directly by RPy, so convert them to
-            # lists first.
-            observed = list(observed)
-            expected = list(expected)
+        # The spot distances in the frequency tables.
+        distances = setlyze.std.DISTANCE_CLASSES[1:]
 
-            # Get the number of plates found that match the current
-            # number of positive spots.
-            n_plates = self.db.matching_plates_total
+        # Get the frequency of each spot distance for both sets of distances
+        # from plates per total spot numbers. The Wilcoxon test only depends
+        # on these frequencies, because the spot distances have just a few
+        # distinct values.
+        groups = self.get_distance_groups(spot_totals, distances)
 
-            # Get the lengths.
-            count_observed = len(observed)
-            count_expected = len(expected)
+        for n_spots, n_plates, observed, expected in groups:
+            # Get the number of distances.
+            count_observed = sum(observed)
+            count_expected = sum(expected)
 
             # The number of observed and expected spot distances must always
             # be the same.
@@ -740,20 +830,24 @@ class Analysis(AnalysisWorker):
                 continue
 
             # Calculate the means.
-            mean_observed = setlyze.std.mean(observed)
-            mean_expected = setlyze.std.mean(expected)
-
-            # Perform the two sample Wilcoxon test.
-            test_result = wilcox_test(observed, expected,
+            mean_observed = setlyze.std.weighted_mean(distances, observed)
+            mean_expected = setlyze.std.weighted_mean(distances, expected)
+
+            # Perform the two sample Wilcoxon test on the frequency tables.
+            # The test is performed by the backend set by the
+            # ``stats-backend`` configuration.
+            test_result = wilcox_test_groups([(observed, expected)],
+                values = distances,
                 alternative = "two.sided", paired = False,
                 conf_level = 1 - self.alpha_level,
                 conf_int = False)
+            method = test_result['method'][0]
 
             # Set some test attributes for the report.
             if not self.statistics['wilcoxon_spots_repeats']['attr']:
                 self.statistics['wilcoxon_spots_repeats']['attr'] = {
-                    'method': test_result['method'],
-                    'alternative': test_result['alternative'],
+                    'method': method,
+                    'alternative': "two.sided",
                     'conf_level': 1 - self.alpha_level,
                     'paired': False,
                     'repeats': self.n_repeats,
@@ -761,8 +855,8 @@ class Analysis(AnalysisWorker):
                 }
             if not self.statistics['wilcoxon_spots']['attr']:
                 self.statistics['wilcoxon_spots']['attr'] = {
-                    'method': test_result['method'],
-                    'alternative': test_result['alternative'],
+                    'method': method,
+                    'alternative': "two.sided",
                     'conf_level': 1 - self.alpha_level,
                     'paired': False,
                     'groups': 'spots',
@@ -772,7 +866,7 @@ class Analysis(AnalysisWorker):
             self.statistics['wilcoxon_spots']['results'][n_spots] = {
                 'n_plates': n_plates,
                 'n_values': count_observed,
-                'p_value': test_result['p.value'],
+                'p_value': float(test_result['p.value'][0]),
                 'mean_observed': mean_observed,
                 'mean_expected': mean_expected,
             }
@@ -781,13 +875,9 @@ class Analysis(AnalysisWorker):
             # Chi-squared test).
             spot_dist_to_prob = setlyze.config.cfg.get('spot-dist-to-prob-intra')
 
-            # Get the frequencies for the observed distances (used for the
-            # Chi-squared test).
-            observed_freq = setlyze.std.distance_frequency(observed, 'intra')
-
             # Also perform the Chi-squared test.
-            test_result = chisq_test(observed_freq.values(),
-                p = spot_dist_to_prob.values())
+            test_result = chisq_test(observed,
+                p = [spot_dist_to_prob[d] for d in distances])
 
             # If we find an expected frequency that is less than 5, do not save
             # the result.
@@ -819,11 +909,39 @@ class Analysis(AnalysisWorker):
 
         Each time before :meth:`wilcoxon_test_for_repeats` is called,
         :meth:`calculate_distances_intra_expected` is called to re-calculate
-        the expected values (which are random).
+        the expected values (which are random). Each repeat uses its own
+        random generator (see
+        :meth:`~setlyze.analysis.common.AnalysisWorker.get_repeat_random_state`).
+
+        If the ``expected-distances`` configuration is set to "exact", the
+        expected values are calculated just once with
+        :meth:`calculate_distances_intra_expected_exact`. Each repeat would
+        give the same result, so the test is performed once and the result
+        is counted `n` times.
+
+        The repeats are spread over multiple processes if possible (see
+        :meth:`~setlyze.analysis.common.AnalysisWorker.repeat_in_processes`).
 
         Design Part: 1.103
         """
-        for i in range(n):
+        if self.expected_distances == "exact":
+            self.calculate_distances_intra_expected_exact()
+            self.wilcoxon_test_for_repeats(weight=n)
+
+            # Update the progess bar for all repeats.
+            for i in range(n):
+                self.exec_task('progress.increase')
+            return
+
+        # Spread the repeats over multiple processes if possible. The
+        # expected values of the last repeat are used for the non-repeated
+        # test, so these are calculated again in this process.
+        if self.repeat_in_processes(n):
+            self.calculate_distances_intra_expected(
+                self.get_repeat_random_state(n - 1))
+            return
+
+        for repeat in xrange(self.first_repeat, self.first_repeat + n):
             if self.stopped():
                 return
 
@@ -832,12 +950,13 @@ class Analysis(AnalysisWorker):
 
             # The expected spot distances are random. So the expected values
             # differ a little on each repeat.
-            self.calculate_distances_intra_expected()
+            self.calculate_distances_intra_expected(
+                self.get_repeat_random_state(repeat))
 
             # And then we calculate the siginificance for each repeat.
             self.wilcoxon_test_for_repeats()
 
-    def wilcoxon_test_for_repeats(self):
+    def wilcoxon_test_for_repeats(self, weight=1):
         """Perform the Wilcoxon rank sum test for repeats.
 
         This method does the same Wilcoxon test from :meth:`calculate_significance`,
@@ -852,6 +971,7 @@ class Analysis(AnalysisWorker):
         you want to draw a solid conclusion from the test.
 
         This method will be put in a loop by :meth:`repeat_wilcoxon_test`.
+        The result of the test is counted `weight` times.
 
         Design Part: 1.102
         """
@@ -859,21 +979,21 @@ class Analysis(AnalysisWorker):
         spot_totals = [2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,
             23,24,-24]
 
-        for n_spots in spot_totals:
-            # Get both sets of distances from plates per total spot numbers.
-            observed = self.db.get_distances_matching_spots_total(
-                'spot_distances_observed', n_spots)
-            expected = self.db.get_distances_matching_spots_total(
-                'spot_distances_expected', n_spots)
+        # The frequency tables and means of all groups.
+        groups = []
+        group_means = []
 
-            # Iterators cannot be used directly by RPy, so convert them to
-            # lists first.
-            observed = list(observed)
-            expected = list(expected)
+        # The spot distances in the frequency tables.
+        distances = setlyze.std.DISTANCE_CLASSES[1:]
 
-            # Get the list lengths.
-            count_observed = len(observed)
-            count_expected = len(expected)
+        # Get the frequency of each spot distance for both sets of distances
+        # from plates per total spot numbers.
+        distance_groups = self.get_distance_groups(spot_totals, distances)
+
+        for n_spots, n_plates, observed, expected in distance_groups:
+            # Get the number of distances.
+            count_observed = sum(observed)
+            count_expected = sum(expected)
 
             # The number of observed and expected spot distances must always
             # be the same.
@@ -886,46 +1006,53 @@ class Analysis(AnalysisWorker):
                 continue
 
             # Calculate the means.
-            mean_observed = setlyze.std.mean(observed)
-            mean_expected = setlyze.std.mean(expected)
+            mean_observed = setlyze.std.weighted_mean(distances, observed)
+            mean_expected = setlyze.std.weighted_mean(distances, expected)
 
             # Check if this spots number is present in the statistics variable.
             # If not, create it.
             if n_spots not in self.statistics['wilcoxon_spots_repeats']['results']:
                 self.statistics['wilcoxon_spots_repeats']['results'][n_spots] = {
-                    'n_plates': self.db.matching_plates_total,
+                    'n_plates': n_plates,
                     'n_values': count_observed,
                     'n_significant': 0,
                     'n_attraction': 0,
                     'n_repulsion': 0
                 }
 
-            # Perform two sample Wilcoxon tests.
-            test_result = wilcox_test(observed, expected,
-                alternative = "two.sided", paired = False,
-                conf_level = 1 - self.alpha_level,
-                conf_int = False)
+            # Save the frequencies and means for this group, so the tests
+            # for all groups can be performed at once.
+            groups.append((observed, expected))
+            group_means.append((n_spots, mean_observed, mean_expected))
+
+        # Perform two sample Wilcoxon tests for all groups.
+        test_results = wilcox_test_groups(groups, values = distances,
+            alternative = "two.sided", paired = False,
+            conf_level = 1 - self.alpha_level,
+            conf_int = False)
 
+        for ((n_spots, mean_observed, mean_expected), p_value) in \
+                zip(group_means, test_results['p.value']):
             # Check if the result was significant. When all values are
             # 0 the p-value will be NaN. Function `is_significant` will
             # raise ValueError if the p-value is NaN.
             try:
-                significant = setlyze.std.is_significant(test_result['p.value'], self.alpha_level)
+                significant = setlyze.std.is_significant(p_value, self.alpha_level)
             except ValueError:
                 significant = False
 
             if significant:
-                # If so, increase significant counter with one.
-                self.statistics['wilcoxon_spots_repeats']['results'][n_spots]['n_significant'] += 1
+                # If so, increase significant counter.
+                self.statistics['wilcoxon_spots_repeats']['results'][n_spots]['n_significant'] += weight
 
                 # If significant, also check if there is preference or
                 # rejection for this plate area.
                 if mean_observed < mean_expected:
-                    # Increase attracion counter with one.
-                    self.statistics['wilcoxon_spots_repeats']['results'][n_spots]['n_attraction'] += 1
+                    # Increase attracion counter.
+                    self.statistics['wilcoxon_spots_repeats']['results'][n_spots]['n_attraction'] += weight
                 else:
-                    # Increase repulsion counter with one.
-                    self.statistics['wilcoxon_spots_repeats']['results'][n_spots]['n_repulsion'] += 1
+                    # Increase repulsion counter.
+                    self.statistics['wilcoxon_spots_repeats']['results'][n_spots]['n_repulsion'] += weight
 
     def generate_report(self):
         """Generate the analysis report.
@@ -935,6 +1062,8 @@ class Analysis(AnalysisWorker):
         self.result.set_analysis("Attraction within Species")
         self.result.set_option('Alpha level', self.alpha_level)
         self.result.set_option('Repeats', self.n_repeats)
+        self.result.set_option('Expected distances', self.expected_distances)
+        self.result.set_option('Random seed', self.seed)
         self.result.set_option('Total plates', self.affected)
         self.result.set_location_selections([self.locations_selection])
         self.result.set_species_selections([self.species_selection])
@@ -24,16 +24,21 @@
 import os
 import logging
 import multiprocessing
+import multiprocessing.pool
 import threading
 import time
+import zlib
 
 import gobject
+import numpy
 import pygtk
 pygtk.require('2.0')
 import gtk
 
 import setlyze
+import setlyze.cache
 import setlyze.config
+import setlyze.database
 import setlyze.report
 from setlyze.gui import ProgressDialogHandler
 from setlyze.std import slugify
@@ -59,6 +64,101 @@ def calculatestar(args):
     """
     return calculate(*args)
 
+# The database accessor of a worker process in a batch process pool. It is
+# set by :meth:`init_worker` and used by all analyses that run in that worker.
+_worker_db = None
+
+def init_worker(scratch="disk"):
+    """Initialize a worker process of a batch process pool.
+
+    This function is set as the initializer of the process pools in batch
+    mode and is called once in each worker process. It creates a single
+    database accessor for the worker process, which opens the local database
+    read-only. The value for `scratch` is passed to
+    :meth:`setlyze.database.get_database_accessor`.
+
+    All analyses that are executed by the worker then use this accessor (see
+    :meth:`AnalysisWorker.get_database_accessor`). So the connection to the
+    database is made only once for each worker instead of once for each job,
+    and the temporary tables created by the first job are reused by the
+    next jobs. Workers that are replaced by the pool (see the
+    ``maxtasksperchild`` argument of :py:class:`multiprocessing.Pool`) call
+    this function again.
+    """
+    global _worker_db
+    _worker_db = setlyze.database.get_database_accessor(scratch, readonly=True)
+
+# The counters in the results of the repeated Wilcoxon tests. These are summed
+# when the repeats are spread over multiple processes.
+REPEAT_COUNTERS = ('n_significant', 'n_attraction', 'n_repulsion',
+    'n_preference', 'n_rejection')
+
+# The number of seconds between checks whether an analysis was stopped while
+# its repeats are performed by worker processes.
+REPEAT_POLL_INTERVAL = 0.2
+
+def make_job_key(*inputs):
+    """Return an integer that identifies an analysis job.
+
+    The key is calculated from the inputs `inputs` of the analysis, for
+    example the locations and species selections. The same inputs always
+    give the same key, in any process. The key is an unsigned 32-bit integer,
+    so it can be used as part of the seed of a random generator (see
+    :meth:`AnalysisWorker.get_random_state`).
+    """
+    return zlib.crc32(repr(inputs)) & 0xffffffff
+
+def repeat_wilcoxon_test_part(args):
+    """Perform a part of the repeats of the Wilcoxon test of an analysis.
+
+    This function is executed by the worker processes created by
+    :meth:`AnalysisWorker.repeat_in_processes`. Argument `args` is a tuple
+    ``(cls, state, tables, first, n, parent_pid)``. A copy of the analysis
+    is made from class `cls` and the attributes in dictionary `state`. The
+    temporary tables in `tables` are copied to a new database connection
+    (see :meth:`AnalysisWorker.set_repeat_tables`). The copy then performs
+    `n` repeats, starting with repeat number `first`.
+
+    Returns the results of the repeated Wilcoxon test of the copy.
+    """
+    cls, state, tables, first, n, parent_pid = args
+    analysis = cls.__new__(cls)
+    analysis.__dict__.update(state)
+    analysis.first_repeat = first
+    analysis.parent_pid = parent_pid
+    analysis.repeat_processes = 1
+
+    analysis.db = analysis.get_database_accessor()
+    analysis.set_repeat_tables(tables)
+    analysis.repeat_wilcoxon_test(n)
+    analysis.on_exit()
+
+    return analysis.statistics[analysis.repeat_statistics]['results']
+
+class NoDaemonProcess(multiprocessing.Process):
+    """A process that is never daemonic.
+
+    The workers of :py:class:`multiprocessing.Pool` are daemonic processes,
+    and daemonic processes are not allowed to create child processes.
+    """
+
+    def _get_daemon(self):
+        return False
+
+    def _set_daemon(self, value):
+        pass
+
+    daemon = property(_get_daemon, _set_daemon)
+
+class NoDaemonPool(multiprocessing.pool.Pool):
+    """A process pool with workers that are allowed to create child processes.
+
+    This pool is used for running a single analysis, so that the analysis can
+    spread its repeats over multiple processes (see
+    :meth:`AnalysisWorker.repeat_in_processes`).
+    """
+    Process = NoDaemonProcess
+
 class Pool(threading.Thread):
     """Create a pool of worker processes.
 
@@ -295,7 +395,11 @@ class PrepareAnalysis(object):
     def __init__(self):
         self.alpha_level = None
         self.areas_definition = None
+        self.cache = None
+        self.cache_keys = []
+        self.cached_results = {}
         self.elapsed_time = None
+        self.expected_distances = None
         self.locations_selection = None
         self.locations_selections = [None,None]
         self.n_repeats = None
@@ -305,6 +409,7 @@ class PrepareAnalysis(object):
         self.n_processes = None
         self.report_prefix = "report_"
         self.results = []
+        self.seed = None
         self.signal_handlers = {}
         self.start_time = None
         self.species_selection = None
@@ -318,8 +423,86 @@ class PrepareAnalysis(object):
         This method uses the :mod:`setlyze.config` module to obtain the values.
         """
         self.alpha_level = setlyze.config.cfg.get('alpha-level')
+        self.expected_distances = setlyze.config.cfg.get('expected-distances')
         self.n_processes = setlyze.config.cfg.get('concurrent-processes')
         self.n_repeats = setlyze.config.cfg.get('test-repeats')
+        self.seed = setlyze.config.cfg.get('random-seed')
+
+    def get_seed_option(self):
+        """Return the value of the option "Random seed" for batch reports.
+
+        This is the configured random seed. Without a configured seed each
+        analysis uses its own seed, which is shown in the analysis report.
+        """
+        if self.seed is None:
+            return "Not set (new seed for each analysis)"
+        return self.seed
+
+    def check_cache(self, jobs):
+        """Return the jobs from `jobs` for which no report is cached.
+
+        Each job is a tuple ``(cls, args)`` as passed to :meth:`calculatestar`,
+        where the last item of `args` is the execute queue. The cache key of
+        each job is calculated from the other arguments (see
+        :meth:`setlyze.cache.make_key`). The reports that are found in the
+        cache are saved, and are combined with the reports of the other jobs
+        by :meth:`merge_cached_results`.
+
+        If the cache is not used (see :meth:`setlyze.cache.get_report_cache`)
+        or the local database has no fingerprint, all jobs are returned.
+        """
+        jobs = list(jobs)
+        self.cache = setlyze.cache.get_report_cache()
+        self.cache_keys = []
+        self.cached_results = {}
+        if not self.cache:
+            return jobs
+
+        fingerprint = setlyze.database.get_fingerprint(
+            setlyze.config.cfg.get('db-file'))
+        if not fingerprint:
+            self.cache = None
+            return jobs
+
+        new_jobs = []
+        for i, (cls, args) in enumerate(jobs):
+            key = setlyze.cache.make_key(cls, args[:-1], fingerprint)
+            self.cache_keys.append(key)
+            report = self.cache.get(key)
+            if report:
+                self.cached_results[i] = report
+            else:
+                new_jobs.append((cls, args))
+
+        logging.info("Found %d of %d reports in the cache" %
+            (len(self.cached_results), len(jobs)))
+        return new_jobs
+
+    def merge_cached_results(self, results):
+        """Return the reports `results` combined with the cached reports.
+
+        Argument `results` is the list of reports for the jobs returned by
+        :meth:`check_cache`. These reports are saved to the cache, and the
+        least recently used reports are removed from the cache if it got
+        too large. Returns the reports for all jobs that were passed to
+        :meth:`check_cache`, in the same order.
+        """
+        if not self.cache:
+            return results
+
+        merged = []
+        new_results = iter(results)
+        for i, key in enumerate(self.cache_keys):
+            if i in self.cached_results:
+                merged.append(self.cached_results[i])
+                continue
+            report = new_results.next()
+            # Aborted analyses return None, which is not cached.
+            if report is not None:
+                self.cache.put(key, report)
+            merged.append(report)
+        self.cache.evict()
+        return merged
 
     def get_progress_dialog(self):
         """Return a progress dialog and a handler for the dialog."""
@@ -425,7 +608,9 @@ class PrepareAnalysis(object):
 
         This method collects the results `results`, calculates the elapsed
         time since the start of the analyses, sets the progress of the progress
-        to 100%, strips empty reports from the results, exports the reports
+        to 100%, adds the cached reports to the results (see
+        :meth:`merge_cached_results`), strips empty reports from the results,
+        exports the reports
         if set by the user, and finally sends the "pool-finished" signal.
         The stripped results list is sent along with the signal. If there are
         no results (or all reports are empty), emit signal
@@ -447,6 +632,9 @@ class PrepareAnalysis(object):
         if self.pdialog_handler:
             self.pdialog_handler.complete()
 
+        # Save the new reports to the cache and add the cached reports.
+        results = self.merge_cached_results(results)
+
         # Only keep the non-empty results.
         results[:] = [r for r in results if r and not r.is_empty()]
 
@@ -546,14 +734,65 @@ class PrepareAnalysis(object):
 class AnalysisWorker(object):
     """Super class for :class:`Analysis` classes."""
 
+    # The temporary tables that are needed for the repeats of the Wilcoxon
+    # test, and the key of the repeated test in the statistics. These are
+    # set by subclasses that support :meth:`repeat_in_processes`.
+    repeat_tables = ()
+    repeat_statistics = None
+
     def __init__(self, execute_queue=None):
         self._stop = False
         self.alpha_level = setlyze.config.cfg.get('alpha-level')
         self.db = None
         self.dbfile = setlyze.config.cfg.get('db-file')
         self.execute_queue = execute_queue
+        self.expected_distances = setlyze.config.cfg.get('expected-distances')
+        self.first_repeat = 0
+        self.job_key = 0
         self.n_repeats = setlyze.config.cfg.get('test-repeats')
+        self.parent_pid = None
+        self.repeat_processes = setlyze.config.cfg.get('concurrent-processes')
         self.result = setlyze.report.Report()
+        self.scratch_database = setlyze.config.cfg.get('scratch-database')
+        self.seed = setlyze.config.cfg.get('random-seed')
+        if self.seed is None:
+            # Without a configured seed, each analysis gets a new seed. A
+            # new RandomState instance is seeded by the operating system,
+            # so analyses in forked processes get different seeds.
+            self.seed = int(numpy.random.RandomState().randint(0, 2**31-1))
+        self.random_state = self.get_random_state()
+
+    def set_job_key(self, *inputs):
+        """Set the job key for the analysis inputs `inputs`.
+
+        The job key (see :meth:`make_job_key`) is part of the seed of all
+        random generators of the analysis. So analyses with different
+        inputs get independent random numbers, also if they use the same
+        configured seed. This resets the random generator of the analysis.
+        """
+        self.job_key = make_job_key(*inputs)
+        self.random_state = self.get_random_state()
+
+    def get_random_state(self, *keys):
+        """Return a random generator for the analysis.
+
+        The random generator is a :py:class:`numpy.random.RandomState`
+        instance seeded with the seed of the analysis, the job key of the
+        analysis, and the integers `keys`. Different keys give independent
+        random generators.
+        """
+        return numpy.random.RandomState([self.seed, self.job_key] + list(keys))
+
+    def get_repeat_random_state(self, repeat):
+        """Return the random generator for repeat number `repeat`.
+
+        Each repeat of the Wilcoxon test has its own random generator, so the
+        random numbers of a repeat don't depend on the repeats that are
+        performed before it in the same process. This way the results are
+        the same for any number of processes (see
+        :meth:`repeat_in_processes`).
+        """
+        return self.get_random_state(repeat)
 
     def stop(self):
         """Stop the analysis."""
@@ -561,9 +800,133 @@ class AnalysisWorker(object):
         self._stop = True
 
     def stopped(self):
-        """Return True if the analysis was stopped, False otherwise."""
+        """Return True if the analysis was stopped, False otherwise.
+
+        An analysis that performs repeats for another analysis (see
+        :meth:`repeat_in_processes`) is also stopped when the process of
+        the other analysis is gone.
+        """
+        if self.parent_pid and hasattr(os, 'getppid') and \
+                os.getppid() != self.parent_pid:
+            return True
         return self._stop
 
+    def repeat_in_processes(self, n):
+        """Spread the `n` repeats of the Wilcoxon test over worker processes.
+
+        The repeats are divided into equal parts, one for each of the
+        ``concurrent-processes`` workers. Each worker performs its part with
+        :meth:`repeat_wilcoxon_test_part` on a copy of this analysis. Each
+        repeat uses its own random generator (see
+        :meth:`get_repeat_random_state`), so the results don't depend on the
+        number of workers. The counters of the repeated tests of all workers
+        are then summed in the statistics of this analysis.
+
+        The repeats are not spread if there is just one worker, or if this
+        analysis runs in a daemonic process (e.g. a worker of a batch process
+        pool, where the analyses themselves run in parallel). Returns True if
+        the repeats were performed by the workers, and False if the repeats
+        still need to be performed in this process.
+
+        While the workers are busy, this method checks every
+        `REPEAT_POLL_INTERVAL` seconds whether the analysis was stopped. If
+        so, the workers are terminated and True is returned without adding
+        their results.
+        """
+        processes = min(self.repeat_processes, n)
+        if processes < 2 or multiprocessing.current_process().daemon:
+            return False
+
+        # Divide the repeats over the workers.
+        parts = [n / processes + (1 if i < n % processes else 0)
+            for i in range(processes)]
+        firsts = [sum(parts[:i]) for i in range(processes)]
+
+        # The attributes of this analysis that are copied to the workers.
+        state = dict([(name, value) for name, value in self.__dict__.iteritems()
+            if name not in ('db', 'result')])
+        tables = self.get_repeat_tables()
+        jobs = [(self.__class__, state, tables, first, part, os.getpid())
+            for first, part in zip(firsts, parts)]
+
+        pool = multiprocessing.Pool(processes)
+        try:
+            result = pool.map_async(repeat_wilcoxon_test_part, jobs,
+                chunksize=1)
+            pool.close()
+
+            # Wait for the workers. If the analysis is stopped, terminate the
+            # workers instead of waiting for them to finish their repeats.
+            while not result.ready():
+                if self.stopped():
+                    logging.debug("%s: Terminating the repeat workers" % self)
+                    pool.terminate()
+                    return True
+                result.wait(REPEAT_POLL_INTERVAL)
+            parts_results = result.get()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        # Sum the counters of all workers.
+        results = self.statistics[self.repeat_statistics]['results']
+        for part_results in parts_results:
+            for key, stats in part_results.iteritems():
+                if key not in results:
+                    results[key] = stats
+                    continue
+                for counter in REPEAT_COUNTERS:
+                    if counter in stats:
+                        results[key][counter] += stats[counter]
+        return True
+
+    def get_repeat_tables(self):
+        """Return the contents of the temporary tables in `repeat_tables`.
+
+        Returns a list of tuples ``(table, rows)``.
+        """
+        cursor = self.db.conn.cursor()
+        tables = []
+        for table in self.repeat_tables:
+            cursor.execute("SELECT * FROM %s" % table)
+            tables.append( (table, cursor.fetchall()) )
+        cursor.close()
+        return tables
+
+    def set_repeat_tables(self, tables):
+        """Create the temporary tables in `tables` and fill them.
+
+        Argument `tables` is a list as returned by :meth:`get_repeat_tables`.
+        The tables are created with the ``create_table_`` methods of the
+        database accessor.
+        """
+        cursor = self.db.conn.cursor()
+        for table, rows in tables:
+            getattr(self.db, 'create_table_%s' % table)()
+            cursor.execute("DELETE FROM %s" % table)
+            if rows:
+                placeholders = ",".join(["?"] * len(rows[0]))
+                cursor.executemany("INSERT INTO %s VALUES (%s)" %
+                    (table, placeholders), rows)
+        self.db.conn.commit()
+        cursor.close()
+
+    def get_database_accessor(self):
+        """Return an object that facilitates access to the database.
+
+        If the analysis runs in a worker process that was initialized with
+        :meth:`init_worker`, the database accessor of the worker process is
+        returned. Otherwise a new database accessor is returned. The
+        analyses only read from the local database, so it is opened
+        read-only.
+        """
+        if _worker_db:
+            return _worker_db
+        return setlyze.database.get_database_accessor(self.scratch_database,
+            readonly=True)
+
     def exec_task(self, task, *args, **kargs):
         """Add a task to the execute queue.
 
@@ -582,7 +945,8 @@ class AnalysisWorker(object):
 
         Tasks:
 
-        * Close the connection to the database.
+        * Close the connection to the database. The connection of a
+          worker process is left open for the next analysis.
         """
-        if self.db:
+        if self.db and self.db is not _worker_db:
             self.db.conn.close()
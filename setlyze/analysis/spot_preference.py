@@ -60,14 +60,15 @@ pygtk.require('2.0')
 import gtk
 
 import setlyze
+import setlyze.cache
 import setlyze.config
 import setlyze.gui
 import setlyze.locale
 import setlyze.std
 import setlyze.report
-from setlyze.analysis.common import (calculatestar, ProcessGateway,
-    PrepareAnalysis, AnalysisWorker)
-from setlyze.stats import chisq_test, wilcox_test
+from setlyze.analysis.common import (calculatestar, init_worker,
+    ProcessGateway, PrepareAnalysis, AnalysisWorker, NoDaemonPool)
+from setlyze.stats import chisq_test, wilcox_test_groups
 
 # The number of progress steps for this analysis.
 PROGRESS_STEPS = 7
@@ -214,19 +215,29 @@ class Begin(PrepareAnalysis):
         # Create a progress dialog and a handler.
         self.pdialog, self.pdialog_handler = self.get_progress_dialog()
 
-        # Set the total number of times we decide to update the progress dialog.
-        self.pdialog_handler.set_total_steps(PROGRESS_STEPS + self.n_repeats)
-
         # Create a progress task executor.
         gw = ProcessGateway()
         gw.set_pdialog_handler(self.pdialog_handler)
         gw.start()
 
-        # Create a process pool with a single worker.
-        self.pool = multiprocessing.Pool(1)
+        # Create a list with the job. The job is not added if its report is
+        # cached.
+        jobs = self.check_cache([(Analysis, (locations, species,
+            areas_definition, gw.queue))])
+
+        # Don't start a process pool if all reports are cached. A pool does
+        # not call the callback for an empty list of jobs.
+        if not jobs:
+            self.on_pool_finished([])
+            return
+
+        # Set the total number of times we decide to update the progress dialog.
+        self.pdialog_handler.set_total_steps((PROGRESS_STEPS + self.n_repeats) *
+            len(jobs))
 
-        # Create a list with the job.
-        jobs = [(Analysis, (locations, species, areas_definition, gw.queue))]
+        # Create a process pool with a single worker. The worker must be
+        # able to create child processes for the repeats of the analysis.
+        self.pool = NoDaemonPool(1)
 
         # Add the job to the pool.
         self.pool.map_async(calculatestar, jobs, callback=self.on_pool_finished)
@@ -274,22 +285,35 @@ class BeginBatch(Begin):
         # Create a progress dialog and a handler.
         self.pdialog, self.pdialog_handler = self.get_progress_dialog()
 
-        # Set the total number of times we decide to update the progress dialog.
-        self.pdialog_handler.set_total_steps((PROGRESS_STEPS + self.n_repeats) *
-            len(species))
-
         # Create a gateway to the main process for child processes.
         gw = ProcessGateway()
         gw.set_pdialog_handler(self.pdialog_handler)
         gw.start()
 
-        # Create a process pool with workers.
-        cp = setlyze.config.cfg.get('concurrent-processes')
-        self.pool = multiprocessing.Pool(cp)
+        # Create a list of jobs. Jobs for which a report is cached are not
+        # added to the pool.
+        jobs = self.check_cache(((Analysis, (locations, sp, areas_definition,
+            gw.queue)) for sp in species))
+        logging.info("Adding %d jobs to the queue" % len(jobs))
+
+        # Don't start a process pool if all reports are cached. A pool does
+        # not call the callback for an empty list of jobs.
+        if not jobs:
+            self.on_pool_finished([])
+            return
+
+        # Set the total number of times we decide to update the progress dialog.
+        self.pdialog_handler.set_total_steps((PROGRESS_STEPS + self.n_repeats) *
+            len(jobs))
 
-        # Create a list of jobs.
-        logging.info("Adding %d jobs to the queue" % len(species))
-        jobs = ((Analysis, (locations, sp, areas_definition, gw.queue)) for sp in species)
+        # Create a process pool with workers. Each worker makes a single
+        # database connection which is reused for all jobs of the worker.
+        # Workers are replaced after 50 jobs to free the memory they hold;
+        # a new worker makes its own connection.
+        cp = setlyze.config.cfg.get('concurrent-processes')
+        scratch = setlyze.config.cfg.get('scratch-database')
+        self.pool = multiprocessing.Pool(cp, init_worker, (scratch,),
+            maxtasksperchild=50)
 
         # Add the jobs to the pool.
         self.pool.map_async(calculatestar, jobs, callback=self.on_pool_finished)
@@ -420,6 +444,7 @@ class BeginBatch(Begin):
         # Set analysis options.
         report.set_option('Alpha level', self.alpha_level)
         report.set_option('Repeats', self.n_repeats)
+        report.set_option('Random seed', self.get_seed_option())
         report.set_option('Statistical tests', "Chi-squared test, Wilcoxon rank sum test")
         if self.elapsed_time:
             report.set_option('Running time', setlyze.std.seconds_to_hms(self.elapsed_time))
@@ -464,14 +489,23 @@ class Analysis(AnalysisWorker):
     Design Part: 1.3.2
     """
 
+    # The repeats of the Wilcoxon test don't need any temporary tables.
+    repeat_statistics = 'wilcoxon_areas_repeats'
+
     def __init__(self, locations, species, areas_definition, execute_queue=None):
         super(Analysis, self).__init__(execute_queue)
         logging.info("Performing %s" % setlyze.locale.text('analysis-spot-preference'))
         self.locations_selection = locations
         self.species_selection = species
         self.areas_definition = areas_definition
+        # The definition is normalized, because the order of the items of a
+        # dictionary is not part of the definition.
+        self.set_job_key(locations, species,
+            setlyze.cache.normalize(areas_definition))
         self.chisq_observed = None # Design Part: 2.25
         self.chisq_expected = None # Design Part: 2.26
+        self.area_totals_observed = None # Design Part: 2.41
+        self.area_totals_expected = None # Design Part: 2.42
         self.statistics = {
             'chi_squared_areas': {'attr': None, 'results': {}},
             'wilcoxon_areas': {'attr': None, 'results': collections.OrderedDict()},
@@ -492,10 +526,7 @@ class Analysis(AnalysisWorker):
         Calls the necessary methods for the analysis in the right order
         and do some data checks:
 
-        * :meth:`~setlyze.database.AccessLocalDB.get_record_ids` or
-          :meth:`~setlyze.database.AccessRemoteDB.get_record_ids`
-        * :meth:`~setlyze.database.AccessLocalDB.set_species_spots` or
-          :meth:`~setlyze.database.AccessRemoteDB.set_species_spots`
+        * :meth:`~setlyze.database.AccessLocalDB.set_species_spots_from_selection`
         * :meth:`~setlyze.database.AccessDBGeneric.make_plates_unique`
         * :meth:`set_plate_area_totals_observed`
         * :meth:`get_defined_areas_totals_observed`
@@ -509,25 +540,22 @@ class Analysis(AnalysisWorker):
         """
         if not self.stopped():
             # Make an object that facilitates access to the database.
-            self.db = setlyze.database.get_database_accessor()
+            self.db = self.get_database_accessor()
 
             assert isinstance(self.db, setlyze.database.AccessLocalDB), \
                 "Expected an instance of AccessLocalDB. Got %s" % self.db.__class__.__name__
 
             # Create temporary tables.
             self.db.create_table_species_spots_1()
-            self.db.create_table_plate_area_totals_observed()
-            self.db.create_table_plate_area_totals_expected()
             self.db.conn.commit()
 
-            # Get the record IDs that match the localities+species selection.
-            rec_ids = self.db.get_record_ids(self.locations_selection, self.species_selection)
-            logging.info("\tTotal records that match the species+locations selection: %d" % len(rec_ids))
-
-            # Make a spots table for the selected species.
+            # Make a spots table with the records that match the
+            # localities+species selection.
             logging.info("\tCreating table with species spots...")
             self.exec_task('progress.increase', "Creating table with species spots...")
-            self.db.set_species_spots(rec_ids, slot=0)
+            n_records = self.db.set_species_spots_from_selection(
+                self.locations_selection, self.species_selection, slot=0)
+            logging.info("\tTotal records that match the species+locations selection: %d" % n_records)
 
             # Combine records with the same plate ID.
             logging.info("\tCombining records with the same plate ID...")
@@ -598,151 +626,78 @@ class Analysis(AnalysisWorker):
         return self.result
 
     def set_plate_area_totals_observed(self):
-        """Fills the "plate_area_totals_observed" table in the local database.
+        """Set the observed plate area totals.
+
+        The number of positive spots in each default plate area is
+        calculated from the spot masks of the plates in table
+        "species_spots_1" with :meth:`setlyze.std.get_plate_area_totals`.
+        The totals are saved to `area_totals_observed`, an array with a row
+        for each plate ordered by plate ID, and a column for each plate area
+        in :data:`setlyze.std.PLATE_AREAS`.
 
         See :ref:`design-part-data-2.41`.
 
         Design Part: 1.62
         """
-
-        # From plate area to spot numbers.
-        area2spots = {'A': (1,5,21,25),
-            'B': (2,3,4,6,10,11,15,16,20,22,23,24),
-            'C': (7,8,9,12,14,17,18,19),
-            'D': (13,),
-            }
-
-        connection = self.db.conn
-        cursor = connection.cursor()
-        cursor2 = connection.cursor()
-
-        # Empty the plate_area_totals table.
-        cursor.execute("DELETE FROM plate_area_totals_observed")
-        connection.commit()
-
-        # Get all records from the table.
-        cursor.execute( "SELECT rec_pla_id,"
-                        "rec_sur1,rec_sur2,rec_sur3,rec_sur4,rec_sur5,"
-                        "rec_sur6,rec_sur7,rec_sur8,rec_sur9,rec_sur10,"
-                        "rec_sur11,rec_sur12,rec_sur13,rec_sur14,rec_sur15,"
-                        "rec_sur16,rec_sur17,rec_sur18,rec_sur19,rec_sur20,"
-                        "rec_sur21,rec_sur22,rec_sur23,rec_sur24,rec_sur25 "
-                        "FROM species_spots_1")
-
-        # Fill the totals table.
-        for record in cursor:
-            # From plate area to total spots for a record.
-            area_totals = {'A': 0, 'B': 0, 'C': 0, 'D': 0}
-
-            # Check for each spot in the record row if the species is
-            # present. 'precence' == 1 if the species is present on
-            # that spot.
-            for spot, precence in enumerate(record[1:], start=1):
-                # In case the 'precence' boolean is False, just continue
-                # with the next spot.
-                if not precence:
-                    continue
-
-                # If we pass here, the species is present on this spot.
-                # Walk through each area in the area2spots dictionary.
-                for area, area_spots in area2spots.iteritems():
-                    # Check if the current spot ID belongs to that area.
-                    if spot in area_spots:
-                        # If so, add 1 to the species total of that area.
-                        area_totals[area] += 1
-                        # Once a match was found, that same spot ID can't
-                        # belong to another area. So continue with the next
-                        # spot for this record.
-                        break
-
-            # Save the plate area totals for this record to the database.
-            cursor2.execute("INSERT INTO plate_area_totals_observed VALUES (?,?,?,?,?)",
-                            (record[0],
-                            area_totals['A'],
-                            area_totals['B'],
-                            area_totals['C'],
-                            area_totals['D'])
-                            )
-
-        # Commit the database transaction.
-        connection.commit()
-
-        # Close connection with the local database.
+        cursor = self.db.conn.cursor()
+        cursor.execute( "SELECT rec_spots "
+                        "FROM species_spots_1 "
+                        "ORDER BY rec_pla_id"
+                        )
+        masks = [row[0] for row in cursor]
         cursor.close()
-        cursor2.close()
 
-    def set_plate_area_totals_expected(self):
-        """Fills the "plate_area_totals_expected" table in the local database.
+        self.area_totals_observed = setlyze.std.get_plate_area_totals(masks)
 
-        See :ref:`design-part-data-2.42`.
+    def get_plate_spot_totals(self):
+        """Return the number of positive spots for each plate in
+        `area_totals_observed`.
 
-        Design Part: 1.63
+        Returns an array with the number of positive spots for each plate,
+        ordered by plate ID. The number of positive spots is the sum of the
+        spot totals of all plate areas.
         """
+        return self.area_totals_observed.sum(axis=1)
 
-        # From plate area to spot numbers.
-        area2spots = {'A': (1,5,21,25),
-            'B': (2,3,4,6,10,11,15,16,20,22,23,24),
-            'C': (7,8,9,12,14,17,18,19),
-            'D': (13,),
-            }
+    def set_plate_area_totals_expected(self, random_state=None):
+        """Set the expected plate area totals.
 
-        # Make a connection with the local database.
-        connection = self.db.conn
-        cursor = connection.cursor()
-        cursor2 = connection.cursor()
+        The random area totals for each plate in `area_totals_observed` are
+        generated with :meth:`setlyze.std.get_random_area_totals`. Argument
+        `random_state` is an optional random generator for the area totals
+        (see
+        :meth:`~setlyze.analysis.common.AnalysisWorker.get_repeat_random_state`).
+        If it is not set, the random generator of the analysis is used.
 
-        # Empty the plate_area_totals_expected table before we use it
-        # again.
-        cursor.execute("DELETE FROM plate_area_totals_expected")
-        connection.commit()
+        The random area totals are those of an equal number of randomly
+        placed positive spots for each plate. They are saved to
+        `area_totals_expected`, which has the same layout as
+        `area_totals_observed`.
 
-        # Get the number of positive spots for each plate. This
-        # will serve as a template for the random spots.
-        cursor.execute( "SELECT pla_id, area_a, area_b, area_c, area_d "
-                        "FROM plate_area_totals_observed"
-                        )
+        See :ref:`design-part-data-2.42`.
 
-        for pla_id, area_a, area_b, area_c, area_d in cursor:
-            # Calculate the number of positive spots by summing the spot totals
-            # of all plate areas for the current plate.
-            n_spots = area_a + area_b + area_c + area_d
-
-            # Use that number of spots to generate the same number of
-            # random spots.
-            random_spots = setlyze.std.get_random_for_plate(n_spots)
-
-            # From plate area to total spots for a record.
-            area_totals = {'A': 0, 'B': 0, 'C': 0, 'D': 0}
-
-            # Sort the random positive spots in the correct areas in
-            # 'area_totals'.
-            for spot in random_spots:
-                # Walk through each area in the area2spots dictionary.
-                for area, area_spots in area2spots.iteritems():
-                    # Check if the current spot ID belongs to that area.
-                    if spot in area_spots:
-                        # If so, add 1 to the species total of that area.
-                        area_totals[area] += 1
-                        # Once a match was found, that same spot ID can't
-                        # belong to another area. So continue with the next
-                        # spot for this record.
-                        break
-
-            # Save the plate area totals for this record to the database.
-            cursor2.execute("INSERT INTO plate_area_totals_expected VALUES (?,?,?,?,?)",
-                            (pla_id,
-                            area_totals['A'],
-                            area_totals['B'],
-                            area_totals['C'],
-                            area_totals['D'])
-                            )
-
-        # Commit the database transaction.
-        connection.commit()
-
-        # Close connection with the local database.
-        cursor.close()
-        cursor2.close()
+        Design Part: 1.63
+        """
+        # Use the number of positive spots of each plate to generate the
+        # area totals for the same number of random spots on each plate.
+        if random_state is None:
+            random_state = self.random_state
+        self.area_totals_expected = setlyze.std.get_random_area_totals(
+            self.get_plate_spot_totals(), 1, random_state)[0]
+
+    def get_area_totals(self, area_totals, area_group):
+        """Return the total number of positive spots in an area group for
+        each plate.
+
+        Argument `area_totals` is either `area_totals_observed` or
+        `area_totals_expected`. The area group `area_group` can be a
+        sequence containing a combination of the letters A, B, C, and D.
+        Each letter is one of the default areas on a SETL plate.
+
+        Returns a list with a total for each plate.
+        """
+        columns = [setlyze.std.PLATE_AREAS.index(area) for area in area_group]
+        return area_totals[:,columns].sum(axis=1).tolist()
 
     def calculate_significance_wilcoxon(self):
         """Perform statistical tests to check for significant differences.
@@ -806,15 +761,10 @@ class Analysis(AnalysisWorker):
 
         for area_group in area_groups:
             # Get area totals per area group per plate.
-            observed = self.db.get_area_totals(
-                'plate_area_totals_observed', area_group)
-            expected = self.db.get_area_totals(
-                'plate_area_totals_expected', area_group)
-
-            # Iterators cannot be used directly by RPy, so convert them to
-            # lists first.
-            observed = list(observed)
-            expected = list(expected)
+            observed = self.get_area_totals(self.area_totals_observed,
+                area_group)
+            expected = self.get_area_totals(self.area_totals_expected,
+                area_group)
 
             # Calculate the number of species encounters for the current
             # area group.
@@ -842,17 +792,19 @@ class Analysis(AnalysisWorker):
             # Create a human readable string with the areas in the area group.
             area_group_str = "+".join(area_group)
 
-            # Perform two sample Wilcoxon tests.
-            test_result = wilcox_test(observed, expected,
+            # Perform two sample Wilcoxon tests. The test is performed by
+            # the backend set by the ``stats-backend`` configuration.
+            test_result = wilcox_test_groups([(observed, expected)],
                 alternative = "two.sided", paired = False,
                 conf_level = 1 - self.alpha_level,
                 conf_int = False)
+            method = test_result['method'][0]
 
             # Set the attributes for the tests.
             if not self.statistics['wilcoxon_areas_repeats']['attr']:
                 self.statistics['wilcoxon_areas_repeats']['attr'] = {
-                    'method': test_result['method'],
-                    'alternative': test_result['alternative'],
+                    'method': method,
+                    'alternative': "two.sided",
                     'conf_level': 1 - self.alpha_level,
                     'paired': False,
                     'groups': "areas",
@@ -861,8 +813,8 @@ class Analysis(AnalysisWorker):
 
             if not self.statistics['wilcoxon_areas']['attr']:
                 self.statistics['wilcoxon_areas']['attr'] = {
-                    'method': test_result['method'],
-                    'alternative': test_result['alternative'],
+                    'method': method,
+                    'alternative': "two.sided",
                     'conf_level': 1 - self.alpha_level,
                     'paired': False,
                     'groups': "areas",
@@ -873,7 +825,7 @@ class Analysis(AnalysisWorker):
                 'n_values': count_observed,
                 'n_sp_observed': species_encouters_observed,
                 'n_sp_expected': species_encouters_expected,
-                'p_value': test_result['p.value'],
+                'p_value': float(test_result['p.value'][0]),
                 'mean_observed': mean_observed,
                 'mean_expected': mean_expected,
             }
@@ -962,11 +914,24 @@ class Analysis(AnalysisWorker):
 
         Each time before :meth:`wilcoxon_test_for_repeats` is
         called, :meth:`set_plate_area_totals_expected` is called to
-        re-calculate the expected values (which are random).
+        re-calculate the expected values (which are random). Each repeat
+        uses its own random generator (see
+        :meth:`~setlyze.analysis.common.AnalysisWorker.get_repeat_random_state`).
+
+        The repeats are spread over multiple processes if possible (see
+        :meth:`~setlyze.analysis.common.AnalysisWorker.repeat_in_processes`).
 
         Design Part: 1.65
         """
-        for i in range(n):
+        # Spread the repeats over multiple processes if possible. The
+        # expected values of the last repeat are used for the non-repeated
+        # test, so these are calculated again in this process.
+        if self.repeat_in_processes(n):
+            self.set_plate_area_totals_expected(
+                self.get_repeat_random_state(n - 1))
+            return
+
+        for repeat in xrange(self.first_repeat, self.first_repeat + n):
             # Test if the cancel button is pressed.
             if self.stopped():
                 return
@@ -976,7 +941,8 @@ class Analysis(AnalysisWorker):
 
             # The expected area totals are random. So the expected values
             # differ a little on each repeat.
-            self.set_plate_area_totals_expected()
+            self.set_plate_area_totals_expected(
+                self.get_repeat_random_state(repeat))
 
             # And then we calculate the siginificance for each repeat.
             self.wilcoxon_test_for_repeats()
@@ -1004,21 +970,20 @@ class Analysis(AnalysisWorker):
         area_groups = [('A'),('B'),('C'),('D'),('A','B'),('C','D'),
             ('A','B','C'),('B','C','D')]
 
-        # Perform the test on each area group.
+        # The area totals and means of all area groups.
+        groups = []
+        group_means = []
+
+        # Get the area totals for each area group.
         for area_group in area_groups:
             # Create a human readable string with the areas in the area group.
             area_group_str = "+".join(area_group)
 
             # Get area totals per area group per plate.
-            observed = self.db.get_area_totals(
-                'plate_area_totals_observed', area_group)
-            expected = self.db.get_area_totals(
-                'plate_area_totals_expected', area_group)
-
-            # Iterators cannot be used directly by RPy, so convert them to
-            # lists first.
-            observed = list(observed)
-            expected = list(expected)
+            observed = self.get_area_totals(self.area_totals_observed,
+                area_group)
+            expected = self.get_area_totals(self.area_totals_expected,
+                area_group)
 
             # A minimum of two positive spots totals are required for the
             # significance test. So skip this spots number if it's less.
@@ -1050,17 +1015,24 @@ class Analysis(AnalysisWorker):
             mean_observed = setlyze.std.mean(observed)
             mean_expected = setlyze.std.mean(expected)
 
-            # Perform two sample Wilcoxon tests.
-            test_result = wilcox_test(observed, expected,
-                alternative = "two.sided", paired = False,
-                conf_level = 1 - self.alpha_level,
-                conf_int = False)
+            # Save the area totals and means for this area group, so the
+            # tests for all area groups can be performed at once.
+            groups.append((observed, expected))
+            group_means.append((area_group_str, mean_observed, mean_expected))
+
+        # Perform two sample Wilcoxon tests for all area groups.
+        test_results = wilcox_test_groups(groups,
+            alternative = "two.sided", paired = False,
+            conf_level = 1 - self.alpha_level,
+            conf_int = False)
 
+        for ((area_group_str, mean_observed, mean_expected), p_value) in \
+                zip(group_means, test_results['p.value']):
             # Check if the result was significant. When all values are 0
             # the p-value will be NaN. Function `is_significant` will raise
             # ValueError if the p-value is NaN.
             try:
-                significant = setlyze.std.is_significant(test_result['p.value'], self.alpha_level)
+                significant = setlyze.std.is_significant(p_value, self.alpha_level)
             except ValueError:
                 continue
 
@@ -1099,13 +1071,11 @@ class Analysis(AnalysisWorker):
         }
 
         for area_name, area_group in self.areas_definition.iteritems():
-            # Get both sets of distances from plates per total spot numbers.
-            observed = self.db.get_area_totals('plate_area_totals_observed',
+            # Sum the observed totals of all plates for the areas in the
+            # area group.
+            observed = self.get_area_totals(self.area_totals_observed,
                 area_group)
-
-            # Sum all totals in the correct area name.
-            for total in observed:
-                areas_totals_observed[area_name] += total
+            areas_totals_observed[area_name] += sum(observed)
 
         # Remove unused areas from the variable.
         delete = []
@@ -1163,6 +1133,7 @@ class Analysis(AnalysisWorker):
         self.result.set_analysis("Spot Preference")
         self.result.set_option('Alpha level', self.alpha_level)
         self.result.set_option('Repeats', self.n_repeats)
+        self.result.set_option('Random seed', self.seed)
         self.result.set_option('Total plates', self.n_plates_unique)
         self.result.set_location_selections([self.locations_selection])
         self.result.set_species_selections([self.species_selection])
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2010-2015, GiMaRIS <info@gimaris.com>
+#
+#  This file is part of SETLyze - A tool for analyzing the settlement
+#  of species on SETL plates.
+#
+#  SETLyze is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  SETLyze is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""This module provides a persistent cache for analysis reports.
+
+The reports returned by the analyses (see :class:`setlyze.report.Report`)
+are pickled to files in the folder set by the configuration ``cache-path``.
+Each report is saved under a key that is calculated from the inputs of the
+analysis, the configurations that affect the results, and the fingerprint of
+the SETL data in the local database (see :meth:`make_key`). When an analysis
+is started again with the same inputs on the same data, the report is loaded
+from the cache instead of performing the analysis again (see
+:meth:`setlyze.analysis.common.PrepareAnalysis.check_cache`).
+
+The size of the cache is limited by the configuration ``cache-size``. When
+the cache gets larger, the least recently used reports are removed.
+"""
+
+import cPickle as pickle
+import hashlib
+import logging
+import os
+
+import setlyze
+import setlyze.config
+
+# The configurations that affect the results of the analyses. The values of
+# these configurations are part of the cache keys.
+ANALYSIS_OPTIONS = ('alpha-level', 'test-repeats', 'random-seed',
+    'expected-distances', 'stats-backend')
+
+# The file name extension of cached reports.
+REPORT_EXTENSION = '.pickle'
+
+def get_report_cache():
+    """Return the report cache, or None if the cache is not used.
+
+    The cache is not used if the configuration ``cache-size`` is 0, or if no
+    random seed is set. Without a random seed the analyses use new random
+    numbers each time, so they should not return a cached report.
+    """
+    if setlyze.config.cfg.get('cache-size') == 0:
+        return None
+    if setlyze.config.cfg.get('random-seed') is None:
+        return None
+    return ReportCache()
+
+def normalize(value):
+    """Return `value` with a representation that doesn't depend on order.
+
+    Dictionaries are converted to sorted tuples of key-value pairs, and lists
+    to tuples. This is done recursively.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize(v)) for k, v in value.iteritems()))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(v) for v in value)
+    return value
+
+def make_key(cls, args, fingerprint):
+    """Return the cache key for an analysis job.
+
+    The key is calculated from the analysis class `cls`, the arguments `args`
+    for the analysis, the values of the configurations in
+    `ANALYSIS_OPTIONS`, the fingerprint `fingerprint` of the SETL data (see
+    :meth:`setlyze.database.get_fingerprint`), and the version of SETLyze. The
+    key is the SHA-1 hash of these inputs as a hexadecimal string.
+    """
+    options = [setlyze.config.cfg.get(name) for name in ANALYSIS_OPTIONS]
+    inputs = (setlyze.__version__, cls.__module__, cls.__name__,
+        normalize(args), options, fingerprint)
+    return hashlib.sha1(repr(inputs)).hexdigest()
+
+class ReportCache(object):
+    """Persistent cache for analysis reports.
+
+    Reports are saved to the folder `path`, one file per report. The total
+    size of the files is limited to `max_size` megabytes. The defaults for
+    these are set by the configurations ``cache-path`` and ``cache-size``.
+    The modification time of a file is updated each time the report is loaded,
+    so the least recently used reports can be removed first (see
+    :meth:`evict`).
+    """
+
+    def __init__(self, path=None, max_size=None):
+        if path is None:
+            path = setlyze.config.cfg.get('cache-path')
+        if max_size is None:
+            max_size = setlyze.config.cfg.get('cache-size')
+        self.path = path
+        self.max_size = max_size * 1024 * 1024
+
+    def get_filename(self, key):
+        """Return the path to the file for the report with key `key`."""
+        return os.path.join(self.path, key + REPORT_EXTENSION)
+
+    def get(self, key):
+        """Return the cached report with key `key`.
+
+        Returns None if no report is cached for `key`. Files that can't be
+        loaded are removed.
+        """
+        filename = self.get_filename(key)
+        if not os.path.isfile(filename):
+            return None
+
+        try:
+            f = open(filename, 'rb')
+            try:
+                report = pickle.load(f)
+            finally:
+                f.close()
+        except Exception as e:
+            logging.warning("Removing cached report %s: %s" % (filename, e))
+            self.remove(filename)
+            return None
+
+        # Mark the report as recently used.
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+        return report
+
+    def put(self, key, report):
+        """Save the report `report` to the cache with key `key`.
+
+        The report is first written to a temporary file, which is then renamed.
+        So other processes never load a partly written report. This doesn't
+        remove old reports; call :meth:`evict` for that.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        filename = self.get_filename(key)
+        tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+        f = open(tmp_filename, 'wb')
+        try:
+            pickle.dump(report, f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+
+        # On Windows a file can't be renamed to an existing file.
+        if os.path.isfile(filename):
+            self.remove(filename)
+        os.rename(tmp_filename, filename)
+
+    def remove(self, filename):
+        """Remove the cached report file `filename`, if possible."""
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove the least recently used reports from the cache.
+
+        Reports are removed until the total size of the cached reports is not
+        larger than the maximum size of the cache.
+        """
+        if not os.path.isdir(self.path):
+            return
+
+        files = []
+        for name in os.listdir(self.path):
+            if not name.endswith(REPORT_EXTENSION):
+                continue
+            filename = os.path.join(self.path, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, filename))
+
+        total_size = sum([f[1] for f in files])
+        for mtime, size, filename in sorted(files):
+            if total_size <= self.max_size:
+                break
+            self.remove(filename)
+            total_size -= size
+
+    def clear(self):
+        """Remove all reports from the cache."""
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if name.endswith(REPORT_EXTENSION):
+                self.remove(os.path.join(self.path, name))
@@ -51,6 +51,9 @@ DB_FILE = os.path.join(DATA_PATH, 'setl_local.db')
 # Path to the configurations file.
 CONF_FILE = os.path.join(DATA_PATH, 'setlyze.conf')
 
+# Path to the folder with cached analysis results.
+CACHE_PATH = os.path.join(DATA_PATH, 'cache')
+
 # Set the default number of processes for batch mode from the CPU count.
 # By default use 90% of the number of CPUs.
 try:
@@ -115,8 +118,10 @@ DEFAULT_CONFIG = [
     ('data-path', DATA_PATH),
     # Absolute path to the local database file.
     ('db-file', DB_FILE),
+    # Absolute path to the folder with cached analysis results.
+    ('cache-path', CACHE_PATH),
     # Minimum database version required.
-    ('minimum-db-version', 0.4),
+    ('minimum-db-version', 0.8),
     # Path to localities file.
     ('localities-file', None),
     # Path to species file.
@@ -134,9 +139,33 @@ DEFAULT_CONFIG = [
     ('spot-dist-to-prob-inter', SPOT_DIST_TO_PROB_INTER),
     # Number of repeats to perform for statistical tests.
     ('test-repeats', 20),
+    # How the expected spot distances are obtained. With "random" the expected
+    # distances are calculated from random spots for each repeat. With "exact"
+    # the exact expected distance frequencies are used, which makes repeats
+    # unnecessary.
+    ('expected-distances', "random"),
+    # The backend for statistical tests that support more than one backend.
+    # With "native" the tests are performed in Python, with "r" the tests are
+    # performed by R.
+    ('stats-backend', "native"),
+    # Where the analyses keep their temporary tables. With "disk" the
+    # temporary tables are created on the connection to the local database.
+    # With "memory" each analysis uses its own in-memory database to which
+    # the local database is attached read-only.
+    ('scratch-database', "disk"),
+    # Seed for the random generators of the analyses. With a seed the
+    # results of the analyses can be reproduced. If no seed is set, each
+    # analysis uses a new random seed.
+    ('random-seed', None),
+    # Maximum size in megabytes of the cache with analysis results. The least
+    # recently used results are removed when the cache gets larger. Set to 0
+    # to disable the cache. Results are only cached if a random seed is set,
+    # because only then the results can be reproduced.
+    ('cache-size', 50),
     # Number of CPUs.
     ('cpu-count', CPU_COUNT),
-    # Number of concurrent processes for batch mode.
+    # Number of concurrent processes for batch mode, and for the repeats of a
+    # single analysis.
     ('concurrent-processes', processes),
 ]
 
@@ -168,7 +197,8 @@ class ConfigManager(object):
         The default location of the configuration file is
         ``~/.setlyze/setlyze.cfg``.
         """
-        ints = ('test-repeats','concurrent-processes')
+        ints = ('test-repeats','concurrent-processes','random-seed',
+            'cache-size')
         floats = ('alpha-level')
         parser = ConfigParser.SafeConfigParser()
         files = parser.read(CONF_FILE)
@@ -195,13 +225,20 @@ class ConfigManager(object):
         parser = ConfigParser.SafeConfigParser()
         # The configurations that need to be saved to a configuration file.
         configs = {
-            'general': ('alpha-level','test-repeats','concurrent-processes')
+            'general': ('alpha-level','test-repeats','concurrent-processes',
+                'expected-distances','stats-backend','scratch-database',
+                'random-seed','cache-size')
         }
         # Set the configurations.
         for section in configs:
             parser.add_section(section)
             for option in configs[section]:
-                parser.set(section, option, str(self.get(option)))
+                # Options that are not set (e.g. no random seed) are not
+                # saved, because None can't be read back.
+                value = self.get(option)
+                if value is None:
+                    continue
+                parser.set(section, option, str(value))
         # Check if the data folder exists. If not, create it.
         if not os.path.exists(DATA_PATH):
             os.mkdir(DATA_PATH)
@@ -217,6 +254,23 @@ class ConfigManager(object):
         if key == 'data-source':
             self.set_data_source(value)
             return
+        if key == 'expected-distances' and value not in ("random", "exact"):
+            raise ValueError("Encountered unknown method for expected "
+                "distances '%s'" % value)
+        if key == 'stats-backend' and value not in ("native", "r"):
+            raise ValueError("Encountered unknown statistics backend '%s'" %
+                value)
+        if key == 'scratch-database' and value not in ("disk", "memory"):
+            raise ValueError("Encountered unknown scratch database '%s'" %
+                value)
+        if key == 'random-seed' and value is not None and \
+                not (isinstance(value, (int, long)) and 0 <= value < 2**32):
+            raise ValueError("The random seed must be an integer from 0 to "
+                "2**32-1, got '%s'" % value)
+        if key == 'cache-size' and not (isinstance(value, (int, long)) and
+                value >= 0):
+            raise ValueError("The cache size must be a positive integer, "
+                "got '%s'" % value)
         self._conf[key] = value
 
     def set_data_source(self, source):
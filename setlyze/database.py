@@ -33,12 +33,14 @@ can interact with. We refer to this database as the remote database.
 import sys
 import os
 import csv
+import hashlib
 import logging
 import threading
 import itertools
 from sqlite3 import dbapi2 as sqlite
 import re
 import time
+import urllib
 import xlrd
 
 import gobject
@@ -48,9 +50,100 @@ import setlyze.config
 import setlyze.std
 
 # The current version of the local database.
-DB_VERSION = 0.5
+DB_VERSION = 0.8
+
+# The number of rows that are inserted at once when importing data files
+# into the local database.
+BULK_INSERT_CHUNK_SIZE = 5000
+
+# The SQLite settings used while importing data files into the local
+# database. A crash during the import leaves an incomplete database anyway,
+# so journaling and synchronisation can be relaxed for the import.
+BULK_IMPORT_PRAGMAS = (('journal_mode', 'MEMORY'), ('synchronous', 'OFF'))
+
+# Whether the SQLite library supports URI filenames. This is set by
+# :meth:`uri_filenames_supported`.
+_uri_filenames = None
+
+# The columns of the records and species spots tables that are derived from
+# the 25 spot columns of a record. See :meth:`get_spot_columns_sql`.
+SPOT_COLUMNS = ('rec_spots', 'rec_n_spots', 'rec_area_a', 'rec_area_b',
+    'rec_area_c', 'rec_area_d')
+
+# SQL conditions on table "records" (alias ``r``) for the records on plates
+# of the selected locations, and for the records of the selected species on
+# those plates. The selections are saved with
+# :meth:`AccessDBGeneric.set_selection`. The conditions are written as IN
+# subqueries rather than joins with the selection tables, so SQLite looks up
+# the records with the indexes of :meth:`MakeLocalDB.create_indexes` instead
+# of scanning the records table.
+SELECTED_PLATES_SQL = ("r.rec_pla_id IN (SELECT pla_id FROM plates "
+    "WHERE pla_loc_id IN (SELECT id FROM selected_locations))")
+SELECTED_RECORDS_SQL = ("r.rec_spe_id IN (SELECT id FROM selected_species) "
+    "AND " + SELECTED_PLATES_SQL)
+
+def uri_filenames_supported():
+    """Return True if the SQLite library supports URI filenames.
+
+    If URI filenames are not supported, SQLite would create a new database
+    file with the URI as its name.
+    """
+    global _uri_filenames
+    if _uri_filenames is None:
+        connection = sqlite.connect(":memory:")
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA compile_options")
+        options = [row[0] for row in cursor]
+        cursor.close()
+        connection.close()
+        _uri_filenames = 'USE_URI' in options or 'USE_URI=1' in options
+    return _uri_filenames
+
+def get_readonly_path(dbfile):
+    """Return the path for opening the database file `dbfile` read-only.
+
+    Returns a URI filename which opens the database read-only with a shared
+    page cache. This means that the connections made with this path in
+    the same process use a single cache for the database pages. If URI
+    filenames are not supported, `dbfile` is returned as is.
+    """
+    if not uri_filenames_supported():
+        return dbfile
+    path = urllib.pathname2url(os.path.abspath(dbfile))
+    return "file:%s?mode=ro&cache=shared" % path
+
+def connect(dbfile, readonly=False):
+    """Return a connection to the SQLite database file `dbfile`.
+
+    If `readonly` is True, the database is opened read-only (see
+    :meth:`get_readonly_path`). Any number of read-only connections can
+    read from the local database at the same time, also while the
+    database is written to, because the local database uses write-ahead
+    logging (see :meth:`MakeLocalDB.create_new_db`).
+    """
+    if readonly:
+        dbfile = get_readonly_path(dbfile)
+    return sqlite.connect(dbfile)
 
-def get_database_accessor():
+def get_fingerprint(dbfile):
+    """Return the fingerprint of the SETL data in the database file `dbfile`.
+
+    The fingerprint is saved to the "info" table when the SETL data is
+    imported (see :meth:`MakeLocalDB.insert_fingerprint`). Returns None if
+    the database has no fingerprint, which is the case for databases that
+    were created by older versions of SETLyze.
+    """
+    connection = connect(dbfile, readonly=True)
+    cursor = connection.cursor()
+    cursor.execute("SELECT value FROM info WHERE name = 'fingerprint'")
+    row = cursor.fetchone()
+    cursor.close()
+    connection.close()
+    if not row:
+        return None
+    return row[0]
+
+def get_database_accessor(scratch="disk", readonly=False):
     """Return an object that facilitates access to the database.
 
     Based on the data source configuration, this function wil either
@@ -58,15 +151,43 @@ def get_database_accessor():
     This instance provides methods that are specific to the data source that
     is in use.
 
+    The value for `scratch` defines where the temporary tables of the
+    accessor are kept. See :class:`AccessDBGeneric` for the possible values.
+    If `readonly` is True, the local database is opened read-only.
+
     Design Part: 1.93
     """
     data_source = setlyze.config.cfg.get('data-source')
     if data_source in ('data-files', 'setl-database'):
-        db = AccessLocalDB()
+        db = AccessLocalDB(scratch, readonly)
     else:
         raise ValueError("Invalid data source '%s'." % data_source)
     return db
 
+def get_spot_columns_sql():
+    """Return the SQL expressions for the derived spot columns.
+
+    Returns a list of ``(column, expression)`` tuples, one for each column in
+    :data:`SPOT_COLUMNS`. The expressions calculate the spot mask (see
+    :data:`setlyze.std.SPOT_BITS`), the number of positive spots, and the
+    number of positive spots in each of the plate areas A, B, C and D from
+    the spot columns "rec_sur1" to "rec_sur25" of a record.
+    """
+    def positive(spots, weights):
+        return " + ".join(["(CASE WHEN rec_sur%d THEN %d ELSE 0 END)" %
+            (spot, weight) for spot, weight in zip(spots, weights)])
+
+    spots = range(1,26)
+    columns = [
+        ('rec_spots', positive(spots, setlyze.std.SPOT_BITS)),
+        ('rec_n_spots', positive(spots, [1] * 25)),
+    ]
+    for area in ('A','B','C','D'):
+        area_spots = setlyze.std.PLATE_AREA_SPOTS[area]
+        columns.append( ('rec_area_%s' % area.lower(),
+            positive(area_spots, [1] * len(area_spots))) )
+    return columns
+
 class MakeLocalDB(threading.Thread):
     """Create a local SQLite database with default tables and fill some
     tables based on the data source.
@@ -93,10 +214,19 @@ class MakeLocalDB(threading.Thread):
         super(MakeLocalDB, self).__init__()
         self.dbfile = setlyze.config.cfg.get('db-file')
         self.data_source = setlyze.config.cfg.get('data-source')
-        self.pdialog_handler = setlyze.std.ProgressDialogHandler(pd)
         self.connection = None
         self.cursor = None
 
+        # Import here, because setlyze.gui imports this module.
+        from setlyze.gui import ProgressDialogHandler
+        self.pdialog_handler = ProgressDialogHandler(pd)
+
+        # Used for reporting the progress of the data files import.
+        self.import_size_total = 0
+        self.import_size_done = 0
+        self.import_file_size = 0
+        self.import_file_fraction = 0.0
+
     def on_exit(self):
         self.cursor.close()
         self.connection.close()
@@ -177,6 +307,9 @@ class MakeLocalDB(threading.Thread):
         assert self.data_source == 'data-files', \
             "The data source is not set to 'data-files'"
 
+        # Relax journaling and synchronisation during the import.
+        pragmas = self.set_pragmas(BULK_IMPORT_PRAGMAS)
+
         # Add some meta-data to a separate table in the local database.
         # Add the data source we can figure out what kind of data is
         # present.
@@ -186,48 +319,58 @@ class MakeLocalDB(threading.Thread):
         # indication when this database was created.
         self.cursor.execute( "INSERT INTO info VALUES (null, 'date', date('now'))" )
 
-        # Set the total number of times we're going to update the progress
-        # dialog.
-        self.pdialog_handler.set_total_steps(4)
+        # Regular expression for matching Excel files. Because we support
+        # .xlsx files, Python module xlrd version 0.8.0 or later is
+        # required.
+        re_excel = ".*\.(xls|xlsx)$"
+
+        # The data files with the methods for importing them. The order
+        # is the order in which they are imported.
+        data_files = (
+            (localities_file, self.insert_locations_from_xls,
+                self.insert_locations_from_csv),
+            (plates_file, self.insert_plates_from_xls,
+                self.insert_plates_from_csv),
+            (records_file, self.insert_records_from_xls,
+                self.insert_records_from_csv),
+            (species_file, self.insert_species_from_xls,
+                self.insert_species_from_csv),
+        )
+
+        # The progress is reported by the number of bytes processed, so
+        # the progress bar doesn't halt on the (large) records file.
+        self.import_size_total = sum([os.path.getsize(path) for path, x, y in
+            data_files])
+        self.import_size_done = 0
 
         # Insert the data from the data files into the local database.
         try:
-            filename = os.path.split(localities_file)[1]
-            self.pdialog_handler.set_action("Importing %s" % filename)
-
-            # Regular expression for matching Excel files. Because we support
-            # .xlsx files, Python module xlrd version 0.8.0 or later is
-            # required.
-            re_excel = ".*\.(xls|xlsx)$"
-
-            if re.match(re_excel, localities_file):
-                self.insert_locations_from_xls(localities_file)
-            else:
-                self.insert_locations_from_csv(localities_file)
+            for path, insert_xls, insert_csv in data_files:
+                filename = os.path.split(path)[1]
+                self.pdialog_handler.set_action("Importing %s" % filename)
 
-            filename = os.path.split(plates_file)[1]
-            self.pdialog_handler.increase("Importing %s" % filename)
+                self.import_file_size = os.path.getsize(path)
+                self.import_file_fraction = 0.0
 
-            if re.match(re_excel, plates_file):
-                self.insert_plates_from_xls(plates_file)
-            else:
-                self.insert_plates_from_csv(plates_file)
+                if re.match(re_excel, path):
+                    insert_xls(path)
+                else:
+                    insert_csv(path)
 
-            filename = os.path.split(records_file)[1]
-            self.pdialog_handler.increase("Importing %s" % filename)
+                self.import_size_done += self.import_file_size
 
-            if re.match(re_excel, records_file):
-                self.insert_records_from_xls(records_file)
-            else:
-                self.insert_records_from_csv(records_file)
+            # Calculate the spot columns of the records.
+            self.pdialog_handler.set_action("Calculating spot totals")
+            self.fill_spot_columns()
 
-            filename = os.path.split(species_file)[1]
-            self.pdialog_handler.increase("Importing %s" % filename)
+            # Create the indexes after the data is loaded, which is faster
+            # than updating the indexes for each inserted row.
+            self.pdialog_handler.set_action("Creating indexes")
+            self.create_indexes()
 
-            if re.match(re_excel, species_file):
-                self.insert_species_from_xls(species_file)
-            else:
-                self.insert_species_from_csv(species_file)
+            # Save a fingerprint of the imported data.
+            self.pdialog_handler.set_action("Calculating data fingerprint")
+            self.insert_fingerprint()
 
             # Commit the database changes.
             self.connection.commit()
@@ -236,17 +379,107 @@ class MakeLocalDB(threading.Thread):
             self.pdialog_handler.destroy()
             # Rollback changes to the database.
             self.connection.rollback()
+            self.set_pragmas(pragmas)
             # Emit the signal that the import failed.
             gobject.idle_add(setlyze.sender.emit, 'file-import-failed', e)
             return
 
+        # Restore the SQLite settings.
+        self.set_pragmas(pragmas)
+
         # If we are here, the import was successful.
-        self.pdialog_handler.increase("")
+        self.pdialog_handler.complete("")
         logging.info("Local database populated.")
         setlyze.config.cfg.set('has-local-db', True)
 
         return True
 
+    def set_pragmas(self, pragmas):
+        """Set the SQLite pragmas in the sequence of ``(name, value)`` pairs
+        `pragmas` for the local database.
+
+        Returns the previous values of the pragmas in the same format, so
+        they can be restored afterwards by passing them to this method.
+        """
+        previous = []
+        for name, value in pragmas:
+            self.cursor.execute("PRAGMA %s" % name)
+            previous.append( (name, self.cursor.fetchone()[0]) )
+            self.cursor.execute("PRAGMA %s = %s" % (name, value))
+            # Setting the journal mode returns the new mode.
+            self.cursor.fetchall()
+        return tuple(previous)
+
+    def bulk_insert(self, query, rows, chunk_size=BULK_INSERT_CHUNK_SIZE):
+        """Insert the rows from iterable `rows` into the local database.
+
+        The rows are inserted in chunks of `chunk_size` rows with
+        `query`, an INSERT query with a placeholder for each column. The
+        import progress is updated after each chunk.
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            self.cursor.executemany(query, chunk)
+            self.update_import_progress()
+
+    def update_import_progress(self):
+        """Update the progress dialog for the data files import.
+
+        The progress is the number of bytes processed of all data files.
+        The processed part of the current data file is set in the
+        attribute `import_file_fraction`.
+        """
+        if not self.import_size_total:
+            return
+
+        done = self.import_size_done + self.import_file_fraction * \
+            self.import_file_size
+        fraction = done / float(self.import_size_total)
+
+        # Don't finish the progress dialog before the changes are
+        # committed.
+        self.pdialog_handler.update(min(fraction, 0.99))
+
+    def read_csv(self, filename, delimiter=';', quotechar='"'):
+        """Return a CSV reader for CSV file `filename`.
+
+        While the rows are read, the attribute `import_file_fraction` is
+        set to the fraction of bytes read from the file.
+        """
+        f = open(filename, 'r')
+        size = float(os.path.getsize(filename)) or 1.0
+
+        def lines():
+            n_bytes = 0
+            for line in f:
+                n_bytes += len(line)
+                self.import_file_fraction = n_bytes / size
+                yield line
+            f.close()
+
+        # Use Python's CSV module to create a CSV reader.
+        return csv.reader(lines(), delimiter=delimiter, quotechar=quotechar)
+
+    def read_xls(self, filename):
+        """Return a generator for the rows in XLS file `filename`.
+
+        Each row is a ``(rownum, values)`` tuple. While the rows are read,
+        the attribute `import_file_fraction` is set to the fraction of
+        rows read from the file.
+        """
+        # Try to open the XLS file.
+        f = xlrd.open_workbook(filename)
+
+        # Use Python's xlrd module to create a XLS reader.
+        setl_reader = f.sheet_by_index(0)
+
+        for rownum in xrange(setl_reader.nrows):
+            self.import_file_fraction = (rownum + 1.0) / setl_reader.nrows
+            yield (rownum, setl_reader.row_values(rownum))
+
     def insert_locations_from_csv(self, filename, delimiter=';', quotechar='"'):
         """Insert the SETL localities from a CSV file into the local
         database.
@@ -264,29 +497,28 @@ class MakeLocalDB(threading.Thread):
         """
         logging.info("Importing localities data from %s" % filename)
 
-        # Try to open the CSV file.
-        f = open(filename, 'r')
-
-        # Use Python's CSV module to create a CSV reader.
-        setl_reader = csv.reader(f, delimiter=delimiter, quotechar=quotechar)
+        setl_reader = self.read_csv(filename, delimiter, quotechar)
 
-        # Read through every row in the CSV file and insert that row
+        # Read through every row in the CSV file and insert the rows
         # into the local database.
-        for rownum,row in enumerate(setl_reader):
-            if len(row) != 5:
-                raise ValueError("Expecting 5 fields per row for the "
-                    "localities file, found %d fields." % len(row))
-
-            # Check if the first row contains headers by checking if the first
-            # field in the first row is a string. If so, skip the first row.
-            if rownum == 0:
-                try:
-                    row[0] = int(row[0])
-                except:
-                    continue
+        def rows():
+            for rownum,row in enumerate(setl_reader):
+                if len(row) != 5:
+                    raise ValueError("Expecting 5 fields per row for the "
+                        "localities file, found %d fields." % len(row))
 
-            self.cursor.execute("INSERT INTO localities VALUES (?,?,?,?,?)",
-                row)
+                # Check if the first row contains headers by checking if the
+                # first field in the first row is a string. If so, skip the
+                # first row.
+                if rownum == 0:
+                    try:
+                        row[0] = int(row[0])
+                    except:
+                        continue
+
+                yield row
+
+        self.bulk_insert("INSERT INTO localities VALUES (?,?,?,?,?)", rows())
 
     def insert_species_from_csv(self, filename, delimiter=';', quotechar='"'):
         """Insert the species from a CSV file into the local database.
@@ -304,48 +536,46 @@ class MakeLocalDB(threading.Thread):
         """
         logging.info("Importing species data from %s" % filename)
 
-        # Try to open the CSV file.
-        f = open(filename, 'r')
-
-        # Use Python's CSV module to create a CSV reader.
-        setl_reader = csv.reader(f, delimiter=delimiter, quotechar=quotechar)
+        setl_reader = self.read_csv(filename, delimiter, quotechar)
 
-        # Read through every row in the CSV file and insert that row
+        # Read through every row in the CSV file and insert the rows
         # into the local database.
-        for rownum,row in enumerate(setl_reader):
-            n = len(row)
-            if n > 17:
-                raise ValueError("Expecting at most 17 fields per row for the "
-                    "species file, found %d fields." % n)
-
-            # Check if the first row contains headers by checking if the first
-            # field in the first row is a string. If so, skip the first row.
-            if rownum == 0:
-                try:
-                    row[0] = int(row[0])
-                except:
-                    continue
-
-            row_new = []
-            for i in range(17):
-                try:
-                    val = row[i]
-                    if val == '':
+        def rows():
+            for rownum,row in enumerate(setl_reader):
+                n = len(row)
+                if n > 17:
+                    raise ValueError("Expecting at most 17 fields per row for "
+                        "the species file, found %d fields." % n)
+
+                # Check if the first row contains headers by checking if the
+                # first field in the first row is a string. If so, skip the
+                # first row.
+                if rownum == 0:
+                    try:
+                        row[0] = int(row[0])
+                    except:
+                        continue
+
+                row_new = []
+                for i in range(17):
+                    try:
+                        val = row[i]
+                        if val == '':
+                            row_new.append(None)
+                        elif val == 'FALSE':
+                            row_new.append(False)
+                        elif val == 'TRUE':
+                            row_new.append(True)
+                        else:
+                            row_new.append(val)
+                    except:
                         row_new.append(None)
-                    elif val == 'FALSE':
-                        row_new.append(False)
-                    elif val == 'TRUE':
-                        row_new.append(True)
-                    else:
-                        row_new.append(val)
-                except:
-                    row_new.append(None)
-
-            placeholders = ','.join('?' * 17)
-            self.cursor.execute("INSERT INTO species VALUES (%s)" %
-                placeholders,
-                row_new
-            )
+
+                yield row_new
+
+        placeholders = ','.join('?' * 17)
+        self.bulk_insert("INSERT INTO species VALUES (%s)" % placeholders,
+            rows())
 
     def insert_plates_from_csv(self, filename, delimiter=';', quotechar='"'):
         """Insert the plates from a CSV file into the local database.
@@ -363,29 +593,29 @@ class MakeLocalDB(threading.Thread):
         """
         logging.info("Importing plates data from %s" % filename)
 
-        # Try to open the CSV file.
-        f = open(filename, 'r')
-
-        # Use Python's CSV module to create a CSV reader.
-        setl_reader = csv.reader(f, delimiter=delimiter, quotechar=quotechar)
+        setl_reader = self.read_csv(filename, delimiter, quotechar)
 
-        # Read through every row in the CSV file and insert that row
+        # Read through every row in the CSV file and insert the rows
         # into the local database.
-        for rownum,row in enumerate(setl_reader):
-            if len(row) != 10:
-                raise ValueError("Expecting 10 fields per row for the "
-                    "plates file, found %d fields." % len(row))
-
-            # Check if the first row contains headers by checking if the first
-            # field in the first row is a string. If so, skip the first row.
-            if rownum == 0:
-                try:
-                    row[0] = int(row[0])
-                except:
-                    continue
-
-            self.cursor.execute("INSERT INTO plates VALUES (?,?,?,?,?,?,?,?,?,?)",
-                row)
+        def rows():
+            for rownum,row in enumerate(setl_reader):
+                if len(row) != 10:
+                    raise ValueError("Expecting 10 fields per row for the "
+                        "plates file, found %d fields." % len(row))
+
+                # Check if the first row contains headers by checking if the
+                # first field in the first row is a string. If so, skip the
+                # first row.
+                if rownum == 0:
+                    try:
+                        row[0] = int(row[0])
+                    except:
+                        continue
+
+                yield row
+
+        self.bulk_insert("INSERT INTO plates VALUES (?,?,?,?,?,?,?,?,?,?)",
+            rows())
 
     def insert_records_from_csv(self, filename, delimiter=';', quotechar='"'):
         """Insert the records from a CSV file into the local database.
@@ -403,30 +633,31 @@ class MakeLocalDB(threading.Thread):
         """
         logging.info("Importing records data from %s" % filename)
 
-        # Try to open the CSV file.
-        f = open(filename, 'r')
-
-        # Use Python's CSV module to create a CSV reader.
-        setl_reader = csv.reader(f, delimiter=delimiter, quotechar=quotechar)
+        setl_reader = self.read_csv(filename, delimiter, quotechar)
 
-        # Read through every row in the CSV file and insert that row
+        # Read through every row in the CSV file and insert the rows
         # into the local database.
-        placeholders = ','.join('?' * 38)
-        for rownum,row in enumerate(setl_reader):
-            if len(row) != 40:
-                raise ValueError("Expecting 40 fields per row for the "
-                    "records file, found %d fields." % len(row))
-
-            # Check if the first row contains headers by checking if the first
-            # field in the first row is a string. If so, skip the first row.
-            if rownum == 0:
-                try:
-                    row[0] = int(row[0])
-                except:
-                    continue
-
-            self.cursor.execute("INSERT INTO records VALUES (%s)" % placeholders,
-                row[:38])
+        def rows():
+            for rownum,row in enumerate(setl_reader):
+                if len(row) != 40:
+                    raise ValueError("Expecting 40 fields per row for the "
+                        "records file, found %d fields." % len(row))
+
+                # Check if the first row contains headers by checking if the
+                # first field in the first row is a string. If so, skip the
+                # first row.
+                if rownum == 0:
+                    try:
+                        row[0] = int(row[0])
+                    except:
+                        continue
+
+                yield row[:38]
+
+        # The derived spot columns are filled after the import.
+        placeholders = ','.join(['?'] * 38 + ['null'] * len(SPOT_COLUMNS))
+        self.bulk_insert("INSERT INTO records VALUES (%s)" % placeholders,
+            rows())
 
     def insert_locations_from_xls(self, filename):
         """Insert the SETL localities from a XLS file into the local
@@ -439,27 +670,23 @@ class MakeLocalDB(threading.Thread):
         """
         logging.info("Importing localities data from %s" % filename)
 
-        # Try to open the XLS file.
-        f = xlrd.open_workbook(filename)
-
-        # Use Python's xlrd module to create a XLS reader.
-        setl_reader = f.sheet_by_index(0)
-
-        # Read through every row in the XLS file and insert that row
+        # Read through every row in the XLS file and insert the rows
         # into the local database.
-        for rownum in range(setl_reader.nrows):
-            values = setl_reader.row_values(rownum)
-            if len(values) != 5:
-                raise ValueError("Expecting 5 fields per row for the "
-                    "localities file, found %d fields." % len(values))
+        def rows():
+            for rownum, values in self.read_xls(filename):
+                if len(values) != 5:
+                    raise ValueError("Expecting 5 fields per row for the "
+                        "localities file, found %d fields." % len(values))
+
+                # Check if the first row contains headers by checking if the
+                # first field in the first row is a string. If so, skip the
+                # first row.
+                if rownum == 0 and isinstance(values[0], unicode):
+                    continue
 
-            # Check if the first row contains headers by checking if the first
-            # field in the first row is a string. If so, skip the first row.
-            if rownum == 0 and isinstance(values[0], unicode):
-                continue
+                yield values
 
-            self.cursor.execute("INSERT INTO localities VALUES (?,?,?,?,?)",
-                values)
+        self.bulk_insert("INSERT INTO localities VALUES (?,?,?,?,?)", rows())
 
     def insert_plates_from_xls(self, filename):
         """Insert the plates from a XLS file into the local database.
@@ -471,28 +698,24 @@ class MakeLocalDB(threading.Thread):
         """
         logging.info("Importing plates data from %s" % filename)
 
-        # Try to open the XLS file.
-        f = xlrd.open_workbook(filename)
-
-        # Use Python's xlrd module to create a XLS reader.
-        setl_reader = f.sheet_by_index(0)
-
-        # Read through every row in the XLS file and insert that row
+        # Read through every row in the XLS file and insert the rows
         # into the local database.
-        for rownum in range(setl_reader.nrows):
-            values = setl_reader.row_values(rownum)
-
-            if len(values) != 10:
-                raise ValueError("Expecting 10 fields per row for the "
-                    "plates file, found %d fields." % len(values))
+        def rows():
+            for rownum, values in self.read_xls(filename):
+                if len(values) != 10:
+                    raise ValueError("Expecting 10 fields per row for the "
+                        "plates file, found %d fields." % len(values))
+
+                # Check if the first row contains headers by checking if the
+                # first field in the first row is a string. If so, skip the
+                # first row.
+                if rownum == 0 and isinstance(values[0], unicode):
+                    continue
 
-            # Check if the first row contains headers by checking if the first
-            # field in the first row is a string. If so, skip the first row.
-            if rownum == 0 and isinstance(values[0], unicode):
-                continue
+                yield values
 
-            self.cursor.execute("INSERT INTO plates VALUES (?,?,?,?,?,?,?,?,?,?)",
-                values)
+        self.bulk_insert("INSERT INTO plates VALUES (?,?,?,?,?,?,?,?,?,?)",
+            rows())
 
     def insert_records_from_xls(self, filename):
         """Insert the records from a XLS file into the local database.
@@ -504,29 +727,26 @@ class MakeLocalDB(threading.Thread):
         """
         logging.info("Importing records data from %s" % filename)
 
-        # Try to open the XLS file.
-        f = xlrd.open_workbook(filename)
-
-        # Use Python's xlrd module to create a XLS reader.
-        setl_reader = f.sheet_by_index(0)
-
-        # Read through every row in the xls file and insert that row
+        # Read through every row in the XLS file and insert the rows
         # into the local database.
-        placeholders = ','.join('?' * 38)
-        for rownum in range(setl_reader.nrows):
-            values = setl_reader.row_values(rownum)
-
-            if len(values) < 38:
-                raise ValueError("Expecting at least 38 fields per row for the "
-                    "records file, found %d fields." % len(values))
+        def rows():
+            for rownum, values in self.read_xls(filename):
+                if len(values) < 38:
+                    raise ValueError("Expecting at least 38 fields per row for "
+                        "the records file, found %d fields." % len(values))
+
+                # Check if the first row contains headers by checking if the
+                # first field in the first row is a string. If so, skip the
+                # first row.
+                if rownum == 0 and isinstance(values[0], unicode):
+                    continue
 
-            # Check if the first row contains headers by checking if the first
-            # field in the first row is a string. If so, skip the first row.
-            if rownum == 0 and isinstance(values[0], unicode):
-                continue
+                yield values[:38]
 
-            self.cursor.execute("INSERT INTO records VALUES (%s)" % placeholders,
-                values[:38])
+        # The derived spot columns are filled after the import.
+        placeholders = ','.join(['?'] * 38 + ['null'] * len(SPOT_COLUMNS))
+        self.bulk_insert("INSERT INTO records VALUES (%s)" % placeholders,
+            rows())
 
     def insert_species_from_xls(self, filename):
         """Insert the species from a XLS file into the local database.
@@ -538,43 +758,37 @@ class MakeLocalDB(threading.Thread):
         """
         logging.info("Importing species data from %s" % filename)
 
-        # Try to open the XLS file.
-        f = xlrd.open_workbook(filename)
-
-        # Use Python's xlrd module to create a XLS reader.
-        setl_reader = f.sheet_by_index(0)
-
-        # Read through every row in the XLS file and insert that row
+        # Read through every row in the XLS file and insert the rows
         # into the local database.
-        for rownum in range(setl_reader.nrows):
-            values = setl_reader.row_values(rownum)
-
-            n = len(values)
-            if n > 17:
-                raise ValueError("Expecting at most 17 fields per row for the "
-                    "species file, found %d fields." % n)
-
-            # Check if the first row contains headers by checking if the first
-            # field in the first row is a string. If so, skip the first row.
-            if rownum == 0 and isinstance(values[0], unicode):
-                continue
-
-            placeholders = ','.join('?' * 17)
-            row = []
-            for i in range(17):
-                try:
-                    val = values[i]
-                    if val == '':
+        def rows():
+            for rownum, values in self.read_xls(filename):
+                n = len(values)
+                if n > 17:
+                    raise ValueError("Expecting at most 17 fields per row for "
+                        "the species file, found %d fields." % n)
+
+                # Check if the first row contains headers by checking if the
+                # first field in the first row is a string. If so, skip the
+                # first row.
+                if rownum == 0 and isinstance(values[0], unicode):
+                    continue
+
+                row = []
+                for i in range(17):
+                    try:
+                        val = values[i]
+                        if val == '':
+                            row.append(None)
+                        else:
+                            row.append(val)
+                    except:
                         row.append(None)
-                    else:
-                        row.append(val)
-                except:
-                    row.append(None)
-
-            self.cursor.execute("INSERT INTO species VALUES (%s);" %
-                placeholders,
-                row
-            )
+
+                yield row
+
+        placeholders = ','.join('?' * 17)
+        self.bulk_insert("INSERT INTO species VALUES (%s)" % placeholders,
+            rows())
 
     def insert_from_db(self):
         """Create a new local database and load localities and species
@@ -643,12 +857,21 @@ class MakeLocalDB(threading.Thread):
         self.connection = sqlite.connect(self.dbfile)
         self.cursor = self.connection.cursor()
 
+        # Use write-ahead logging, so that the analyses running in other
+        # processes can read from the database at the same time without
+        # locking each other. This setting is saved in the database file.
+        self.set_pragmas( (('journal_mode', 'WAL'),) )
+
         # Create the tables.
         self.create_table_info()
         self.create_table_localities()
         self.create_table_species()
         self.create_table_plates()
         self.create_table_records()
+        self.create_table_expected_distances_inter()
+
+        # Fill tables that don't depend on the data source.
+        self.fill_expected_distances_inter()
 
         # Commit the transaction.
         self.connection.commit()
@@ -667,6 +890,10 @@ class MakeLocalDB(threading.Thread):
                 "It may be in use by a different process." % self.dbfile)
         try:
             os.remove(self.dbfile)
+            # Remove the write-ahead log files as well.
+            for suffix in ('-wal', '-shm'):
+                if os.path.isfile(self.dbfile + suffix):
+                    os.remove(self.dbfile + suffix)
         except:
             tries += 1
             time.sleep(2)
@@ -815,23 +1042,162 @@ class MakeLocalDB(threading.Thread):
             rec_sur25 INTEGER, \
             rec_1st INTEGER, \
             rec_2nd INTEGER, \
-            rec_v INTEGER \
+            rec_v INTEGER, \
+            rec_spots INTEGER, \
+            rec_n_spots INTEGER, \
+            rec_area_a INTEGER, \
+            rec_area_b INTEGER, \
+            rec_area_c INTEGER, \
+            rec_area_d INTEGER \
+        )")
+
+    def fill_spot_columns(self):
+        """Fill the derived spot columns of the "records" table.
+
+        The spot mask, the number of positive spots and the plate area totals
+        are calculated once for all records after the records are imported,
+        so the analyses don't have to calculate these from the 25 spot
+        columns each time. See :meth:`get_spot_columns_sql`.
+        """
+        assignments = ", ".join(["%s = %s" % (column, expression)
+            for column, expression in get_spot_columns_sql()])
+        self.cursor.execute("UPDATE records SET %s" % assignments)
+
+    def create_indexes(self):
+        """Create the indexes for the SETL data tables.
+
+        The queries for selecting species and records filter on the plate,
+        species and location IDs. Without these indexes, SQLite has to scan
+        the whole records table for each of these queries.
+
+        The indexes should be created after the SETL data is imported.
+
+        Creates Design Part: 2.44
+        """
+        # Used for selecting the species on plates and the records of
+        # species on plates.
+        self.cursor.execute("CREATE INDEX idx_records_pla_spe "
+            "ON records (rec_pla_id, rec_spe_id)")
+        self.cursor.execute("CREATE INDEX idx_records_spe_pla "
+            "ON records (rec_spe_id, rec_pla_id)")
+
+        # Used for selecting the plates from locations.
+        self.cursor.execute("CREATE INDEX idx_plates_loc "
+            "ON plates (pla_loc_id)")
+
+        # Gather statistics about the indexes for the query planner.
+        self.cursor.execute("ANALYZE")
+
+    def insert_fingerprint(self):
+        """Save a fingerprint of the SETL data to the "info" table.
+
+        The fingerprint is a SHA-1 hash of all rows in the localities,
+        plates, species and records tables. Databases with the same SETL data
+        get the same fingerprint. The fingerprint is used to check if cached
+        analysis results are still valid for the data in the local database
+        (see :mod:`setlyze.cache`).
+
+        The fingerprint should be saved after the SETL data is imported.
+        """
+        fingerprint = hashlib.sha1()
+        cursor = self.connection.cursor()
+        for table in ('localities', 'plates', 'species', 'records'):
+            cursor.execute("SELECT * FROM %s ORDER BY rowid" % table)
+            for row in cursor:
+                fingerprint.update(repr(row))
+        cursor.close()
+
+        self.cursor.execute("INSERT INTO info VALUES (null, 'fingerprint', ?)",
+            (fingerprint.hexdigest(),))
+
+    def create_table_expected_distances_inter(self):
+        """Create the "expected_distances_inter" table for the exact
+        expected inter-specific spot distance frequencies.
+
+        This table is filled by :meth:`fill_expected_distances_inter`.
+        """
+        self.cursor.execute("CREATE TABLE expected_distances_inter (\
+            n_spots_a INTEGER, \
+            n_spots_b INTEGER, \
+            distance REAL, \
+            frequency REAL, \
+            PRIMARY KEY (n_spots_a, n_spots_b, distance) \
         )")
 
+    def fill_expected_distances_inter(self):
+        """Fill the "expected_distances_inter" table.
+
+        The exact expected frequency of each spot distance is saved for each
+        combination of positive spot numbers for two species on a plate
+        (see :meth:`setlyze.std.get_expected_distance_frequencies_inter`).
+        These don't depend on the SETL data, so they are calculated only once
+        when the local database is created.
+        """
+        rows = []
+        for n_spots_a in range(1,26):
+            for n_spots_b in range(1,26):
+                frequencies = setlyze.std.get_expected_distance_frequencies_inter(
+                    n_spots_a, n_spots_b)
+                for d, f in zip(setlyze.std.DISTANCE_CLASSES, frequencies):
+                    rows.append((n_spots_a, n_spots_b, d, f))
+
+        self.cursor.executemany("INSERT INTO expected_distances_inter "
+            "VALUES (?,?,?,?)", rows)
+
 class AccessDBGeneric(object):
     """Super class for :class:`AccessLocalDB` and :class:`AccessRemoteDB`.
 
     This class contains methods that are generic for both sub-classes.
     It provides both sub classes with methods for data that is always
     present in the local database.
+
+    The value for `scratch` defines where the temporary tables are kept.
+    With ``disk`` the accessor connects to the local database and the
+    temporary tables are created on that connection. With ``memory`` the
+    accessor connects to a new in-memory database and attaches the local
+    database to it read-only (see :meth:`connect_scratch`). The temporary
+    tables are then kept in memory, and the local database file is only
+    read from.
+
+    If `readonly` is True, the local database is opened read-only (see
+    :meth:`connect`). The temporary tables can still be created.
     """
 
-    def __init__(self):
+    def __init__(self, scratch="disk", readonly=False):
         self.progress_dialog = None
         self.dbfile = setlyze.config.cfg.get('db-file')
-        self.conn = sqlite.connect(self.dbfile)
+        if scratch == "memory":
+            self.conn = self.connect_scratch()
+        elif scratch == "disk":
+            self.conn = connect(self.dbfile, readonly)
+        else:
+            raise ValueError("Encountered unknown scratch database '%s'" %
+                scratch)
         self.cursor = self.conn.cursor()
 
+    def connect_scratch(self):
+        """Return a connection to a new in-memory scratch database.
+
+        The local database is attached to the in-memory database as
+        "setl". Because the main database of the connection is empty,
+        table names that are not qualified with a database name resolve to
+        the tables of the local database. The local database is attached
+        read-only if the SQLite library supports URI filenames (see
+        :meth:`get_readonly_path`), so the temporary tables can only be
+        written to memory.
+        """
+        connection = sqlite.connect(":memory:")
+        cursor = connection.cursor()
+
+        # Keep the temporary tables in memory.
+        cursor.execute("PRAGMA temp_store = MEMORY")
+
+        # Attach the local database read-only.
+        path = get_readonly_path(self.dbfile)
+        cursor.execute("ATTACH DATABASE ? AS setl", (path,))
+        cursor.close()
+        return connection
+
     def get_database_info(self):
         """Return database information.
 
@@ -878,55 +1244,41 @@ class AccessDBGeneric(object):
         Design Part: 1.20
         """
         tables = ('species_spots_1','species_spots_2')
+        table = tables[slot]
 
-        # Get all distinctive plate IDs.
-        cursor = self.conn.cursor()
-        cursor.execute( "SELECT DISTINCT rec_pla_id FROM %s" % (tables[slot]) )
-        pla_ids = cursor.fetchall()
-
-        for pla_id in pla_ids:
-            # Get plate ID and all 25 spots for each plate ID.
-            cursor.execute( "SELECT rec_pla_id,"
-                            "rec_sur1,rec_sur2,rec_sur3,rec_sur4,rec_sur5,"
-                            "rec_sur6,rec_sur7,rec_sur8,rec_sur9,rec_sur10,"
-                            "rec_sur11,rec_sur12,rec_sur13,rec_sur14,rec_sur15,"
-                            "rec_sur16,rec_sur17,rec_sur18,rec_sur19,rec_sur20,"
-                            "rec_sur21,rec_sur22,rec_sur23,rec_sur24,rec_sur25 "
-                            "FROM %s "
-                            "WHERE rec_pla_id = ?" %
-                            (tables[slot]),
-                            (pla_id[0],)
-            )
-
-            # Create a combined record from all records with this plate ID.
-            rows = cursor.fetchall()
-
-            # No need to do anything if there is just one record for a plate.
-            if len(rows) < 2:
-                continue
-
-            # Remove all records with that plate ID from the species_spots table.
-            cursor.execute( "DELETE FROM %s "
-                            "WHERE rec_pla_id = ?" %
-                            (tables[slot]),
-                            (pla_id[0],)
-            )
+        # A spot of the combined record is positive if the spot is positive
+        # in any of the records with the same plate ID.
+        spots = ",".join(["MAX(CASE WHEN rec_sur%d THEN 1 ELSE 0 END) "
+            "AS rec_sur%d" % (i, i) for i in range(1,26)])
 
-            # Insert the combined record in the species_spots table. So this
-            # single record replaces all other records with this plate ID.
-            combined = setlyze.std.combine_records(rows)
-            placeholders = ','.join('?' * 26)
-            cursor.execute("INSERT INTO %s VALUES (null,%s)" %
-                            (tables[slot], placeholders),
-                            combined
-            )
+        # Combine the records with the same plate ID in a new table.
+        cursor = self.conn.cursor()
+        cursor.execute("DROP TABLE IF EXISTS temp.species_spots_unique")
+        cursor.execute( "CREATE TEMP TABLE species_spots_unique AS "
+                        "SELECT rec_pla_id,%s "
+                        "FROM %s "
+                        "GROUP BY rec_pla_id" %
+                        (spots, table)
+        )
+
+        # Replace the records in the species_spots table by the combined
+        # records. The derived spot columns are calculated again for the
+        # combined records.
+        expressions = ",".join([e for c, e in get_spot_columns_sql()])
+        cursor.execute("DELETE FROM %s" % table)
+        cursor.execute( "INSERT INTO %s "
+                        "SELECT null,*,%s FROM species_spots_unique" %
+                        (table, expressions)
+        )
+        n_plates = cursor.rowcount
+        cursor.execute("DROP TABLE species_spots_unique")
 
         # Commit the database transaction.
         self.conn.commit()
         cursor.close()
 
         # Return the total numbers of unique plate records.
-        return len(pla_ids)
+        return n_plates
 
     def fill_plate_spot_totals_table(self, spots_table1, spots_table2=None):
         """Populate table "plate_spot_totals".
@@ -939,331 +1291,242 @@ class AccessDBGeneric(object):
 
             * Calculating the expected distances, where the positive spot
               number serves as a template for the random spots generator
-              (see :meth:`~setlyze.std.get_random_for_plate`).
+              (see :meth:`~setlyze.std.get_random_plates`).
 
             * Significance calculators, where the tests are applied to
               plates with a specific number of positive spots (see
-              :meth:`get_distances_matching_spots_total`).
+              :meth:`get_distance_frequencies`).
 
         If just `spots_table1` is provided, only the column "n_spots_a"
         is populated with positive spot numbers. If both `spots_table1` and
         `spots_table2` are provided, column "n_spots_a" is filled
         from `spots_table1`, and column "n_spots_b" filled from `spots_table2`.
+        The positive spot numbers are taken from column "rec_n_spots" of
+        the spots tables.
 
         Returns a tuple (`rows affected`, `rows skipped`).
 
         Design Part: 1.73
         """
         cursor = self.conn.cursor()
-        cursor2 = self.conn.cursor()
 
         # Empty the plate_spot_totals table before we use it again.
         cursor.execute("DELETE FROM plate_spot_totals")
         self.conn.commit()
 
-        skipped = 0
-        rowcount = 0
-
         if spots_table2:
             # Two spots tables are provided.
 
-            # Get all records from both spots tables where the plate IDs
-            # match.
-            # Each returned record has this format:
-            # id|rec_pla_id|rec_sur1|rec_sur2|rec_sur3|rec_sur4|rec_sur5|
-            # rec_sur6|rec_sur7|rec_sur8|rec_sur9|rec_sur10|rec_sur11|
-            # rec_sur12|rec_sur13|rec_sur14|rec_sur15|rec_sur16|rec_sur17|
-            # rec_sur18|rec_sur19|rec_sur20|rec_sur21|rec_sur22|rec_sur23|
-            # rec_sur24|rec_sur25|id|rec_pla_id|rec_sur1|rec_sur2|rec_sur3|
-            # rec_sur4|rec_sur5|rec_sur6|rec_sur7|rec_sur8|rec_sur9|rec_sur10|
-            # rec_sur11|rec_sur12|rec_sur13|rec_sur14|rec_sur15|rec_sur16|
-            # rec_sur17|rec_sur18|rec_sur19|rec_sur20|rec_sur21|rec_sur22|
-            # rec_sur23|rec_sur24|rec_sur25
-            cursor.execute( "SELECT s1.*, s2.* FROM %s as s1 "
+            # Get the total number of plates present in both spots tables.
+            cursor.execute( "SELECT COUNT(*) FROM %s as s1 "
                             "INNER JOIN %s as s2 "
                             "ON s1.rec_pla_id=s2.rec_pla_id" %
                             (spots_table1, spots_table2)
             )
-
-            for record in cursor:
-                record1 = record[2:27]
-                record2 = record[29:54]
-                plate_id = record[1]
-
-                # Get the positive spots for both records.
-                spots1 = setlyze.std.get_spots_from_record(record1)
-                spots2 = setlyze.std.get_spots_from_record(record2)
-
-                # We're only interested in the number of spots.
-                spots1 = len(spots1)
-                spots2 = len(spots2)
-
-                # Skip this plate if both records contain less than 1 positive
-                # spot. We won't be able to calculate distances for such
-                # records anyway.
-                if spots1 < 1 and spots2 < 1:
-                    skipped += 1
-                    continue
-
-                # Save the number of positive spots to the plate_spot_totals
-                # table.
-                cursor2.execute( "INSERT INTO plate_spot_totals "
-                                 "VALUES (?,?,?)",
-                                 (plate_id, spots1, spots2)
-                )
-                rowcount += 1
+            total = cursor.fetchone()[0]
+
+            # Save the number of positive spots of both records for each
+            # plate to the plate_spot_totals table. Skip plates where both
+            # records contain less than 1 positive spot. We won't be able to
+            # calculate distances for such records anyway.
+            cursor.execute( "INSERT INTO plate_spot_totals "
+                            "SELECT s1.rec_pla_id, s1.rec_n_spots, "
+                            "s2.rec_n_spots "
+                            "FROM %s as s1 "
+                            "INNER JOIN %s as s2 "
+                            "ON s1.rec_pla_id=s2.rec_pla_id "
+                            "WHERE s1.rec_n_spots >= 1 "
+                            "OR s2.rec_n_spots >= 1" %
+                            (spots_table1, spots_table2)
+            )
+            rowcount = cursor.rowcount
         else:
             # One spots table is provided.
 
-            # Get all spots for each plate.
-            # Each returned record has this format:
-            # id|rec_pla_id|rec_sur1|rec_sur2|rec_sur3|rec_sur4|rec_sur5|
-            # rec_sur6|rec_sur7|rec_sur8|rec_sur9|rec_sur10|rec_sur11|
-            # rec_sur12|rec_sur13|rec_sur14|rec_sur15|rec_sur16|rec_sur17|
-            # rec_sur18|rec_sur19|rec_sur20|rec_sur21|rec_sur22|rec_sur23|
-            # rec_sur24|rec_sur25
-            cursor.execute("SELECT * FROM %s" % spots_table1)
-
-            for record in cursor:
-                plate_id = record[1]
-
-                # Get the positive spots for this record.
-                spots = setlyze.std.get_spots_from_record(record[2:])
-
-                # We're only interested in the number of spots.
-                spots = len(spots)
-
-                # Skip this record if it contains less than 2 positive spots.
-                # We won't be able to calculate a distance for such records
-                # anyway.
-                if spots < 2:
-                    skipped += 1
-                    continue
+            # Get the total number of records in the spots table.
+            cursor.execute("SELECT COUNT(*) FROM %s" % spots_table1)
+            total = cursor.fetchone()[0]
 
-                # Save the number of positive spots to the plate_spot_totals
-                # table.
-                cursor2.execute( "INSERT INTO plate_spot_totals "
-                                 "VALUES (?,?,null)",
-                                 (plate_id, spots)
-                )
-                rowcount += 1
+            # Save the number of positive spots for each plate to the
+            # plate_spot_totals table. Skip records containing less than
+            # 2 positive spots. We won't be able to calculate a distance for
+            # such records anyway.
+            cursor.execute( "INSERT INTO plate_spot_totals "
+                            "SELECT rec_pla_id, rec_n_spots, null "
+                            "FROM %s "
+                            "WHERE rec_n_spots >= 2" %
+                            (spots_table1)
+            )
+            rowcount = cursor.rowcount
+
+        skipped = total - rowcount
 
         # Commit the transaction.
         self.conn.commit()
 
         # Close connection with the local database.
         cursor.close()
-        cursor2.close()
 
         # Return the number of (rows affected, rows skipped)
         return (rowcount, skipped)
 
-    def get_distances_matching_spots_total(self, distance_table, spots_n):
-        """Get the distances from distance table `distance_table` that
-        are from plates having `spots_n` positive spot numbers.
+    def fill_plate_ratio_groups_table(self, ratio_groups):
+        """Populate table "plate_ratio_groups".
 
-        This is a generator, meaning that this method returns an
-        iterator. This iterator returns the distances.
-        """
-        cursor = self.conn.cursor()
+        This table is populated with the ratios group of each plate in
+        table "plate_spot_totals". Argument `ratio_groups` is a sequence of
+        ratios groups, where each group is a list of ``(n_spots_a,
+        n_spots_b)`` ratios. The groups are numbered from 1. The ratio A:B
+        is considered the same as B:A. Each plate gets the number of the
+        first group that contains its ratio. Plates with a ratio that is
+        not in any group are not saved.
 
-        if spots_n < 0:
-            # If spots_n is a negative number, get all distances
-            # up to the absolute number. So if we find -5, get all
-            # distances up to 5.
-            cursor.execute("SELECT distance FROM %s" % distance_table)
+        The ratios group of each plate only has to be looked up once for an
+        analysis, so the distances can be selected per ratios group with an
+        indexed query (see :meth:`get_distance_frequencies`).
 
-            # Get the plate IDs that have n spots lower or equal to the
-            # absolute spots number.
-            cursor.execute( "SELECT pla_id "
-                            "FROM plate_spot_totals "
-                            "WHERE n_spots_a <= %d" %
-                            (abs(spots_n))
-                            )
-            plate_ids = cursor.fetchall()
-            plate_ids_str = ",".join([str(item[0]) for item in plate_ids])
+        Returns the number of rows affected.
+        """
+        # Map each normalised ratio to the number of its ratios group.
+        ratio_to_group = {}
+        for n_group, ratios in enumerate(ratio_groups, start=1):
+            for ratio in ratios:
+                ratio_to_group.setdefault(tuple(sorted(ratio)), n_group)
 
-            # Get the distances that match the plate IDs.
-            cursor.execute( "SELECT distance "
-                            "FROM %s "
-                            "WHERE rec_pla_id IN (%s)" %
-                            (distance_table, plate_ids_str)
-                            )
-        else:
-            # Get the plate IDs that match the provided total spots number.
-            cursor.execute( "SELECT pla_id "
-                            "FROM plate_spot_totals "
-                            "WHERE n_spots_a = %d" %
-                            (spots_n)
-                            )
-            plate_ids = cursor.fetchall()
-            plate_ids_str = ",".join([str(item[0]) for item in plate_ids])
+        cursor = self.conn.cursor()
 
-            # Get the distances that match the plate IDs.
-            cursor.execute( "SELECT distance "
-                            "FROM %s "
-                            "WHERE rec_pla_id IN (%s)" %
-                            (distance_table, plate_ids_str)
-                            )
+        # Empty the plate_ratio_groups table before we use it again.
+        cursor.execute("DELETE FROM plate_ratio_groups")
 
-        # Save the number of matching plates. Note that this variable can only
-        # be called after the iter that this generator returns was used.
-        self.matching_plates_total = len(plate_ids)
+        cursor.execute("SELECT pla_id, n_spots_a, n_spots_b "
+            "FROM plate_spot_totals")
+        rows = []
+        for pla_id, n_spots_a, n_spots_b in cursor.fetchall():
+            ratio = tuple(sorted((n_spots_a, n_spots_b)))
+            if ratio in ratio_to_group:
+                rows.append( (pla_id, ratio_to_group[ratio]) )
 
-        # Return all matching distances.
-        for distance in cursor:
-            yield distance[0]
+        cursor.executemany("INSERT INTO plate_ratio_groups VALUES (?,?)",
+            rows)
 
-        # Close connection with the local database.
+        # Commit the transaction.
+        self.conn.commit()
         cursor.close()
 
-    def get_distances_matching_ratios(self, distance_table, ratios):
-        """Get the spot distances from distance table `distance_table` where
-        positive spots numbers between species A and B have ratio
-        matching the list of ratios `ratios`.
+        return len(rows)
+
+    def get_distance_frequencies(self, distance_table, distances,
+            by_ratio_group=False):
+        """Return the frequencies of the spot distances in distance table
+        `distance_table` for each combination of positive spot numbers.
 
-        The ratio A:B is considered the same as B:A.
+        The distances of all plates in table "plate_spot_totals" are
+        counted in a single query, grouped by the positive spot numbers of
+        the plates. Returns a dictionary where the keys are
+        ``(n_spots_a, n_spots_b)`` tuples and the values are lists with the
+        frequency of each spot distance in `distances`. The value for
+        `n_spots_b` is None if only the column "n_spots_a" is populated.
 
-        This is a generator, meaning that this method returns an
-        iterator. This iterator returns the distances.
+        If `by_ratio_group` is True, the distances are instead grouped by
+        the ratios groups in table "plate_ratio_groups" (see
+        :meth:`fill_plate_ratio_groups_table`), and the keys are the
+        numbers of the ratios groups.
         """
-        cursor = self.conn.cursor()
-        plate_ids = []
+        index = dict([(d, i) for i, d in enumerate(distances)])
 
-        for ratio in ratios:
-            # Get the plate IDs that match the ratio A:B.
-            cursor.execute( "SELECT pla_id "
-                            "FROM plate_spot_totals "
-                            "WHERE n_spots_a = %d "
-                            "AND n_spots_b = %d" %
-                            (ratio[0], ratio[1])
+        cursor = self.conn.cursor()
+        if by_ratio_group:
+            cursor.execute( "SELECT g.ratio_group, d.distance, COUNT(*) "
+                            "FROM %s AS d "
+                            "INNER JOIN plate_ratio_groups AS g "
+                            "ON d.rec_pla_id = g.pla_id "
+                            "GROUP BY g.ratio_group, d.distance" %
+                            (distance_table)
                             )
-
-            # Add the plate IDs to the list of plate IDs.
-            ids = [x[0] for x in cursor.fetchall()]
-            plate_ids.extend(ids)
-
-            # We need the complement ratio B:A as well, so we get the
-            # plate IDs for the complement as well.
-
-            # No need to get the complement ratio if it's the same.
-            if ratio[0] == ratio[1]:
-                continue
-
-            # Get the plate IDs that match the complement ratio B:A.
-            cursor.execute( "SELECT pla_id "
-                            "FROM plate_spot_totals "
-                            "WHERE n_spots_a = %d "
-                            "AND n_spots_b = %d" %
-                            (ratio[1], ratio[0])
+            rows = cursor
+        else:
+            cursor.execute( "SELECT t.n_spots_a, t.n_spots_b, d.distance, "
+                            "COUNT(*) "
+                            "FROM %s AS d "
+                            "INNER JOIN plate_spot_totals AS t "
+                            "ON d.rec_pla_id = t.pla_id "
+                            "GROUP BY t.n_spots_a, t.n_spots_b, d.distance" %
+                            (distance_table)
                             )
+            rows = (((a, b), d, n) for a, b, d, n in cursor)
 
-            # Add the plate IDs to the list of plate IDs.
-            ids = [x[0] for x in cursor.fetchall()]
-            plate_ids.extend(ids)
-
-        # Save the number of matching plates. Note that this variable can only
-        # be called after the iter that this generator returns was used.
-        self.matching_plates_total = len(plate_ids)
-
-        # Turn the list of plate IDs into a string.
-        plate_ids_str = ",".join([str(x) for x in plate_ids])
-
-        # Get the distances that match the plate IDs.
-        cursor.execute( "SELECT distance "
-                        "FROM %s "
-                        "WHERE rec_pla_id IN (%s)" %
-                        (distance_table, plate_ids_str)
-                        )
+        frequencies = {}
+        for key, distance, n in rows:
+            if distance not in index:
+                raise ValueError("Unknown spot distance '%s'" % distance)
+            if key not in frequencies:
+                frequencies[key] = [0] * len(distances)
+            frequencies[key][index[distance]] = n
 
-        # Return all matching distances.
-        for distance in cursor:
-            yield distance[0]
-
-        # Close connection with the local database.
         cursor.close()
+        return frequencies
 
-    def get_area_totals(self, plate_area_totals_table, area_group):
-        """Return total number of positive spots per area group per plate.
+    def get_plate_totals(self, by_ratio_group=False):
+        """Return the number of plates in table "plate_spot_totals" for each
+        combination of positive spot numbers.
 
-        Argument `plate_area_totals_table` is either
-        ``plate_area_totals_observed`` or ``plate_area_totals_expected``.
-        The area group `area_group` can be a sequence containing a
-        combination of the letters A, B, C, and D. Each letter is one of
-        the default areas on a SETL plate.
+        Returns a dictionary where the keys are ``(n_spots_a, n_spots_b)``
+        tuples and the values are the number of plates. If `by_ratio_group`
+        is True, the plates are counted per ratios group in table
+        "plate_ratio_groups" instead, and the keys are the numbers of the
+        ratios groups.
         """
         cursor = self.conn.cursor()
-
-        # Compile a string containing the area fields for 'area_group'.
-        fields = []
-        for area in area_group:
-            if area == 'A':
-                fields.append('area_a')
-            elif area == 'B':
-                fields.append('area_b')
-            elif area == 'C':
-                fields.append('area_c')
-            elif area == 'D':
-                fields.append('area_d')
-        fields_str = ",".join(fields)
-
-        # Get the area totals for the areas in area group.
-        cursor.execute( "SELECT %s FROM %s" %
-                        (fields_str, plate_area_totals_table)
-                        )
-
-        if len(fields) > 1:
-            # We're dealing with combined areas, so we will return the total of
-            # the areas combined.
-            for totals in cursor:
-                total = 0
-                for t in totals:
-                    total += t
-                yield total
+        if by_ratio_group:
+            cursor.execute( "SELECT ratio_group, COUNT(pla_id) "
+                            "FROM plate_ratio_groups "
+                            "GROUP BY ratio_group"
+                            )
+            totals = dict(cursor.fetchall())
         else:
-            # One field, so one total is returned per row.
-            for total in cursor:
-                yield total[0]
-
-        # Close connection with the local database.
+            cursor.execute( "SELECT n_spots_a, n_spots_b, COUNT(pla_id) "
+                            "FROM plate_spot_totals "
+                            "GROUP BY n_spots_a, n_spots_b"
+                            )
+            totals = dict([((a, b), n) for a, b, n in cursor])
         cursor.close()
+        return totals
 
-    def get_plates_total_matching_spots_total(self, n_spots, slot=0):
-        """Return the number of plates that match the provided number of
-        positive spots `n_spots`.
+    def get_expected_distances_inter(self, n_spots_a, n_spots_b):
+        """Return the exact expected inter-specific spot distance
+        frequencies for a plate with `n_spots_a` and `n_spots_b` positive
+        spots for the first and second species.
 
-        Possible values for `slot` are 0 for the first species selection,
-        and 1 for the second species selection.
+        Returns a list of tuples ``(distance, frequency)`` ordered by
+        distance. The frequencies are obtained from the
+        "expected_distances_inter" table.
         """
         cursor = self.conn.cursor()
+        cursor.execute( "SELECT distance, frequency "
+                        "FROM expected_distances_inter "
+                        "WHERE n_spots_a = ? "
+                        "AND n_spots_b = ? "
+                        "ORDER BY distance",
+                        (n_spots_a, n_spots_b))
+        distances = cursor.fetchall()
+        cursor.close()
+        return distances
 
-        if slot == 0:
-            field = 'n_spots_a'
-        elif slot == 1:
-            field = 'n_spots_b'
-        else:
-            raise ValueError("Possible values for 'slot' are 0 and 1.")
-
-        if n_spots < 0:
-            # If spots_n is a negative number, get all distances
-            # up to the absolute number. So if we find -5, get all
-            # distances with up to 5 spots.
-            cursor.execute( "SELECT COUNT(pla_id) "
-                            "FROM plate_spot_totals "
-                            "WHERE %s <= ?" % (field),
-                            [abs(n_spots)])
-            n_plates = cursor.fetchone()[0]
-        else:
-            # If it's a positive number, just get the plates that
-            # match that spots number.
-            cursor.execute( "SELECT COUNT(pla_id) "
-                            "FROM plate_spot_totals "
-                            "WHERE %s = ?" % (field),
-                            [n_spots])
-            n_plates = cursor.fetchone()[0]
+    def get_plate_spot_totals(self):
+        """Return the number of positive spots for each plate in the
+        "plate_spot_totals" table.
 
+        Returns a list of tuples ``(pla_id, n_spots_a, n_spots_b)`` ordered by
+        plate ID.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute( "SELECT pla_id, n_spots_a, n_spots_b "
+                        "FROM plate_spot_totals "
+                        "ORDER BY pla_id"
+                        )
+        totals = cursor.fetchall()
         cursor.close()
-        return n_plates
+        return totals
 
 class AccessLocalDB(AccessDBGeneric):
     """Provide standard methods for accessing data in the local
@@ -1273,11 +1536,16 @@ class AccessLocalDB(AccessDBGeneric):
     Inherits from :class:`AccessDBGeneric` which provides this
     class with methods that are not data source specific.
 
+    The temporary tables are only created if they don't exist yet, and are
+    emptied before they are filled. So an instance of this class can be
+    reused for multiple analyses (see
+    :meth:`setlyze.analysis.common.init_worker`).
+
     Design Part: 1.28
     """
 
-    def __init__(self):
-        super(AccessLocalDB, self).__init__()
+    def __init__(self, scratch="disk", readonly=False):
+        super(AccessLocalDB, self).__init__(scratch, readonly)
 
     def create_table_species_spots_1(self):
         """Create temporary table "species_spots_1".
@@ -1292,7 +1560,7 @@ class AccessLocalDB(AccessDBGeneric):
         Design Part: 1.80
         Creates Design Part: 2.9, 2.9.1, 2.9.2
         """
-        self.cursor.execute("CREATE TEMP TABLE species_spots_1 (\
+        self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS species_spots_1 (\
             id INTEGER PRIMARY KEY, \
             rec_pla_id INTEGER, \
             rec_sur1 INTEGER, \
@@ -1319,8 +1587,16 @@ class AccessLocalDB(AccessDBGeneric):
             rec_sur22 INTEGER, \
             rec_sur23 INTEGER, \
             rec_sur24 INTEGER, \
-            rec_sur25 INTEGER \
+            rec_sur25 INTEGER, \
+            rec_spots INTEGER, \
+            rec_n_spots INTEGER, \
+            rec_area_a INTEGER, \
+            rec_area_b INTEGER, \
+            rec_area_c INTEGER, \
+            rec_area_d INTEGER \
         )")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_spots_1_pla "
+            "ON species_spots_1 (rec_pla_id)")
 
 
     def create_table_species_spots_2(self):
@@ -1336,7 +1612,7 @@ class AccessLocalDB(AccessDBGeneric):
         Design Part: 1.81
         Creates Design Part: 2.10, 2.10.1, 2.10.2
         """
-        self.cursor.execute("CREATE TEMP TABLE species_spots_2 (\
+        self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS species_spots_2 (\
             id INTEGER PRIMARY KEY, \
             rec_pla_id INTEGER, \
             rec_sur1 INTEGER, \
@@ -1363,8 +1639,16 @@ class AccessLocalDB(AccessDBGeneric):
             rec_sur22 INTEGER, \
             rec_sur23 INTEGER, \
             rec_sur24 INTEGER, \
-            rec_sur25 INTEGER \
+            rec_sur25 INTEGER, \
+            rec_spots INTEGER, \
+            rec_n_spots INTEGER, \
+            rec_area_a INTEGER, \
+            rec_area_b INTEGER, \
+            rec_area_c INTEGER, \
+            rec_area_d INTEGER \
         )")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_spots_2_pla "
+            "ON species_spots_2 (rec_pla_id)")
 
     def create_table_spot_distances_observed(self):
         """Create temporary table "spot_distances_observed".
@@ -1374,11 +1658,13 @@ class AccessLocalDB(AccessDBGeneric):
         Design Part: 1.83
         Creates Design Part: 2.12
         """
-        self.cursor.execute("CREATE TEMP TABLE spot_distances_observed (\
+        self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS spot_distances_observed (\
             id INTEGER PRIMARY KEY, \
             rec_pla_id INTEGER, \
             distance REAL \
         )")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_distances_observed_pla "
+            "ON spot_distances_observed (rec_pla_id)")
 
     def create_table_spot_distances_expected(self):
         """Create temporary table "spot_distances_expected".
@@ -1388,11 +1674,13 @@ class AccessLocalDB(AccessDBGeneric):
         Design Part: 1.84
         Creates Design Part: 2.13
         """
-        self.cursor.execute("CREATE TEMP TABLE spot_distances_expected (\
+        self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS spot_distances_expected (\
             id INTEGER PRIMARY KEY, \
             rec_pla_id INTEGER, \
             distance REAL \
         )")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_distances_expected_pla "
+            "ON spot_distances_expected (rec_pla_id)")
 
     def create_table_plate_spot_totals(self):
         """Create temporary table "plate_spot_totals".
@@ -1402,45 +1690,48 @@ class AccessLocalDB(AccessDBGeneric):
         Design Part: 1.85
         Creates Design Part: 2.39
         """
-        self.cursor.execute("CREATE TEMP TABLE plate_spot_totals (\
+        self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS plate_spot_totals (\
             pla_id INTEGER PRIMARY KEY, \
             n_spots_a INTEGER, \
             n_spots_b INTEGER \
         )")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_plate_spot_totals_n "
+            "ON plate_spot_totals (n_spots_a, n_spots_b)")
 
-    def create_table_plate_area_totals_observed(self):
-        """Create temporary table "plate_area_totals_observed".
+    def create_table_plate_ratio_groups(self):
+        """Create temporary table "plate_ratio_groups".
 
-        This table is used to store the total of positive spots per plate area
-        per plate ID.
+        This table is used to store the spot ratios group of each plate.
 
-        Design Part:
+        Creates Design Part: 2.45
         """
-
-        # Design Part:
-        self.cursor.execute("CREATE TEMP TABLE plate_area_totals_observed (\
+        self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS plate_ratio_groups (\
             pla_id INTEGER PRIMARY KEY, \
-            area_a INTEGER, \
-            area_b INTEGER, \
-            area_c INTEGER, \
-            area_d INTEGER \
+            ratio_group INTEGER \
         )")
-
-    def create_table_plate_area_totals_expected(self):
-        """Create temporary table "plate_area_totals_expected".
-
-        This table is used to store the total of expected positive spots per
-        plate area per plate ID.
-
-        Design Part: TODO
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_plate_ratio_groups "
+            "ON plate_ratio_groups (ratio_group)")
+
+    def set_selection(self, table, ids):
+        """Save the IDs in the list `ids` to the temporary selection table
+        `table`.
+
+        The selections of locations, species and records are saved to
+        selection tables, so queries can join against these tables instead
+        of including all IDs in the query string. The table is created if it
+        doesn't exist yet and is emptied before the IDs are saved. Argument
+        `ids` can also be a single integer.
         """
-        self.cursor.execute("CREATE TEMP TABLE plate_area_totals_expected (\
-            pla_id INTEGER PRIMARY KEY, \
-            area_a INTEGER, \
-            area_b INTEGER, \
-            area_c INTEGER, \
-            area_d INTEGER \
-        )")
+        if isinstance(ids, (int, long)):
+            ids = [ids]
+
+        cursor = self.conn.cursor()
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS %s "
+            "(id INTEGER PRIMARY KEY)" % (table))
+        cursor.execute("DELETE FROM %s" % (table))
+        cursor.executemany("INSERT OR IGNORE INTO %s VALUES (?)" % (table),
+            [(id,) for id in ids])
+        cursor.close()
 
     def get_species(self, locations):
         """Return species that match a locations selection `locations`.
@@ -1451,34 +1742,21 @@ class AccessLocalDB(AccessDBGeneric):
 
         Design Part: 1.96
         """
-        cursor = self.conn.cursor()
+        self.set_selection('selected_locations', locations)
 
-        # Select all plate IDs from plates that are from the selected
-        # locations.
-        placeholders = ','.join('?' * len(locations))
-        cursor.execute("SELECT pla_id FROM plates WHERE pla_loc_id IN (%s)" %
-            (placeholders), locations)
-        # Construct a list with the IDs
-        pla_ids = [row[0] for row in cursor]
-        # Remove duplicates.
-        pla_ids = setlyze.std.uniqify(pla_ids)
-        # Create a string of the IDs for the query.
-        pla_ids_str = ",".join([str(id) for id in pla_ids])
-
-        # Select all species IDs from records with those plate IDs.
-        cursor.execute("SELECT rec_spe_id FROM records WHERE rec_pla_id IN (%s) AND rec_spe_id != ''" % pla_ids_str)
-        # Construct a list with the IDs
-        spe_ids = [row[0] for row in cursor]
-        # Remove duplicates.
-        spe_ids = setlyze.std.uniqify(spe_ids)
-        # Create a string of the IDs for the query.
-        spe_ids_str = ",".join([str(id) for id in spe_ids]) # Turn the list into a string
-        #print "spe_ids: ", spe_ids
-
-        # Select information from species that match those species IDs.
-        cursor.execute("SELECT spe_id,spe_name_venacular,spe_name_latin,"
-            "spe_invasive_in_nl,spe_phylum,spe_class,spe_order,spe_family,"
-            "spe_genus,spe_species,spe_subspecies FROM species WHERE spe_id IN (%s)" % spe_ids_str)
+        # Select information from species that are found on plates from
+        # the selected locations.
+        cursor = self.conn.cursor()
+        cursor.execute( "SELECT spe_id,spe_name_venacular,spe_name_latin,"
+                        "spe_invasive_in_nl,spe_phylum,spe_class,spe_order,"
+                        "spe_family,spe_genus,spe_species,spe_subspecies "
+                        "FROM species "
+                        "WHERE spe_id IN ("
+                            "SELECT r.rec_spe_id FROM records AS r "
+                            "WHERE %s "
+                            "AND r.rec_spe_id != ''"
+                        ")" % SELECTED_PLATES_SQL
+                        )
         species = cursor.fetchall()
 
         cursor.close()
@@ -1495,33 +1773,15 @@ class AccessLocalDB(AccessDBGeneric):
 
         Design Part: 1.41
         """
-        # Create strings containing all the selected locations and
-        # species IDs. These will be part of the queries below.
-        if isinstance(locations, int):
-            loc_ids_str = str(locations)
-        else:
-            loc_ids_str = ",".join([str(id) for id in locations])
+        self.set_selection('selected_locations', locations)
+        self.set_selection('selected_species', species)
 
-        if isinstance(species, int):
-            spe_ids_str = str(species)
-        else:
-            spe_ids_str = ",".join([str(id) for id in species])
-
-        # Get the plate IDs that match the selected locations.
+        # Select all record IDs from plates of the selected locations that
+        # match the selected species.
         cursor = self.conn.cursor()
-        cursor.execute("SELECT pla_id FROM plates WHERE pla_loc_id IN (%s)"
-            % (loc_ids_str))
-
-        # Construct a list with the plate IDs.
-        pla_ids = [row[0] for row in cursor]
-        pla_ids_str = ",".join([str(id) for id in pla_ids])
-
-        # Select all record IDs that match the plate IDs and the
-        # selected species.
-        cursor.execute( "SELECT rec_id FROM records "
-                        "WHERE rec_pla_id IN (%s) "
-                        "AND rec_spe_id IN (%s)"
-                        % (pla_ids_str, spe_ids_str)
+        cursor.execute( "SELECT r.rec_id FROM records AS r "
+                        "WHERE %s "
+                        "ORDER BY r.rec_id" % SELECTED_RECORDS_SQL
                         )
 
         # Construct a list with the record IDs.
@@ -1530,33 +1790,6 @@ class AccessLocalDB(AccessDBGeneric):
         cursor.close()
         return rec_ids
 
-    def get_spots(self, rec_ids):
-        """Return all 25 spot booleans for the records with IDs matching
-        the list of record IDs `rec_ids`.
-
-        This is a generator, meaning that this method returns an
-        iterator. This iterator returns tuples with the 25 spot booleans for
-        all matching records.
-        """
-        # Create a string of the IDs for the query.
-        rec_ids_str = ",".join([str(id) for id in rec_ids])
-
-        # Get all 25 spots from each record that matches the list of
-        # record IDs.
-        cursor = self.conn.cursor()
-        cursor.execute( "SELECT rec_sur1,rec_sur2,rec_sur3,rec_sur4,rec_sur5,"
-                        "rec_sur6,rec_sur7,rec_sur8,rec_sur9,rec_sur10,"
-                        "rec_sur11,rec_sur12,rec_sur13,rec_sur14,rec_sur15,"
-                        "rec_sur16,rec_sur17,rec_sur18,rec_sur19,rec_sur20,"
-                        "rec_sur21,rec_sur22,rec_sur23,rec_sur24,rec_sur25 "
-                        "FROM records "
-                        "WHERE rec_id IN (%s)" % (rec_ids_str)
-                        )
-
-        for record in cursor:
-            yield record
-        cursor.close()
-
     def set_species_spots(self, rec_ids, slot):
         """Create a table in the local database containing the spots
         information for SETL records matching `rec_ids`. Two spots
@@ -1568,44 +1801,74 @@ class AccessLocalDB(AccessDBGeneric):
 
         Design Part: 1.19.1
         """
+        self.set_selection('selected_records', rec_ids)
+
+        # Copy the records to the spots table.
+        self.insert_species_spots(slot,
+            "WHERE r.rec_id IN (SELECT id FROM selected_records)")
+
+    def set_species_spots_from_selection(self, locations, species, slot):
+        """Create a table in the local database containing the spots
+        information for the SETL records that match the locations and species
+        selections.
+
+        This does the same as :meth:`get_record_ids` followed by
+        :meth:`set_species_spots`, but the records are selected and copied
+        to the spots table with a single query. The values for `slot` can be
+        ``0`` for table ``species_spots_1`` and ``1`` for
+        ``species_spots_2``.
+
+        Returns the number of records that match the selections.
+        """
+        self.set_selection('selected_locations', locations)
+        self.set_selection('selected_species', species)
+
+        # Copy the matching records to the spots table.
+        return self.insert_species_spots(slot,
+            "WHERE %s" % SELECTED_RECORDS_SQL)
+
+    def insert_species_spots(self, slot, where):
+        """Empty a spots table and fill it with the records that are
+        selected with the SQL WHERE clause `where` on table "records" (alias
+        ``r``). The values for `slot` can be ``0`` for table
+        ``species_spots_1`` and ``1`` for ``species_spots_2``.
+
+        Returns the number of records saved to the spots table.
+        """
         cursor = self.conn.cursor()
-        cursor2 = self.conn.cursor()
 
         # The available tables to save the spots to.
         tables = ('species_spots_1','species_spots_2')
 
-        # Turn the list into a string, as it'll be included in the query.
-        rec_ids_str = ",".join([str(item) for item in rec_ids])
-
         # Empty the required tables before we start.
         cursor.execute( "DELETE FROM %s" % (tables[slot]) )
 
         # Commit the database transaction.
         self.conn.commit()
 
-        # Get plate ID and all 25 spots from each record that matches
-        # the list of record IDs.
-        cursor.execute( "SELECT rec_pla_id,"
-                        "rec_sur1,rec_sur2,rec_sur3,rec_sur4,rec_sur5,"
-                        "rec_sur6,rec_sur7,rec_sur8,rec_sur9,rec_sur10,"
-                        "rec_sur11,rec_sur12,rec_sur13,rec_sur14,rec_sur15,"
-                        "rec_sur16,rec_sur17,rec_sur18,rec_sur19,rec_sur20,"
-                        "rec_sur21,rec_sur22,rec_sur23,rec_sur24,rec_sur25 "
-                        "FROM records "
-                        "WHERE rec_id IN (%s)" %
-                        (rec_ids_str)
+        # Copy the plate ID, all 25 spots and the derived spot columns from
+        # each selected record to the species_spots table.
+        cursor.execute( "INSERT INTO %s "
+                        "SELECT null,r.rec_pla_id,"
+                        "r.rec_sur1,r.rec_sur2,r.rec_sur3,r.rec_sur4,r.rec_sur5,"
+                        "r.rec_sur6,r.rec_sur7,r.rec_sur8,r.rec_sur9,r.rec_sur10,"
+                        "r.rec_sur11,r.rec_sur12,r.rec_sur13,r.rec_sur14,r.rec_sur15,"
+                        "r.rec_sur16,r.rec_sur17,r.rec_sur18,r.rec_sur19,r.rec_sur20,"
+                        "r.rec_sur21,r.rec_sur22,r.rec_sur23,r.rec_sur24,r.rec_sur25,"
+                        "%s "
+                        "FROM records AS r %s "
+                        "ORDER BY r.rec_id" %
+                        (tables[slot],
+                        ",".join(["r.%s" % c for c in SPOT_COLUMNS]),
+                        where)
                         )
-
-        # Insert each resulting row in the species_spots table.
-        placeholders = ','.join('?' * 26)
-        for row in cursor:
-            cursor2.execute("INSERT INTO %s VALUES (null,%s)" %
-                (tables[slot], placeholders), row)
+        n_records = cursor.rowcount
 
         # Commit the database transaction.
         self.conn.commit()
         cursor.close()
-        cursor2.close()
+
+        return n_records
 
 class AccessRemoteDB(AccessDBGeneric):
     """Provide standard methods for accessing data in the remote
@@ -28,6 +28,7 @@ from sqlite3 import dbapi2 as sqlite
 
 from setlyze import __version__
 import setlyze.config
+import setlyze.database
 from setlyze.std import make_remarks
 
 
@@ -113,7 +114,7 @@ class Report(object):
                 }
             ]
         """
-        connection = sqlite.connect(self.dbfile)
+        connection = setlyze.database.connect(self.dbfile, readonly=True)
         cursor = connection.cursor()
 
         self.locations_selections = []
@@ -160,7 +161,7 @@ class Report(object):
                 }
             ]
         """
-        connection = sqlite.connect(self.dbfile)
+        connection = setlyze.database.connect(self.dbfile, readonly=True)
         cursor = connection.cursor()
 
         self.species_selections = []
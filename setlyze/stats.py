@@ -19,24 +19,55 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Statistics related functions."""
+"""Statistics related functions.
+
+The functions that depend on R use RPy2 to call R. R is only started (and
+RPy2 and pandas are only imported) the first time such a function is called,
+so the native functions in this module can be used without R.
+"""
 
 import itertools
+import math
 import random
 
-from pandas.core.series import Series
-from pandas.rpy.common import convert_robj
-import rpy2.robjects as robjects
-from rpy2.rinterface import NULL
-from rpy2.robjects import FloatVector
-from rpy2.robjects.packages import importr
+import numpy
+
+import setlyze.config
+
+# The R singleton. This is set by :meth:`get_r` when R is first needed.
+_r = None
+
+def get_r():
+    """Return the R singleton.
+
+    R is started on the first call of this function. Importing RPy2 starts
+    the embedded R interpreter, which takes a while, so this is only done
+    when R is actually needed.
+    """
+    global _r
+    if _r is None:
+        import rpy2.robjects
+
+        r = rpy2.robjects.r
 
-# Get the R singleton.
-r = robjects.r
+        # Suppress warnings from R. Last occurred warnings can still be
+        # obtained with the `warnings` function.
+        r['options'](warn=-1)
 
-# Suppress warnings from R. Last occurred warnings can still be obtained with
-# the `warnings` function.
-r['options'](warn=-1)
+        _r = r
+    return _r
+
+def float_vector(x):
+    """Return sequence `x` as an R vector of floats, or R's ``NULL`` if `x`
+    is None.
+    """
+    get_r()
+    from rpy2.rinterface import NULL
+    from rpy2.robjects import FloatVector
+
+    if x is None:
+        return NULL
+    return FloatVector(list(x))
 
 class ListVectorAsDict(object):
 
@@ -47,7 +78,12 @@ class ListVectorAsDict(object):
 
     def __call__(self, *args, **kwargs):
         out = self.f(*args, **kwargs)
-        if isinstance(out, robjects.vectors.ListVector):
+
+        # The R function has been called, so R is initialized by now.
+        from pandas.rpy.common import convert_robj
+        from rpy2.robjects.vectors import ListVector
+
+        if isinstance(out, ListVector):
             return self.simplify( convert_robj(out) )
         return out
 
@@ -57,6 +93,9 @@ class ListVectorAsDict(object):
         Lists containing only a single item are returned as single items and
         ``rpy2.rinterface.NULL`` values are converted to None.
         """
+        from pandas.core.series import Series
+        from rpy2.rinterface import NULL
+
         if obj is NULL:
             return None
         if isinstance(obj, Series):
@@ -85,7 +124,7 @@ class ListVectorAsDict(object):
         return obj
 
 @ListVectorAsDict
-def t_test(x, y=NULL, **kwargs):
+def t_test(x, y=None, **kwargs):
     """Performs one and two sample t-tests on sequences of data.
 
     This is a wrapper function for the ``t.test`` function from R. It depends on
@@ -112,13 +151,12 @@ def t_test(x, y=NULL, **kwargs):
             'alternative': 'two.sided'
         }
     """
-    x = FloatVector(x)
-    if y:
-        y = FloatVector(y)
-    return r('t.test')(x, y, **kwargs)
+    x = float_vector(x)
+    y = float_vector(y)
+    return get_r()('t.test')(x, y, **kwargs)
 
 @ListVectorAsDict
-def wilcox_test(x, y=NULL, **kwargs):
+def wilcox_test(x, y=None, **kwargs):
     """Performs one and two sample Wilcoxon tests on sequences of data;
     the latter is also known as ‘Mann-Whitney’ test.
 
@@ -146,10 +184,289 @@ def wilcox_test(x, y=NULL, **kwargs):
             'method': 'Wilcoxon rank sum test with continuity correction'
         }
     """
-    x = FloatVector(x)
-    if y:
-        y = FloatVector(y)
-    return r('wilcox.test')(x, y, **kwargs)
+    x = float_vector(x)
+    y = float_vector(y)
+    return get_r()('wilcox.test')(x, y, **kwargs)
+
+def pnorm(q, lower_tail=True):
+    """Return the value of the standard normal distribution function for
+    quantile `q`.
+
+    If `lower_tail` is False, the upper tail probability is returned. This
+    gives the same result as the ``pnorm`` function from R.
+    """
+    if lower_tail:
+        return 0.5 * math.erfc(-q / math.sqrt(2))
+    return 0.5 * math.erfc(q / math.sqrt(2))
+
+_wilcox_counts = {}
+
+def wilcox_counts(m, n):
+    """Return the frequencies of the Wilcoxon rank sum statistic.
+
+    Returns a list where item ``k`` is the number of ways to get statistic
+    ``k`` for samples of sizes `m` and `n` without ties. These are the
+    coefficients of the Gaussian binomial coefficient ``(m+n choose m)``,
+    obtained as the product of ``(1 - q^(n+i)) / (1 - q^i)`` for ``i`` from
+    1 to `m`. The results are cached, because the same sample sizes are
+    often tested repeatedly.
+    """
+    if (m, n) in _wilcox_counts:
+        return _wilcox_counts[(m, n)]
+
+    counts = [1] + [0] * (m * n)
+    for i in range(1, m + 1):
+        # Multiply by (1 - q^(n+i)).
+        for k in range(m * n, n + i - 1, -1):
+            counts[k] -= counts[k - n - i]
+        # Divide by (1 - q^i).
+        for k in range(i, m * n + 1):
+            counts[k] += counts[k - i]
+
+    _wilcox_counts[(m, n)] = counts
+    return counts
+
+def pwilcox(q, m, n, lower_tail=True):
+    """Return the value of the distribution function of the Wilcoxon rank
+    sum statistic for quantile `q` and samples of sizes `m` and `n`.
+
+    If `lower_tail` is False, ``P[W > q]`` is returned instead of
+    ``P[W <= q]``. This gives the same result as the ``pwilcox`` function
+    from R.
+    """
+    counts = wilcox_counts(m, n)
+    total = float(sum(counts))
+    q = int(math.floor(q + 1e-7))
+    if lower_tail:
+        return sum(counts[:max(q + 1, 0)]) / total
+    return sum(counts[max(q + 1, 0):]) / total
+
+def wilcox_test_frequencies(x, y, alternative="two.sided", correct=True,
+        exact=None, paired=False, conf_level=0.95, conf_int=False):
+    """Performs the two sample Wilcoxon rank sum test on frequency tables.
+
+    Arguments `x` and `y` are sequences with the frequencies of the values of
+    both samples. Item ``k`` of both sequences is the frequency of the same
+    value, and the values must be sorted from small to large. The values
+    themselves are not needed, as the test only depends on their ranks.
+
+    This gives the same results as :meth:`wilcox_test` for unpaired samples,
+    without the need for R. It is meant for data with few distinct values,
+    like spot distances. The rank of each value is the mid-rank of its
+    frequency class, so the time needed for the test only depends on the
+    number of distinct values, not on the size of the samples.
+
+    Like the ``wilcox.test`` function from R, an exact p-value is computed
+    if both samples contain less than 50 values and there are no ties,
+    unless `exact` is set to False. Otherwise the normal approximation is
+    used with a correction for ties, and with a continuity correction if
+    `correct` is True. Confidence intervals are not supported, so
+    `conf_level` is ignored.
+
+    This function returns a dictionary in the same format as
+    :meth:`wilcox_test` ::
+
+        {
+            'null.value': {
+                'location shift': 0
+            },
+            'p.value': 0.040624470138227236,
+            'statistic': {
+                'W': 22.5
+            },
+            'alternative': 'two.sided',
+            'parameter': None,
+            'method': 'Wilcoxon rank sum test with continuity correction'
+        }
+    """
+    if paired:
+        raise ValueError("Paired tests are not supported.")
+    if conf_int:
+        raise ValueError("Confidence intervals are not supported.")
+    if alternative not in ("two.sided", "less", "greater"):
+        raise ValueError("Unknown alternative '%s'." % alternative)
+
+    n_x = sum(x)
+    n_y = sum(y)
+    if n_x < 1 or n_y < 1:
+        raise ValueError("Both samples must contain at least one value.")
+
+    # Get the sum of the ranks of sample `x`, and the tie correction. Values
+    # of the same frequency class all get the mid-rank of that class.
+    rank_sum = 0.0
+    ties = 0
+    n_before = 0
+    for f_x, f_y in zip(x, y):
+        t = f_x + f_y
+        if t < 1:
+            continue
+        rank_sum += f_x * (n_before + (t + 1) / 2.0)
+        ties += t ** 3 - t
+        n_before += t
+    statistic = rank_sum - n_x * (n_x + 1) / 2.0
+
+    if exact is None:
+        exact = n_x < 50 and n_y < 50
+
+    if exact and ties == 0:
+        method = "Wilcoxon rank sum test"
+        if alternative == "two.sided":
+            if statistic > n_x * n_y / 2.0:
+                p = pwilcox(statistic - 1, n_x, n_y, lower_tail=False)
+            else:
+                p = pwilcox(statistic, n_x, n_y)
+            p_value = min(2 * p, 1.0)
+        elif alternative == "greater":
+            p_value = pwilcox(statistic - 1, n_x, n_y, lower_tail=False)
+        else:
+            p_value = pwilcox(statistic, n_x, n_y)
+    else:
+        method = "Wilcoxon rank sum test"
+        z = statistic - n_x * n_y / 2.0
+        sigma = math.sqrt((n_x * n_y / 12.0) * ((n_x + n_y + 1) -
+            ties / float((n_x + n_y) * (n_x + n_y - 1))))
+        correction = 0.0
+        if correct:
+            if alternative == "two.sided":
+                correction = math.copysign(0.5, z) if z != 0 else 0.0
+            elif alternative == "greater":
+                correction = 0.5
+            else:
+                correction = -0.5
+            method = "Wilcoxon rank sum test with continuity correction"
+
+        if sigma == 0:
+            # All values are equal. R returns NaN in this case.
+            p_value = float('nan')
+        else:
+            z = (z - correction) / sigma
+            if alternative == "two.sided":
+                p_value = 2 * min(pnorm(z), pnorm(z, lower_tail=False))
+            elif alternative == "greater":
+                p_value = pnorm(z, lower_tail=False)
+            else:
+                p_value = pnorm(z)
+
+    return {
+        'null.value': {
+            'location shift': 0
+        },
+        'p.value': p_value,
+        'statistic': {
+            'W': statistic
+        },
+        'alternative': alternative,
+        'parameter': None,
+        'method': method,
+    }
+
+def get_frequency_tables(x, y):
+    """Return the frequency tables for samples `x` and `y`.
+
+    Returns a tuple ``(values, freq_x, freq_y)``, where `values` is a sorted
+    array with the distinct values of both samples, and `freq_x` and `freq_y`
+    are arrays with the frequency of each value in `x` and `y`. The frequency
+    tables can be passed to :meth:`wilcox_test_frequencies`.
+    """
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    values, inverse = numpy.unique(numpy.concatenate([x, y]),
+        return_inverse=True)
+    freq_x = numpy.bincount(inverse[:len(x)], minlength=len(values))
+    freq_y = numpy.bincount(inverse[len(x):], minlength=len(values))
+    return (values, freq_x, freq_y)
+
+def wilcox_test_groups(groups, values=None, backend=None, **kwargs):
+    """Performs two sample Wilcoxon rank sum tests on many groups at once.
+
+    Argument `groups` is a sequence of ``(x, y)`` tuples, where `x` and `y`
+    are the two samples of a group. If `values` is set, `x` and `y` are not
+    samples but frequency tables, where item ``k`` is the frequency of value
+    ``values[k]`` in the sample (see :meth:`wilcox_test_frequencies`). All
+    other keyword arguments are passed to the test for each group.
+
+    The tests are performed by the backend `backend`, which is either
+    "native" or "r". If it is not set, the ``stats-backend`` configuration
+    is used. The "native" backend uses :meth:`wilcox_test_frequencies`. The
+    "r" backend performs the tests for all groups with a single call to R,
+    which loops over the groups with ``lapply``.
+
+    This function returns a dictionary with an item for each group in the
+    lists. Below is the format of the dictionary with example results for
+    ``wilcox_test_groups([([1,2,3,4,4],[3,4,5,6,7,7]), ([0,1],[0,1,2])])`` ::
+
+        {
+            'statistic': array([ 3.5,  2. ]),
+            'p.value': array([ 0.04172271,  0.76090673]),
+            'method': ['Wilcoxon rank sum test with continuity correction',
+                'Wilcoxon rank sum test with continuity correction']
+        }
+    """
+    if backend is None:
+        backend = setlyze.config.cfg.get('stats-backend')
+    if backend == "native":
+        results = wilcox_test_groups_native(groups, values, **kwargs)
+    elif backend == "r":
+        results = wilcox_test_groups_r(groups, values, **kwargs)
+    else:
+        raise ValueError("Unknown statistics backend '%s'." % backend)
+
+    statistics, p_values, methods = zip(*results) if results else ([],[],[])
+    return {
+        'statistic': numpy.array(statistics, dtype=float),
+        'p.value': numpy.array(p_values, dtype=float),
+        'method': list(methods),
+    }
+
+def wilcox_test_groups_native(groups, values=None, **kwargs):
+    """Return a list of ``(statistic, p_value, method)`` tuples for the
+    Wilcoxon tests on `groups`, performed with
+    :meth:`wilcox_test_frequencies`.
+
+    See :meth:`wilcox_test_groups` for the arguments.
+    """
+    results = []
+    for x, y in groups:
+        if values is None:
+            _, x, y = get_frequency_tables(x, y)
+        result = wilcox_test_frequencies(x, y, **kwargs)
+        results.append((result['statistic']['W'], result['p.value'],
+            result['method']))
+    return results
+
+def wilcox_test_groups_r(groups, values=None, **kwargs):
+    """Return a list of ``(statistic, p_value, method)`` tuples for the
+    Wilcoxon tests on `groups`, performed by R in a single call.
+
+    See :meth:`wilcox_test_groups` for the arguments.
+    """
+    r = get_r()
+    f = r('''
+        function(xs, ys, values, ...) {
+            lapply(seq_along(xs), function(i) {
+                x <- xs[[i]]
+                y <- ys[[i]]
+                if (!is.null(values)) {
+                    x <- rep(values, x)
+                    y <- rep(values, y)
+                }
+                t <- wilcox.test(x, y, ...)
+                list(t$statistic[[1]], t$p.value, t$method)
+            })
+        }
+    ''')
+
+    xs = r['list'](*[float_vector(x) for x, y in groups])
+    ys = r['list'](*[float_vector(y) for x, y in groups])
+    values = float_vector(values)
+
+    # Use the R names for the arguments (e.g. conf.level for conf_level).
+    kwargs = dict([(k.replace('_', '.'), v) for k, v in kwargs.iteritems()])
+
+    results = []
+    for result in f(xs, ys, values, **kwargs):
+        results.append((result[0][0], result[1][0], result[2][0]))
+    return results
 
 @ListVectorAsDict
 def shapiro_test(x):
@@ -178,10 +495,155 @@ def shapiro_test(x):
     elif len(x) < 3:
         raise ValueError("Argument 'x' must contain at least 3 numeric values.")
 
-    return r('shapiro.test')( FloatVector(x) )
+    return get_r()('shapiro.test')( float_vector(x) )
+
+def pgamma_upper(a, x):
+    """Return the regularized upper incomplete gamma function ``Q(a, x)``.
+
+    The series expansion is used for ``x < a + 1`` and the continued fraction
+    expansion (evaluated with the modified Lentz's method) otherwise, as
+    described in :ref:`Press et al. <ref-press>`.
+    """
+    if x <= 0:
+        return 1.0
+    eps = 1e-15
+    tiny = 1e-300
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+
+    if x < a + 1:
+        # Series expansion of the lower incomplete gamma function P(a,x).
+        term = total = 1.0 / a
+        n = a
+        for i in range(1000):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * eps:
+                break
+        return 1.0 - total * math.exp(log_prefix)
+
+    # Continued fraction expansion of Q(a,x).
+    b = x + 1 - a
+    c = 1.0 / tiny
+    d = 1.0 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        if abs(d) < tiny:
+            d = tiny
+        c = b + an / c
+        if abs(c) < tiny:
+            c = tiny
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < eps:
+            break
+    return math.exp(log_prefix) * h
+
+def pchisq(q, df, lower_tail=True):
+    """Return the value of the chi-squared distribution function with `df`
+    degrees of freedom for quantile `q`.
+
+    If `lower_tail` is False, the upper tail probability is returned. This
+    gives the same result as the ``pchisq`` function from R.
+    """
+    if math.isnan(q):
+        return float('nan')
+    if math.isinf(q):
+        upper = 0.0
+    else:
+        upper = pgamma_upper(df / 2.0, q / 2.0)
+    if lower_tail:
+        return 1.0 - upper
+    return upper
+
+def chisq_test(x, y=None, p=None, rescale_p=False, **kwargs):
+    """Performs the chi-squared goodness-of-fit test.
+
+    Argument `x` is a sequence of observed frequencies, and `p` a sequence of
+    the same length with the probability for each frequency. If `p` is not
+    set, all probabilities are equal. If `rescale_p` is True, the
+    probabilities are rescaled to sum up to 1. Otherwise the probabilities
+    must sum up to 1, or a ValueError is raised.
+
+    This gives the same results as the ``chisq.test`` function from R, but
+    without the need for R. For contingency table tests (when `y` is set),
+    the test is performed by R with :meth:`chisq_test_r`.
+
+    This function returns a dictionary in the same format as
+    :meth:`chisq_test_r`. Below is the format of the dictionary with example
+    results for ``chisq_test([10,20,30], p=[0.25,0.25,0.5])`` ::
+
+        {
+            'method': 'Chi-squared test for given probabilities',
+            'statistic': {
+                'X-squared': 3.3333333333333335
+            },
+            'parameter': {
+                'df': 2
+            },
+            'p.value': 0.18887560283756188,
+            'observed': [10, 20, 30],
+            'expected': [15.0, 15.0, 30.0],
+            'residuals': [-1.2909944487358056, 1.2909944487358056, 0.0],
+            'stdres': [-1.4907119849998598, 1.4907119849998598, 0.0]
+        }
+    """
+    if y is not None:
+        if p is not None:
+            kwargs['p'] = p
+        return chisq_test_r(x, y, rescale_p=rescale_p, **kwargs)
+
+    x = list(x)
+    if p is None:
+        p = [1.0 / len(x)] * len(x)
+    p = [float(v) for v in p]
+
+    if len(x) != len(p):
+        raise ValueError("'x' and 'p' must have the same number of elements")
+    if min(p) < 0:
+        raise ValueError("probabilities must be non-negative.")
+    if rescale_p:
+        p_total = sum(p)
+        p = [v / p_total for v in p]
+    elif abs(sum(p) - 1) > math.sqrt(2.220446e-16):
+        raise ValueError("probabilities must sum to 1.")
+
+    n = sum(x)
+    expected = [n * v for v in p]
+
+    def ratio(a, b):
+        # Floating point division that behaves like it does in R.
+        if b == 0:
+            if a == 0:
+                return float('nan')
+            return math.copysign(float('inf'), a)
+        return a / b
+
+    statistic = sum([ratio((o - e) ** 2, e) for o, e in zip(x, expected)])
+    df = len(x) - 1
+
+    return {
+        'method': "Chi-squared test for given probabilities",
+        'statistic': {
+            'X-squared': statistic
+        },
+        'parameter': {
+            'df': df
+        },
+        'p.value': pchisq(statistic, df, lower_tail=False),
+        'observed': x,
+        'expected': expected,
+        'residuals': [ratio(o - e, math.sqrt(e)) for o, e in zip(x, expected)],
+        'stdres': [ratio(o - e, math.sqrt(e * (1 - v)))
+            for o, e, v in zip(x, expected, p)],
+    }
 
 @ListVectorAsDict
-def chisq_test(x, y=NULL, **kwargs):
+def chisq_test_r(x, y=None, **kwargs):
     """Performs chi-squared contingency table tests and
      goodness-of-fit tests.
 
@@ -214,10 +676,9 @@ def chisq_test(x, y=NULL, **kwargs):
     """
     if 'p' not in kwargs:
         kwargs['p'] = itertools.repeat(1.0 / len(x), len(x))
-    kwargs['p'] = FloatVector( list(kwargs['p']) )
+    kwargs['p'] = float_vector(kwargs['p'])
 
-    x = FloatVector(x)
-    if y:
-        y = FloatVector(y)
+    x = float_vector(x)
+    y = float_vector(y)
 
-    return r('chisq.test')(x, y, **kwargs)
+    return get_r()('chisq.test')(x, y, **kwargs)
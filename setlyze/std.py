@@ -27,10 +27,10 @@ import sys
 import os
 import math
 import itertools
-import random
 import re
 import unicodedata
 
+import numpy
 import pkg_resources
 
 from setlyze import FROZEN
@@ -253,7 +253,7 @@ def get_spot_combinations_from_record(record1, record2=None):
     """
     spots1 = get_spots_from_record(record1)
 
-    if not record2:
+    if record2 is None:
         # Create a generator with all the possible positive spot
         # combinations within a record.
         try:
@@ -397,67 +397,445 @@ def get_spot_position_difference(s1, s2):
 
     return (h,v)
 
-def get_random_for_plate(n):
-    """Return a `n` length list of random integers with a range from 1
-    to 25. So naturally `n` can have a value from 0 to 25. The list of
-    integers returned represents random selected spots from a 25 spots
-    SETL plate.
+def make_spot_distance_code_table():
+    """Return a 25x25 lookup table with the distance code of each spot pair
+    on a SETL plate.
 
-    We make use of the :py:meth:`random.sample` function from the Python
-    standard library. As described in the Python documentation, this
-    function is bound to an instance of :py:class:`random.Random` which
-    uses the :py:meth:`random.random` method. In turn this method uses
-    the Mersenne Twister (:ref:`Matsumoto & Nishimura <ref-matsumoto>`)
-    as the core generator. The Mersenne Twister is one of the most
-    extensively tested random number generators in existence.
+    The table is a tuple of tuples and is indexed by spot number minus one,
+    so the distance code for spots `s1` and `s2` is found at
+    ``codes[s1-1][s2-1]``. The distance code is the index in
+    :data:`DISTANCE_CLASSES` of the distance returned by :meth:`distance` for
+    the position difference of the two spots.
 
-    .. seealso::
+    This function is called once when this module is imported. Use the
+    module constant :data:`SPOT_DISTANCE_CODE_TABLE` instead of calling it
+    directly.
+    """
+    codes = []
+    for s1 in xrange(1,26):
+        row = []
+        for s2 in xrange(1,26):
+            h,v = get_spot_position_difference(s1,s2)
+            row.append(DISTANCE_CLASSES.index(distance(h,v)))
+        codes.append(tuple(row))
+    return tuple(codes)
+
+# All possible spot distances on a 5x5 SETL plate, sorted from small to large.
+# The position of a distance in this tuple is its distance code. Distance 0
+# only occurs for inter-specific spot distances.
+DISTANCE_CLASSES = (0, 1, 1.41, 2, 2.24, 2.83, 3, 3.16, 3.61, 4, 4.12, 4.24,
+    4.47, 5, 5.66)
+
+# Lookup table for the distance code of each spot pair. Calculating a spot
+# distance from the spot coordinates is expensive, so this is done only once.
+# The distance of a spot pair is ``DISTANCE_CLASSES[code]``.
+SPOT_DISTANCE_CODE_TABLE = make_spot_distance_code_table()
+
+def make_spot_pair_class_matrix():
+    """Return the spot pair distance class matrix for a SETL plate.
+
+    The returned value is a NumPy integer array with shape ``(K,25,25)``,
+    where ``K`` is the number of distance classes in
+    :data:`DISTANCE_CLASSES`. Element ``[k,s1-1,s2-1]`` is 1 if the distance
+    between spots `s1` and `s2` belongs to distance class ``k``, and 0
+    otherwise.
+
+    This function is called once when this module is imported. Use the
+    module constant :data:`SPOT_PAIR_CLASS_MATRIX` instead of calling it
+    directly.
+    """
+    codes = numpy.array(SPOT_DISTANCE_CODE_TABLE)
+    classes = numpy.arange(len(DISTANCE_CLASSES))
+    return (codes[numpy.newaxis,:,:] ==
+        classes[:,numpy.newaxis,numpy.newaxis]).astype(numpy.int64)
+
+# The spot pair distance class matrix. The intra-specific variant only
+# contains the spot pairs above the diagonal, so each spot combination is
+# counted once and a spot is never paired with itself.
+SPOT_PAIR_CLASS_MATRIX = make_spot_pair_class_matrix()
+SPOT_PAIR_CLASS_MATRIX_INTRA = numpy.array([numpy.triu(m, 1) for m in
+    SPOT_PAIR_CLASS_MATRIX])
+
+def spots_to_matrix(records):
+    """Return a NumPy array with shape ``(n,25)`` for a sequence of `n`
+    records with 25 spot booleans each. Positive spots are set to 1, all
+    other spots are set to 0.
+    """
+    spots = numpy.array(records, dtype=numpy.int64).reshape(-1, 25)
+    return (spots != 0).astype(numpy.int64)
+
+def get_distance_histograms(spots1, spots2, pairs, chunk_size=4096):
+    """Return the spot distance histograms for each plate.
+
+    Arguments `spots1` and `spots2` are arrays with shape ``(n,25)`` as
+    returned by :meth:`spots_to_matrix`, where row ``i`` of both arrays
+    belongs to the same plate. Argument `pairs` is a spot pair distance class
+    matrix with shape ``(K,25,25)`` (see :data:`SPOT_PAIR_CLASS_MATRIX`).
+
+    Returns an integer array with shape ``(n,K)``. Element ``[i,k]`` is the
+    number of spot pairs on plate ``i`` with a distance in class ``k``.
+    For the pairs matrix ``M`` this is ``spots1[i] * M[k] * spots2[i]``, which
+    is calculated for all plates and all distance classes at once. The plates
+    are processed in chunks of `chunk_size` rows to limit memory usage.
+    """
+    n_classes, n_spots = pairs.shape[0], pairs.shape[1]
+
+    # Put the pair matrices of all distance classes side by side, so a
+    # single matrix product handles all distance classes.
+    flat = pairs.transpose(1,0,2).reshape(n_spots, n_classes*n_spots)
+
+    histograms = numpy.zeros((len(spots1), n_classes), dtype=numpy.int64)
+    for start in xrange(0, len(spots1), chunk_size):
+        end = start + chunk_size
+        partial = numpy.dot(spots1[start:end], flat).reshape(-1, n_classes,
+            n_spots)
+        histograms[start:end] = (partial *
+            spots2[start:end,numpy.newaxis,:]).sum(axis=2)
+    return histograms
+
+def get_distance_histograms_intra(spots):
+    """Return the intra-specific spot distance histograms for each plate.
+
+    Argument `spots` is an array with shape ``(n,25)`` as returned by
+    :meth:`spots_to_matrix`. Returns an integer array with shape ``(n,14)``,
+    with a column for each distance in :data:`DISTANCE_CLASSES` except
+    distance 0. Each spot combination on a plate is counted once, so this
+    gives the same distances as :meth:`get_spot_combinations_from_record`:
 
-       Module :py:mod:`random`
-          Documentation of the :py:mod:`random` standard module.
+        >>> import setlyze.std
+        >>> record = (1,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1)
+        >>> spots = setlyze.std.spots_to_matrix([record])
+        >>> setlyze.std.get_distance_histograms_intra(spots).tolist()
+        [[1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1]]
     """
-    spots = random.sample(xrange(1,26), n)
-    return spots
+    histograms = get_distance_histograms(spots, spots,
+        SPOT_PAIR_CLASS_MATRIX_INTRA)
+    return histograms[:,1:]
+
+def get_distance_histograms_inter(spots1, spots2):
+    """Return the inter-specific spot distance histograms for each plate.
+
+    Arguments `spots1` and `spots2` are arrays with shape ``(n,25)`` as
+    returned by :meth:`spots_to_matrix`, where row ``i`` of both arrays
+    belongs to the same plate. Returns an integer array with shape ``(n,15)``,
+    with a column for each distance in :data:`DISTANCE_CLASSES`. All spot
+    combinations between both records are counted, including spots that are
+    positive in both records (distance 0).
+    """
+    return get_distance_histograms(spots1, spots2, SPOT_PAIR_CLASS_MATRIX)
+
+def get_distance_rows(plate_ids, histograms, distances):
+    """Return a generator with a ``(plate_id, distance)`` tuple for each
+    spot distance in `histograms`.
+
+    Argument `histograms` is an array as returned by
+    :meth:`get_distance_histograms_intra` or
+    :meth:`get_distance_histograms_inter`, `plate_ids` contains the plate ID
+    for each row, and `distances` is the distance for each column. The
+    generator can be passed directly to ``cursor.executemany()`` to save the
+    spot distances to the database.
+    """
+    distances = [float(d) for d in distances]
+    for plate_id, histogram in zip(plate_ids, histograms.tolist()):
+        for d, count in zip(distances, histogram):
+            for i in xrange(count):
+                yield (plate_id, d)
+
+def make_expected_distance_frequencies_intra():
+    """Return the exact expected intra-specific spot distance frequencies.
+
+    Returns a tuple with 26 items, one for each possible number of positive
+    spots `n` on a plate (0 to 25). Each item is a tuple with the expected
+    number of spot pairs in each distance class of :data:`DISTANCE_CLASSES`,
+    except distance 0, for a plate with `n` random positive spots.
+
+    If `n` spots are selected at random, each of the 300 spot combinations on
+    a plate is equally likely to be one of the ``n*(n-1)/2`` spot
+    combinations on that plate. So the expected frequency of a distance class
+    is the number of spot combinations on that plate times the fraction of
+    all spot combinations that belong to that distance class. These
+    fractions are the same as the probabilities of the
+    ``spot-dist-to-prob-intra`` configuration.
+
+    This function is called once when this module is imported. Use the
+    module constant :data:`EXPECTED_DISTANCE_FREQUENCIES_INTRA` instead of
+    calling it directly.
+    """
+    pair_counts = SPOT_PAIR_CLASS_MATRIX_INTRA.sum(axis=2).sum(axis=1)[1:]
+    total = float(pair_counts.sum())
+    frequencies = []
+    for n in xrange(26):
+        n_pairs = n * (n-1) / 2
+        frequencies.append(tuple([n_pairs * c / total for c in pair_counts]))
+    return tuple(frequencies)
+
+# The exact expected intra-specific spot distance frequencies for each number
+# of positive spots on a plate.
+EXPECTED_DISTANCE_FREQUENCIES_INTRA = make_expected_distance_frequencies_intra()
+
+def apportion(total, weights):
+    """Return a list of integers that sum up to `total` and are proportional
+    to `weights`.
+
+    This uses the largest remainder method. Each item first gets the integer
+    part of its share, and the remaining units go to the items with the
+    largest fractional parts:
 
-def combine_records(records):
-    """Return a combined SETL records from a list of multiple SETL
-    records with the same plate ID.
+        >>> import setlyze.std
+        >>> setlyze.std.apportion(10, [1,1,1])
+        [4, 3, 3]
+        >>> setlyze.std.apportion(4, [0.5,0.25,0.25])
+        [2, 1, 1]
+    """
+    weight_total = float(sum(weights))
+    shares = [total * w / weight_total for w in weights]
+    counts = [int(math.floor(share)) for share in shares]
+    remainders = sorted(xrange(len(shares)),
+        key=lambda i: counts[i] - shares[i])
+    for i in remainders[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+def get_expected_distance_frequencies_inter(n_spots_a, n_spots_b):
+    """Return the exact expected inter-specific spot distance frequencies
+    for a plate with `n_spots_a` random positive spots for the first species
+    and `n_spots_b` random positive spots for the second species.
+
+    Returns a tuple with the expected number of spot pairs in each distance
+    class of :data:`DISTANCE_CLASSES`. The random spots of both species are
+    selected independently, so each of the ``n_spots_a*n_spots_b`` spot pairs
+    between both species is equally likely to be any of the 625 spot pairs
+    on a plate (including pairs of the same spot, which have distance 0).
+    """
+    pair_counts = SPOT_PAIR_CLASS_MATRIX.sum(axis=2).sum(axis=1)
+    total = float(pair_counts.sum())
+    n_pairs = n_spots_a * n_spots_b
+    return tuple([n_pairs * c / total for c in pair_counts])
+
+def get_exact_distance_rows(plate_ids, n_pairs, frequencies, distances):
+    """Return a generator with a ``(plate_id, distance)`` tuple for each
+    exact expected spot distance.
+
+    Each plate with an ID in `plate_ids` must have `n_pairs` spot pairs.
+    The expected distances for these plates taken together follow the
+    expected frequencies `frequencies` for a single plate, rounded to whole
+    numbers with :meth:`apportion`. Argument `distances` is the distance for
+    each item in `frequencies`. Each plate is assigned `n_pairs` distances,
+    so the number of expected distances is always equal to the number of
+    observed distances.
+    """
+    if n_pairs < 1 or not plate_ids:
+        return
+    counts = apportion(n_pairs * len(plate_ids), frequencies)
+    i = 0
+    for d, count in zip(distances, counts):
+        for j in xrange(count):
+            yield (plate_ids[i / n_pairs], float(d))
+            i += 1
+
+def get_exact_distance_rows_intra(plate_ids, n_spots):
+    """Return a generator with a ``(plate_id, distance)`` tuple for each
+    exact expected intra-specific spot distance.
+
+    All plates with IDs `plate_ids` must have `n_spots` positive spots. The
+    expected distances are obtained from
+    :data:`EXPECTED_DISTANCE_FREQUENCIES_INTRA` with
+    :meth:`get_exact_distance_rows`.
+    """
+    n_pairs = n_spots * (n_spots-1) / 2
+    return get_exact_distance_rows(plate_ids, n_pairs,
+        EXPECTED_DISTANCE_FREQUENCIES_INTRA[n_spots], DISTANCE_CLASSES[1:])
+
+def get_random_plates(spot_totals, repeats=1, random_state=None):
+    """Return random positive spots for a number of plates and repeats.
+
+    Argument `spot_totals` is a sequence with the number of positive spots
+    for each plate. Returns a NumPy array with shape
+    ``(repeats, len(spot_totals), 25)``. Element ``[r,i,s-1]`` is 1 if spot
+    `s` of plate ``i`` is positive in repeat `r`, and 0 otherwise. Each plate
+    has exactly the number of positive spots from `spot_totals`, and all
+    spots are equally likely to be positive.
+
+    All random spots are generated at once. A uniform random number is drawn
+    for each spot, and the spots with the `n` smallest numbers on a plate
+    are the `n` positive spots. These are found by sorting the numbers of
+    each plate and comparing all numbers with the `n`-th smallest number.
+
+    Argument `random_state` is a :py:class:`numpy.random.RandomState`
+    instance used for the random numbers. If it is not set, a new random
+    generator with a random seed is used.
+    """
+    if random_state is None:
+        random_state = numpy.random.RandomState()
+    spot_totals = numpy.asarray(spot_totals, dtype=numpy.int64)
+    n_plates = len(spot_totals)
+    draws = random_state.random_sample((repeats, n_plates, 25))
+
+    # Get the n-th smallest number for each plate. Plates without positive
+    # spots get a threshold below the smallest possible number.
+    thresholds = numpy.sort(draws, axis=2)[:, numpy.arange(n_plates),
+        numpy.maximum(spot_totals-1, 0)]
+    thresholds[:, spot_totals < 1] = -1.0
+
+    return (draws <= thresholds[:,:,numpy.newaxis]).astype(numpy.int64)
+
+# The bit for each spot in a spot mask, ordered by spot number. A spot mask
+# is the set of positive spots of a plate encoded as a 25-bit integer, where
+# bit ``n-1`` is set if spot number ``n`` is positive. The "rec_spots" column
+# of the records holds the spot mask of each record.
+SPOT_BITS = tuple([1 << i for i in xrange(25)])
+
+# The spot numbers for each of the default plate areas.
+PLATE_AREA_SPOTS = {
+    'A': (1,5,21,25),
+    'B': (2,3,4,6,10,11,15,16,20,22,23,24),
+    'C': (7,8,9,12,14,17,18,19),
+    'D': (13,),
+}
+
+# The default plate areas, in the order of the columns of the arrays returned
+# by :meth:`get_plate_area_totals`.
+PLATE_AREAS = ('A','B','C','D')
+
+def make_spot_area_table():
+    """Return a lookup array with the plate area of each spot.
+
+    Returns a NumPy array with shape ``(25,4)``. Element ``[s-1,a]`` is 1 if
+    spot `s` is in the plate area ``PLATE_AREAS[a]``, and 0 otherwise. So
+    each row contains a single 1. The matrix product of a spot matrix with
+    this array gives the area totals of each plate (see
+    :meth:`get_plate_area_totals`).
+    """
+    table = numpy.zeros((25, len(PLATE_AREAS)), dtype=numpy.int64)
+    for i, area in enumerate(PLATE_AREAS):
+        for spot in PLATE_AREA_SPOTS[area]:
+            table[spot-1, i] = 1
+    return table
 
-    `records` is a list containing multiple SETL records where each
-    record is a sequence with the plate ID as the first item followed by
-    25 spot booleans. As this function is used for combining records
-    from different species found on the same plate, the plate ID of all
-    records must be equal.
+# The plate area lookup array for all spots.
+SPOT_AREA_TABLE = make_spot_area_table()
 
-    A basic usage example:
+def get_plate_area_totals(spots):
+    """Return the number of positive spots in each default plate area for
+    each plate.
+
+    Argument `spots` is either an array with shape ``(...,25)`` as returned
+    by :meth:`spots_to_matrix` and :meth:`get_random_plates`, or a sequence
+    with a spot mask (see :data:`SPOT_BITS`) for each plate. Returns an
+    integer array with shape ``(...,4)`` with the totals for the plate areas
+    in :data:`PLATE_AREAS`. The totals of all plates are calculated at once:
 
         >>> import setlyze.std
-        >>> rec1 = (4567,1,1,0,0,1,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0)
-        >>> rec2 = (4567,0,0,1,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,1)
-        >>> rec3 = (4567,0,0,0,0,0,0,0,0,0,1,1,1,1,1,0,0,0,0,0,0,0,0,0,0,0)
-        >>> records = [rec1,rec2,rec3]
-        >>> setlyze.std.combine_records(records)
-        [4567, 1, 1, 1, 0, 1, 0, 0, 0, 0, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1]
+        >>> record = (1,1,0,0,1,0,0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0)
+        >>> spots = setlyze.std.spots_to_matrix([record])
+        >>> setlyze.std.get_plate_area_totals(spots).tolist()
+        [[2, 2, 0, 0]]
+        >>> mask = 1 | 2 | 16 | 16384
+        >>> setlyze.std.get_plate_area_totals([mask, 0]).tolist()
+        [[2, 2, 0, 0], [0, 0, 0, 0]]
     """
-    combined = [None,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0]
+    spots = numpy.asarray(spots, dtype=numpy.int64)
+    if spots.ndim == 1:
+        # Expand the spot masks to a spot matrix.
+        spots = (spots[:,numpy.newaxis] >> numpy.arange(25)) & 1
+    return numpy.dot(spots, SPOT_AREA_TABLE)
 
-    # Set the plate ID.
-    if len(records):
-        combined[0] = records[0][0]
+def binomial_coefficient(n, k):
+    """Return the number of ways to choose `k` items from `n` items.
 
-    for record in records:
-        # Make sure all plate IDs are the same.
-        if combined[0] != record[0]:
-            raise ValueError("Argument 'records' must contain records with equal plate ID.")
-
-        # For each positive spot we find, set that spot in the combined
-        # record to 1. We skip the first item, as that's the plate ID.
-        for i, spot in enumerate(record[1:], start=1):
-            # If spot is positive, set the same spot in 'combined' to 1.
-            if spot:
-                combined[i] = 1
+        >>> import setlyze.std
+        >>> setlyze.std.binomial_coefficient(25, 2)
+        300
 
-    return combined
+    """
+    if k < 0 or k > n:
+        return 0
+    return int(math.factorial(n) / (math.factorial(k) * math.factorial(n-k)))
+
+def make_area_totals_distributions():
+    """Return the distribution of the plate area totals for each number of
+    random positive spots on a plate.
+
+    If `n` of the 25 spots are randomly selected, the numbers of selected
+    spots in the plate areas follow a multivariate hypergeometric
+    distribution with the area sizes 4, 12, 8 and 1. Because there are only
+    1170 combinations of area totals, the distribution is calculated
+    exactly for each `n`.
+
+    Returns a list with a tuple ``(totals, cumulative)`` for each number of
+    positive spots from 0 to 25. Here `totals` is an array with shape
+    ``(m,4)`` with each possible combination of totals for the plate areas in
+    :data:`PLATE_AREAS`, and `cumulative` is an array with the cumulative
+    probabilities of these combinations.
+    """
+    sizes = [len(PLATE_AREA_SPOTS[area]) for area in PLATE_AREAS]
+    totals = [[] for n in range(26)]
+    weights = [[] for n in range(26)]
+    for combination in itertools.product(*[range(size+1) for size in sizes]):
+        n = sum(combination)
+        weight = 1
+        for size, k in zip(sizes, combination):
+            weight *= binomial_coefficient(size, k)
+        totals[n].append(combination)
+        weights[n].append(weight)
+
+    distributions = []
+    for n in range(26):
+        cumulative = numpy.cumsum(weights[n]) / float(binomial_coefficient(25, n))
+        # Make sure that the last probability is exactly 1.
+        cumulative[-1] = 1.0
+        distributions.append( (numpy.array(totals[n], dtype=numpy.int64),
+            cumulative) )
+    return distributions
+
+# The distribution of the plate area totals for each number of random
+# positive spots.
+AREA_TOTALS_DISTRIBUTIONS = make_area_totals_distributions()
+
+def get_random_area_totals(spot_totals, repeats=1, random_state=None):
+    """Return random plate area totals for a number of plates and repeats.
+
+    Argument `spot_totals` is a sequence with the number of positive spots
+    for each plate. Returns an integer array with shape
+    ``(repeats, len(spot_totals), 4)`` with the totals for the plate areas in
+    :data:`PLATE_AREAS`. These are the area totals of random positive spots
+    as generated by :meth:`get_random_plates`, but the totals are drawn
+    directly without generating the spots.
+
+    The area totals follow a multivariate hypergeometric distribution (see
+    :meth:`make_area_totals_distributions`). A single uniform random number
+    is drawn for each plate and repeat, and the area totals are looked up in
+    the cumulative probabilities for the number of positive spots of the
+    plate. All plates with the same number of positive spots are sampled at
+    once:
+
+        >>> import numpy
+        >>> import setlyze.std
+        >>> totals = setlyze.std.get_random_area_totals([0, 3, 25], 2,
+        ...     numpy.random.RandomState(1))
+        >>> totals.shape
+        (2, 3, 4)
+        >>> totals.sum(axis=2).tolist()
+        [[0, 3, 25], [0, 3, 25]]
+        >>> totals[0,2].tolist()
+        [4, 12, 8, 1]
+
+    Argument `random_state` is a :py:class:`numpy.random.RandomState`
+    instance used for the random numbers. If it is not set, a new random
+    generator with a random seed is used.
+    """
+    if random_state is None:
+        random_state = numpy.random.RandomState()
+    spot_totals = numpy.asarray(spot_totals, dtype=numpy.int64)
+    draws = random_state.random_sample((repeats, len(spot_totals)))
+    totals = numpy.zeros((repeats, len(spot_totals), len(PLATE_AREAS)),
+        dtype=numpy.int64)
+    for n in numpy.unique(spot_totals):
+        combinations, cumulative = AREA_TOTALS_DISTRIBUTIONS[n]
+        plates = spot_totals == n
+        index = numpy.searchsorted(cumulative, draws[:,plates], side='right')
+        totals[:,plates] = combinations[index]
+    return totals
 
 def mean(x):
     """Return the arithmetic mean of a sequence of numbers `x`.
@@ -472,6 +850,39 @@ def mean(x):
     """
     return sum(x, 0.0) / len(x)
 
+def weighted_mean(x, weights):
+    """Return the mean of a sequence of numbers `x` where each number is
+    counted the number of times given in `weights`.
+
+    This is used for calculating the mean of a frequency table.
+
+        >>> import setlyze.std
+        >>> setlyze.std.weighted_mean([1, 2, 3], [2, 0, 2])
+        2.0
+
+    """
+    return sum([v * w for v, w in zip(x, weights)], 0.0) / sum(weights)
+
+def sum_frequencies(tables, keys, size):
+    """Return the sum of the frequency tables in dictionary `tables` for the
+    keys in `keys`.
+
+    Each frequency table is a list of length `size`. Keys that are not
+    present in `tables` are ignored.
+
+        >>> import setlyze.std
+        >>> tables = {2: [1, 0, 3], 3: [0, 2, 1], 4: [5, 5, 5]}
+        >>> setlyze.std.sum_frequencies(tables, [2, 3, 9], 3)
+        [1, 2, 4]
+
+    """
+    total = [0] * size
+    for key in keys:
+        if key not in tables:
+            continue
+        total = [a + b for a, b in zip(total, tables[key])]
+    return total
+
 def is_significant(p_value, alpha_level=0.05):
     """Returns True if the p-value `p_value` is significant, False otherwise.
 
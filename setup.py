@@ -35,6 +35,7 @@ setup(
     packages=find_packages(exclude=['build','docs','env','tests']),
     install_requires=[
         'appdirs',
+        'numpy',
         #'PyGTK>=2.24.0,!=2.24.8,!=2.24.10',
         'pandas',
         'RPy2',
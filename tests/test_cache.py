@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the report cache in :mod:`setlyze.cache` and its use by
+:class:`setlyze.analysis.common.PrepareAnalysis`.
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import gobject
+
+import setlyze.analysis.common
+import setlyze.cache
+import setlyze.config
+import setlyze.report
+
+# The configurations changed by these tests.
+CONFIGS = ('cache-path', 'cache-size', 'db-file', 'random-seed',
+    'alpha-level')
+
+class Analysis(object):
+    """Stand-in for an analysis class in the cache keys."""
+
+class OtherAnalysis(object):
+    """Another stand-in for an analysis class."""
+
+def make_report(name):
+    """Return a non-empty report with the option "Name" set to `name`."""
+    report = setlyze.report.Report()
+    report.set_option('Name', name)
+    report.statistics = {'test': {'attr': None, 'results': {}}}
+    return report
+
+class CacheTestCase(unittest.TestCase):
+    """Base class that points the cache and the local database to a
+    temporary folder.
+    """
+
+    def setUp(self):
+        self.configs = dict((k, setlyze.config.cfg.get(k)) for k in CONFIGS)
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmpdir, 'cache')
+
+        # A local database with just a fingerprint.
+        self.dbfile = os.path.join(self.tmpdir, 'setl_local.db')
+        connection = sqlite3.connect(self.dbfile)
+        connection.execute("CREATE TABLE info (id INTEGER PRIMARY KEY, "
+            "name VARCHAR, value VARCHAR)")
+        connection.execute("INSERT INTO info VALUES (null, 'fingerprint', "
+            "'abc123')")
+        connection.commit()
+        connection.close()
+
+        setlyze.config.cfg.set('cache-path', self.cache_path)
+        setlyze.config.cfg.set('cache-size', 1)
+        setlyze.config.cfg.set('db-file', self.dbfile)
+        setlyze.config.cfg.set('random-seed', 1234)
+
+    def tearDown(self):
+        for key, value in self.configs.items():
+            setlyze.config.cfg.set(key, value)
+        shutil.rmtree(self.tmpdir)
+
+class TestMakeKey(CacheTestCase):
+
+    def test_stable(self):
+        args = ([1, 2], [3], {'area1': ['A'], 'area2': ['B', 'C']})
+        key = setlyze.cache.make_key(Analysis, args, 'abc')
+        self.assertEqual(key, setlyze.cache.make_key(Analysis, args, 'abc'))
+        self.assertEqual(len(key), 40)
+
+    def test_normalize(self):
+        # Lists and tuples, and the order of dictionary items don't matter.
+        a = ([1, 2], {'area1': ['A'], 'area2': ['B', 'C']})
+        b = ((1, 2), dict([('area2', ('B', 'C')), ('area1', ('A',))]))
+        self.assertEqual(setlyze.cache.make_key(Analysis, a, 'abc'),
+            setlyze.cache.make_key(Analysis, b, 'abc'))
+
+    def test_inputs(self):
+        key = setlyze.cache.make_key(Analysis, ([1], [2]), 'abc')
+        self.assertNotEqual(key,
+            setlyze.cache.make_key(OtherAnalysis, ([1], [2]), 'abc'))
+        self.assertNotEqual(key,
+            setlyze.cache.make_key(Analysis, ([1], [3]), 'abc'))
+        self.assertNotEqual(key,
+            setlyze.cache.make_key(Analysis, ([1], [2]), 'abd'))
+
+        # The analysis options are part of the key.
+        setlyze.config.cfg.set('alpha-level', 0.01)
+        self.assertNotEqual(key,
+            setlyze.cache.make_key(Analysis, ([1], [2]), 'abc'))
+        setlyze.config.cfg.set('random-seed', 1)
+        self.assertNotEqual(key,
+            setlyze.cache.make_key(Analysis, ([1], [2]), 'abc'))
+
+class TestReportCache(CacheTestCase):
+
+    def test_get_put(self):
+        cache = setlyze.cache.ReportCache()
+        self.assertEqual(cache.get('a'), None)
+        cache.put('a', make_report('a'))
+        self.assertEqual(cache.get('a').get_option('Name'), 'a')
+
+        # Replace an existing report.
+        cache.put('a', make_report('b'))
+        self.assertEqual(cache.get('a').get_option('Name'), 'b')
+
+    def test_get_corrupt(self):
+        cache = setlyze.cache.ReportCache()
+        cache.put('a', make_report('a'))
+        f = open(cache.get_filename('a'), 'wb')
+        f.write('not a pickle')
+        f.close()
+        self.assertEqual(cache.get('a'), None)
+        self.assertFalse(os.path.exists(cache.get_filename('a')))
+
+    def test_evict(self):
+        cache = setlyze.cache.ReportCache()
+        for i, key in enumerate('abcd'):
+            cache.put(key, make_report(key))
+            # Make sure the modification times differ.
+            t = time.time() - 100 + i
+            os.utime(cache.get_filename(key), (t, t))
+        size = os.path.getsize(cache.get_filename('a'))
+
+        # Loading a report marks it as recently used.
+        self.assertNotEqual(cache.get('a'), None)
+
+        # Keep room for two reports.
+        cache.max_size = size * 2 + size / 2
+        cache.evict()
+        self.assertEqual(sorted(os.listdir(self.cache_path)),
+            ['a.pickle', 'd.pickle'])
+
+    def test_clear(self):
+        cache = setlyze.cache.ReportCache()
+        cache.put('a', make_report('a'))
+        cache.clear()
+        self.assertEqual(os.listdir(self.cache_path), [])
+
+    def test_get_report_cache(self):
+        self.assertTrue(setlyze.cache.get_report_cache())
+        setlyze.config.cfg.set('cache-size', 0)
+        self.assertEqual(setlyze.cache.get_report_cache(), None)
+        setlyze.config.cfg.set('cache-size', 1)
+        setlyze.config.cfg.set('random-seed', None)
+        self.assertEqual(setlyze.cache.get_report_cache(), None)
+
+class TestPrepareAnalysisCache(CacheTestCase):
+
+    def setUp(self):
+        super(TestPrepareAnalysisCache, self).setUp()
+        # The jobs as passed to calculatestar. The last argument is the
+        # execute queue, which is not part of the cache key.
+        self.jobs = [(Analysis, ([1], [i], None)) for i in range(4)]
+
+    def run_jobs(self, jobs):
+        """Check the cache for `jobs`, "perform" the remaining jobs and
+        return the merged reports.
+        """
+        prepare = setlyze.analysis.common.PrepareAnalysis()
+        todo = prepare.check_cache(jobs)
+        results = [make_report(args[1][0]) for cls, args in todo]
+        return todo, prepare.merge_cached_results(results)
+
+    def get_names(self, results):
+        return [r.get_option('Name') for r in results]
+
+    def test_none_cached(self):
+        todo, results = self.run_jobs(self.jobs)
+        self.assertEqual(todo, self.jobs)
+        self.assertEqual(self.get_names(results), [0, 1, 2, 3])
+
+    def test_some_cached(self):
+        self.run_jobs(self.jobs[1:3])
+        todo, results = self.run_jobs(self.jobs)
+        self.assertEqual(todo, [self.jobs[0], self.jobs[3]])
+        # The order of the jobs is kept.
+        self.assertEqual(self.get_names(results), [0, 1, 2, 3])
+
+    def test_all_cached(self):
+        self.run_jobs(self.jobs)
+        todo, results = self.run_jobs(self.jobs)
+        self.assertEqual(todo, [])
+        self.assertEqual(self.get_names(results), [0, 1, 2, 3])
+
+    def test_all_cached_finished(self):
+        # With all reports cached, on_pool_finished must be called directly
+        # with an empty list and still return all reports.
+        self.run_jobs(self.jobs)
+        prepare = setlyze.analysis.common.PrepareAnalysis()
+        self.assertEqual(prepare.check_cache(self.jobs), [])
+
+        idle_add = gobject.idle_add
+        gobject.idle_add = lambda *args: None
+        try:
+            prepare.on_pool_finished([])
+        finally:
+            gobject.idle_add = idle_add
+        self.assertEqual(self.get_names(prepare.results), [0, 1, 2, 3])
+
+    def test_aborted_not_cached(self):
+        prepare = setlyze.analysis.common.PrepareAnalysis()
+        prepare.check_cache(self.jobs[:1])
+        self.assertEqual(prepare.merge_cached_results([None]), [None])
+        todo, results = self.run_jobs(self.jobs[:1])
+        self.assertEqual(todo, self.jobs[:1])
+
+    def test_no_fingerprint(self):
+        connection = sqlite3.connect(self.dbfile)
+        connection.execute("DELETE FROM info")
+        connection.commit()
+        connection.close()
+        self.run_jobs(self.jobs)
+        todo, results = self.run_jobs(self.jobs)
+        self.assertEqual(todo, self.jobs)
+
+if __name__ == '__main__':
+    unittest.main()
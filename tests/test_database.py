@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the local database in :mod:`setlyze.database`."""
+
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import setlyze.config
+import setlyze.database
+
+# The configurations changed by these tests.
+CONFIGS = ('data-path', 'db-file', 'make-new-db')
+
+# The size of the test database. With much smaller tables SQLite may decide
+# that scanning the records table is cheaper than using the indexes.
+N_LOCATIONS = 20
+N_PLATES = 2000
+N_SPECIES = 50
+N_RECORDS = 50000
+
+def make_database(dbfile):
+    """Create a local database `dbfile` with random SETL data.
+
+    The database is created like an import of data files, with the indexes
+    of :meth:`setlyze.database.MakeLocalDB.create_indexes`.
+    """
+    rand = random.Random(1)
+    db = setlyze.database.MakeLocalDB()
+    db.create_new_db()
+    db.cursor.executemany("INSERT INTO localities (loc_id, loc_name) "
+        "VALUES (?,?)",
+        [(i, "Location %d" % i) for i in range(1, N_LOCATIONS+1)])
+    db.cursor.executemany("INSERT INTO plates (pla_id, pla_loc_id) "
+        "VALUES (?,?)",
+        [(i, rand.randint(1, N_LOCATIONS)) for i in range(1, N_PLATES+1)])
+    db.cursor.executemany("INSERT INTO species (spe_id, spe_name_latin) "
+        "VALUES (?,?)",
+        [(i, "Species %d" % i) for i in range(1, N_SPECIES+1)])
+    db.cursor.executemany("INSERT INTO records (rec_id, rec_pla_id, "
+        "rec_spe_id, rec_sur1, rec_sur2) VALUES (?,?,?,?,?)",
+        [(i, rand.randint(1, N_PLATES), rand.randint(1, N_SPECIES),
+            rand.randint(0, 1), rand.randint(0, 1))
+            for i in range(1, N_RECORDS+1)])
+    db.fill_spot_columns()
+    db.create_indexes()
+    db.insert_fingerprint()
+    db.connection.commit()
+    db.on_exit()
+
+class RecordingConnection(object):
+    """Wrapper for a database connection that records the queries that are
+    executed on its cursors.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.queries = []
+
+    def cursor(self):
+        return RecordingCursor(self, self.connection.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+class RecordingCursor(object):
+    """Cursor for :class:`RecordingConnection`."""
+
+    def __init__(self, connection, cursor):
+        self.connection = connection
+        self.cursor = cursor
+
+    def execute(self, query, *args):
+        self.connection.queries.append(query)
+        return self.cursor.execute(query, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+class DatabaseTestCase(unittest.TestCase):
+    """Base class that creates a local database in a temporary folder.
+
+    The database is created once for all tests of a class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.configs = dict((k, setlyze.config.cfg.get(k)) for k in CONFIGS)
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.dbfile = os.path.join(cls.tmpdir, 'setl_local.db')
+        setlyze.config.cfg.set('data-path', cls.tmpdir)
+        setlyze.config.cfg.set('db-file', cls.dbfile)
+        make_database(cls.dbfile)
+
+    @classmethod
+    def tearDownClass(cls):
+        for key, value in cls.configs.items():
+            setlyze.config.cfg.set(key, value)
+        shutil.rmtree(cls.tmpdir)
+
+class TestQueryPlans(DatabaseTestCase):
+    """Check that the queries for selecting species and records use the
+    indexes of the SETL data tables.
+    """
+
+    def get_query_plans(self, scratch, method, *args):
+        """Return the query plans of the queries on the records table that
+        are executed by `method` of a database accessor with arguments `args`.
+
+        Each query plan is returned as a single string.
+        """
+        db = setlyze.database.get_database_accessor(scratch, readonly=True)
+        for slot in (1, 2):
+            getattr(db, 'create_table_species_spots_%d' % slot)()
+        connection = db.conn
+        db.conn = RecordingConnection(connection)
+        getattr(db, method)(*args)
+
+        plans = []
+        cursor = connection.cursor()
+        for query in db.conn.queries:
+            if "FROM records" not in query:
+                continue
+            cursor.execute("EXPLAIN QUERY PLAN %s" % query)
+            plans.append(" ".join([row[-1] for row in cursor]))
+        cursor.close()
+        connection.close()
+        return plans
+
+    def assert_indexes(self, method, args, indexes):
+        for scratch in ("disk", "memory"):
+            plans = self.get_query_plans(scratch, method, *args)
+            self.assertEqual(len(plans), 1)
+            for index in indexes:
+                self.assertTrue(index in plans[0], "%s not used by %s "
+                    "(scratch %s): %s" % (index, method, scratch, plans[0]))
+
+    def test_get_species(self):
+        self.assert_indexes('get_species', ([1, 2],),
+            ('idx_plates_loc', 'idx_records_pla_spe'))
+
+    def test_get_record_ids(self):
+        self.assert_indexes('get_record_ids', ([1, 2], [3]),
+            ('idx_plates_loc', 'idx_records_spe_pla'))
+
+    def test_set_species_spots_from_selection(self):
+        self.assert_indexes('set_species_spots_from_selection',
+            ([1, 2], [3], 0), ('idx_plates_loc', 'idx_records_spe_pla'))
+
+class TestReadOnly(DatabaseTestCase):
+    """Check that read-only connections and the accessors of the analyses
+    can't write to the local database.
+    """
+
+    def setUp(self):
+        if not setlyze.database.uri_filenames_supported():
+            self.skipTest("SQLite doesn't support URI filenames")
+
+    def assert_readonly(self, connection, create=True):
+        self.assertRaises(sqlite3.OperationalError, connection.execute,
+            "INSERT INTO localities (loc_id, loc_name) VALUES (999, 'New')")
+        self.assertRaises(sqlite3.OperationalError, connection.execute,
+            "UPDATE records SET rec_sur1 = 1")
+        if create:
+            self.assertRaises(sqlite3.OperationalError, connection.execute,
+                "CREATE TABLE test (id INTEGER)")
+
+    def test_connect(self):
+        connection = setlyze.database.connect(self.dbfile, readonly=True)
+        try:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM "
+                "records").fetchone()[0], N_RECORDS)
+            self.assert_readonly(connection)
+        finally:
+            connection.close()
+
+    def test_accessors(self):
+        for scratch in ("disk", "memory"):
+            db = setlyze.database.get_database_accessor(scratch,
+                readonly=True)
+            try:
+                # New tables of a memory scratch database are created in
+                # memory, not in the local database.
+                self.assert_readonly(db.conn, create=scratch == "disk")
+
+                # The temporary tables can still be created and filled.
+                db.create_table_species_spots_1()
+                n = db.set_species_spots_from_selection([1, 2], [3], 0)
+                self.assertEqual(db.conn.execute("SELECT COUNT(*) FROM "
+                    "species_spots_1").fetchone()[0], n)
+            finally:
+                db.conn.close()
+
+    def test_fingerprint(self):
+        fingerprint = setlyze.database.get_fingerprint(self.dbfile)
+        self.assertEqual(len(fingerprint), 40)
+
+        # The fingerprint only depends on the SETL data.
+        dbfile = os.path.join(self.tmpdir, 'other.db')
+        setlyze.config.cfg.set('db-file', dbfile)
+        try:
+            make_database(dbfile)
+        finally:
+            setlyze.config.cfg.set('db-file', self.dbfile)
+        self.assertEqual(setlyze.database.get_fingerprint(dbfile),
+            fingerprint)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the statistical tests in :mod:`setlyze.stats` that don't need R.
+
+The reference p-values were calculated with ``scipy.stats.mannwhitneyu``,
+``scipy.stats.chisquare`` and ``scipy.stats.gamma.sf``, which give the same
+results as the ``wilcox.test``, ``chisq.test`` and ``pgamma`` functions
+from R for these data.
+"""
+
+import math
+import unittest
+
+import setlyze.stats
+
+# Example data from the documentation of ``wilcox.test`` in R, which gives
+# W = 35, p-value = 0.1272 for the alternative "greater".
+DEPRESSION_X = [0.80, 0.83, 1.89, 1.04, 1.45, 1.38, 1.91, 1.64, 0.73, 1.46]
+DEPRESSION_Y = [1.15, 0.88, 0.90, 0.74, 1.21]
+
+# Samples with ties.
+TIES_X = [1, 2, 2, 3, 3, 3, 4]
+TIES_Y = [2, 3, 4, 4, 5, 5, 6, 6]
+
+def wilcox_test(x, y, **kwargs):
+    """Return the results of :meth:`setlyze.stats.wilcox_test_frequencies`
+    for samples `x` and `y`.
+    """
+    values, freq_x, freq_y = setlyze.stats.get_frequency_tables(x, y)
+    return setlyze.stats.wilcox_test_frequencies(freq_x, freq_y, **kwargs)
+
+class TestWilcoxTestFrequencies(unittest.TestCase):
+
+    def assert_result(self, result, statistic, p_value, method):
+        self.assertEqual(result['statistic']['W'], statistic)
+        self.assertAlmostEqual(result['p.value'], p_value, places=12)
+        self.assertEqual(result['method'], method)
+
+    def test_exact_small(self):
+        # W = 0 is the smallest of the 20 possible rank sums.
+        self.assert_result(wilcox_test([1, 2, 3], [4, 5, 6]), 0, 0.1,
+            "Wilcoxon rank sum test")
+        self.assert_result(wilcox_test([4, 5, 6], [1, 2, 3]), 9, 0.1,
+            "Wilcoxon rank sum test")
+
+    def test_exact(self):
+        self.assert_result(wilcox_test(DEPRESSION_X, DEPRESSION_Y,
+            alternative="greater"), 35, 0.1272061272061272,
+            "Wilcoxon rank sum test")
+        self.assert_result(wilcox_test(DEPRESSION_X, DEPRESSION_Y), 35,
+            0.2544122544122544, "Wilcoxon rank sum test")
+        self.assert_result(wilcox_test(DEPRESSION_X, DEPRESSION_Y,
+            alternative="less"), 35, 0.8967698967698967,
+            "Wilcoxon rank sum test")
+
+    def test_ties(self):
+        # Samples with ties use the normal approximation.
+        self.assert_result(wilcox_test(TIES_X, TIES_Y), 8.5,
+            0.025144761173357368,
+            "Wilcoxon rank sum test with continuity correction")
+        self.assert_result(wilcox_test(TIES_X, TIES_Y, correct=False), 8.5,
+            0.0215562667600163, "Wilcoxon rank sum test")
+        self.assert_result(wilcox_test(TIES_X, TIES_Y, alternative="less"),
+            8.5, 0.012572380586678684,
+            "Wilcoxon rank sum test with continuity correction")
+        self.assert_result(wilcox_test(TIES_X, TIES_Y,
+            alternative="greater"), 8.5, 0.9907889372729505,
+            "Wilcoxon rank sum test with continuity correction")
+
+    def test_large_samples(self):
+        # Samples with 50 or more values use the normal approximation, also
+        # without ties.
+        x = range(0, 120, 2)
+        y = range(11, 121, 2) + range(200, 205)
+        self.assert_result(wilcox_test(x, y), 1485, 0.09880047992003485,
+            "Wilcoxon rank sum test with continuity correction")
+
+    def test_all_equal(self):
+        result = wilcox_test([2, 2], [2, 2, 2])
+        self.assertTrue(math.isnan(result['p.value']))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, setlyze.stats.wilcox_test_frequencies,
+            [0, 0], [1, 2])
+        self.assertRaises(ValueError, wilcox_test, [1], [2], paired=True)
+        self.assertRaises(ValueError, wilcox_test, [1], [2],
+            alternative="both")
+
+    def test_groups(self):
+        # The native backend performs the same tests for many groups.
+        groups = [(DEPRESSION_X, DEPRESSION_Y), (TIES_X, TIES_Y)]
+        result = setlyze.stats.wilcox_test_groups(groups, backend="native")
+        self.assertAlmostEqual(result['p.value'][0], 0.2544122544122544,
+            places=12)
+        self.assertAlmostEqual(result['p.value'][1], 0.025144761173357368,
+            places=12)
+
+class TestChisqTest(unittest.TestCase):
+
+    def assert_result(self, result, statistic, df, p_value):
+        self.assertAlmostEqual(result['statistic']['X-squared'], statistic,
+            places=12)
+        self.assertEqual(result['parameter']['df'], df)
+        self.assertAlmostEqual(result['p.value'], p_value, places=12)
+
+    def test_one_df(self):
+        self.assert_result(setlyze.stats.chisq_test([30, 20]), 2.0, 1,
+            0.15729920705028105)
+
+    def test_probabilities(self):
+        result = setlyze.stats.chisq_test([10, 20, 30], p=[0.25, 0.25, 0.5])
+        self.assert_result(result, 10 / 3.0, 2, 0.1888756028375618)
+        self.assertEqual(result['expected'], [15.0, 15.0, 30.0])
+
+        # Rescaled probabilities give the same result.
+        result = setlyze.stats.chisq_test([10, 20, 30], p=[1, 1, 2],
+            rescale_p=True)
+        self.assert_result(result, 10 / 3.0, 2, 0.1888756028375618)
+
+    def test_many_df(self):
+        x = [12, 15, 9, 11, 14, 8, 10, 13, 7, 16, 11, 10]
+        self.assert_result(setlyze.stats.chisq_test(x), 7.470588235294118, 11,
+            0.759795201387252)
+
+    def test_small_p_value(self):
+        self.assert_result(setlyze.stats.chisq_test([50, 10, 10, 10]), 60.0,
+            3, 5.878230727906921e-13)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, setlyze.stats.chisq_test, [1, 2],
+            p=[0.5, 0.6])
+        self.assertRaises(ValueError, setlyze.stats.chisq_test, [1, 2],
+            p=[1.0])
+
+class TestPgammaUpper(unittest.TestCase):
+
+    def test_closed_form(self):
+        # For integer a, Q(a,x) = exp(-x) * sum(x^k / k!) for k < a.
+        for a in (1, 3, 10):
+            for x in (0.5, 3.0, 20.0):
+                expected = math.exp(-x) * sum([x ** k / math.factorial(k)
+                    for k in range(a)])
+                self.assertAlmostEqual(setlyze.stats.pgamma_upper(a, x),
+                    expected, places=12)
+
+    def test_values(self):
+        # Both the series (x < a+1) and the continued fraction are used.
+        values = (
+            (0.5, 0.1, 0.6547208460185768),
+            (0.5, 3.0, 0.014305878435429641),
+            (3.0, 10.0, 0.0027693957155115775),
+            (10.0, 9.5, 0.5218260222372076),
+            (50.0, 40.0, 0.9296649333406051),
+        )
+        for a, x, expected in values:
+            self.assertAlmostEqual(setlyze.stats.pgamma_upper(a, x),
+                expected, places=12)
+
+    def test_zero(self):
+        self.assertEqual(setlyze.stats.pgamma_upper(2.0, 0), 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the vectorized spot calculations in :mod:`setlyze.std`."""
+
+import collections
+import itertools
+import random
+import unittest
+
+import numpy
+
+import setlyze.std
+
+# The number of spots in each of the default plate areas.
+AREA_SIZES = [len(setlyze.std.PLATE_AREA_SPOTS[a])
+    for a in setlyze.std.PLATE_AREAS]
+
+def make_records(n, seed):
+    """Return `n` random records with 25 spot booleans each. The numbers of
+    positive spots range from 0 to 25.
+    """
+    rand = random.Random(seed)
+    records = []
+    for i in range(n):
+        positive = rand.sample(range(25), rand.randint(0, 25))
+        records.append([int(s in positive) for s in range(25)])
+    return records
+
+def get_histogram(record1, record2=None):
+    """Return the spot distance histogram of a record, or of two records,
+    counted with the pairwise distance formula.
+
+    The histogram has a column for each distance in
+    :data:`setlyze.std.DISTANCE_CLASSES`.
+    """
+    histogram = [0] * len(setlyze.std.DISTANCE_CLASSES)
+    for s1, s2 in setlyze.std.get_spot_combinations_from_record(record1,
+            record2):
+        h, v = setlyze.std.get_spot_position_difference(s1, s2)
+        d = setlyze.std.distance(h, v)
+        histogram[setlyze.std.DISTANCE_CLASSES.index(d)] += 1
+    return histogram
+
+class TestDistanceHistograms(unittest.TestCase):
+
+    def setUp(self):
+        self.records1 = make_records(300, 1)
+        self.records2 = make_records(300, 2)
+
+    def test_intra(self):
+        spots = setlyze.std.spots_to_matrix(self.records1)
+        expected = [get_histogram(r)[1:] for r in self.records1]
+        self.assertEqual(
+            setlyze.std.get_distance_histograms_intra(spots).tolist(),
+            expected)
+
+    def test_inter(self):
+        spots1 = setlyze.std.spots_to_matrix(self.records1)
+        spots2 = setlyze.std.spots_to_matrix(self.records2)
+        expected = [get_histogram(r1, r2)
+            for r1, r2 in zip(self.records1, self.records2)]
+        self.assertEqual(
+            setlyze.std.get_distance_histograms_inter(spots1, spots2).tolist(),
+            expected)
+
+    def test_chunks(self):
+        # The result doesn't depend on the chunk size.
+        spots = setlyze.std.spots_to_matrix(self.records1)
+        pairs = setlyze.std.SPOT_PAIR_CLASS_MATRIX_INTRA
+        expected = setlyze.std.get_distance_histograms(spots, spots, pairs)
+        for chunk_size in (1, 7, 299):
+            histograms = setlyze.std.get_distance_histograms(spots, spots,
+                pairs, chunk_size)
+            self.assertEqual(histograms.tolist(), expected.tolist())
+
+    def test_pair_totals(self):
+        # A plate with n positive spots has n*(n-1)/2 spot pairs.
+        spots = setlyze.std.spots_to_matrix(self.records1)
+        totals = setlyze.std.get_distance_histograms_intra(spots).sum(axis=1)
+        n = spots.sum(axis=1)
+        self.assertEqual(totals.tolist(), (n * (n - 1) / 2).tolist())
+
+class TestApportion(unittest.TestCase):
+
+    def test_sums(self):
+        rand = random.Random(1)
+        for i in range(500):
+            total = rand.randint(0, 1000)
+            weights = [rand.random() for j in range(rand.randint(1, 15))]
+            counts = setlyze.std.apportion(total, weights)
+            self.assertEqual(sum(counts), total)
+
+            # Each count is its share rounded up or down.
+            weight_total = sum(weights)
+            for count, weight in zip(counts, weights):
+                share = total * weight / weight_total
+                self.assertTrue(share - 1 < count < share + 1)
+
+    def test_exact(self):
+        self.assertEqual(setlyze.std.apportion(6, [1, 2, 3]), [1, 2, 3])
+        self.assertEqual(setlyze.std.apportion(0, [1, 2]), [0, 0])
+
+class TestRandomPlates(unittest.TestCase):
+
+    def setUp(self):
+        rand = numpy.random.RandomState(1)
+        self.spot_totals = numpy.concatenate([numpy.arange(26),
+            rand.randint(0, 26, 200)])
+
+    def test_random_plates(self):
+        plates = setlyze.std.get_random_plates(self.spot_totals, 3,
+            numpy.random.RandomState(2))
+        self.assertEqual(plates.shape, (3, len(self.spot_totals), 25))
+        for repeat in plates:
+            self.assertEqual(repeat.sum(axis=1).tolist(),
+                self.spot_totals.tolist())
+
+    def test_area_totals_per_plate(self):
+        totals = setlyze.std.get_random_area_totals(self.spot_totals, 20,
+            numpy.random.RandomState(2))
+        self.assertEqual(totals.shape, (20, len(self.spot_totals), 4))
+        for repeat in totals:
+            self.assertEqual(repeat.sum(axis=1).tolist(),
+                self.spot_totals.tolist())
+            self.assertTrue((repeat >= 0).all())
+            self.assertTrue((repeat <= AREA_SIZES).all())
+
+    def test_area_totals_mean(self):
+        # The mean area totals are n * size / 25.
+        spot_totals = [5, 12, 20]
+        totals = setlyze.std.get_random_area_totals(spot_totals, 20000,
+            numpy.random.RandomState(3))
+        means = totals.mean(axis=0)
+        for n, mean in zip(spot_totals, means):
+            expected = [n * size / 25.0 for size in AREA_SIZES]
+            for m, e in zip(mean, expected):
+                self.assertAlmostEqual(m, e, delta=0.05)
+
+    def test_hypergeometric(self):
+        # Compare the distributions with all combinations of positive spots.
+        spot_area = setlyze.std.SPOT_AREA_TABLE.argmax(axis=1)
+        for n in (0, 1, 2, 3, 24, 25):
+            counts = collections.Counter()
+            for spots in itertools.combinations(range(25), n):
+                totals = [0] * len(AREA_SIZES)
+                for s in spots:
+                    totals[spot_area[s]] += 1
+                counts[tuple(totals)] += 1
+            n_total = float(sum(counts.values()))
+
+            combinations, cumulative = setlyze.std.AREA_TOTALS_DISTRIBUTIONS[n]
+            probabilities = numpy.diff(numpy.concatenate([[0], cumulative]))
+            self.assertAlmostEqual(cumulative[-1], 1.0, places=12)
+            distribution = dict([(tuple(c), p) for c, p in
+                zip(combinations.tolist(), probabilities) if p > 0])
+            self.assertEqual(sorted(distribution), sorted(counts))
+            for c, p in distribution.iteritems():
+                self.assertAlmostEqual(p, counts[c] / n_total, places=12)
+
+if __name__ == '__main__':
+    unittest.main()